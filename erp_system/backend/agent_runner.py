@@ -0,0 +1,286 @@
+"""
+Async Agent Execution for /chat
+
+``chat_with_agent`` is ``async def`` but the agents are synchronous: one
+``invoke`` waiting on an LLM used to freeze every other request on the
+uvicorn worker, /health included. Every agent call now goes through
+``chat_runner.run``:
+
+- per agent type concurrency limits (CHAT_CONCURRENCY_ROUTER / _SALES /
+  _ANALYTICS) as asyncio semaphores, so one slow agent cannot take every
+  slot; a request that waits longer than CHAT_QUEUE_TIMEOUT for a slot
+  gets ``AgentBusy`` (HTTP 503) instead of queueing forever
+- an ``AgentExecutor``'s memory is not safe for concurrent invokes, so each
+  agent type is an ``AgentPool`` of up to its limit executors, each with
+  its own conversation memory. A call checks one executor out and holds it
+  until the call returns, so independent sessions overlap while no
+  executor ever runs two invokes at once
+- ``ainvoke`` when the agent's LLM client is natively async (Gemini,
+  Ollama), so waiting on the provider costs no thread
+- otherwise ``invoke`` on a dedicated bounded thread pool
+  (CHAT_EXECUTOR_WORKERS), kept apart from starlette's threadpool so chat
+  traffic cannot starve the CRUD endpoints
+
+CHAT_ASYNC_MODE=thread forces the pool for every agent.
+
+A request cancelled while its agent runs on the pool frees its slot, but
+the thread finishes the call in the background; the pool size still
+bounds the total.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+CHAT_ASYNC_MODE = os.getenv("CHAT_ASYNC_MODE", "auto").lower()
+CHAT_CONCURRENCY = {
+    "router": int(os.getenv("CHAT_CONCURRENCY_ROUTER", "4")),
+    "sales": int(os.getenv("CHAT_CONCURRENCY_SALES", "4")),
+    "analytics": int(os.getenv("CHAT_CONCURRENCY_ANALYTICS", "2")),
+}
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "30"))
+CHAT_EXECUTOR_WORKERS = int(os.getenv("CHAT_EXECUTOR_WORKERS", str(sum(CHAT_CONCURRENCY.values()))))
+
+
+class AgentBusy(Exception):
+    """No free slot for an agent type within the queue timeout"""
+
+    def __init__(self, agent_type: str, waited_s: float):
+        super().__init__(f"{agent_type} agent is at its concurrency limit (waited {waited_s:g}s)")
+        self.agent_type = agent_type
+        self.retry_after = max(1, int(waited_s))
+
+
+_agent_pools: List["AgentPool"] = []
+
+
+class AgentPool:
+    """
+    Up to ``size`` agent executors built by ``factory``, each with its own
+    memory. ``invoke``/``ainvoke`` check one out for the length of the call,
+    so a pool can stand in wherever a single executor was shared.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], size: int, first: Any = None,
+                 timeout: float = CHAT_QUEUE_TIMEOUT):
+        self.name = name
+        self.factory = factory
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: List[Any] = [first] if first is not None else []
+        self._created = len(self._idle)
+        self._in_use = 0
+        self._waits = 0
+        self._cond = threading.Condition()
+        _agent_pools.append(self)
+
+    def try_acquire(self) -> Optional[Any]:
+        """An idle executor, or None when building one or waiting would be needed"""
+        with self._cond:
+            if self._idle:
+                self._in_use += 1
+                return self._idle.pop()
+        return None
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """Check an executor out, building one if the pool is not full (blocking)"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1  # reserve a slot, build outside the lock
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AgentBusy(self.name, timeout)
+                self._waits += 1
+                self._cond.wait(remaining)
+        try:
+            agent = self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        print(f"🤖 Built {self.name} executor {self._created}/{self.size}")
+        return agent
+
+    def release(self, agent: Any):
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(agent)
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        agent = self.acquire(timeout)
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    def invoke(self, inputs, *args, **kwargs) -> Dict[str, Any]:
+        with self.checkout() as agent:
+            return agent.invoke(inputs, *args, **kwargs)
+
+    async def ainvoke(self, inputs, *args, **kwargs) -> Dict[str, Any]:
+        # Building or waiting for an executor blocks, so only the fast path stays on the loop
+        agent = self.try_acquire() or await asyncio.to_thread(self.acquire)
+        try:
+            if not hasattr(agent, "ainvoke"):
+                return await asyncio.to_thread(agent.invoke, inputs, *args, **kwargs)
+            return await agent.ainvoke(inputs, *args, **kwargs)
+        finally:
+            self.release(agent)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"size": self.size, "created": self._created, "in_use": self._in_use,
+                    "idle": len(self._idle), "waits": self._waits}
+
+
+def _agent_llm(agent_type: str):
+    """The shared client an agent type talks to"""
+    if agent_type == "analytics":
+        from agents.AnalyticsAgent import analytics_llm
+        return analytics_llm()
+    from config.llm import get_llm
+    return get_llm()
+
+
+class _Lane:
+    """Concurrency limit and counters for one agent type"""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.semaphore = asyncio.Semaphore(self.limit)
+        self.waiting = 0
+        self.in_flight = 0
+        self.stats = {"calls": 0, "errors": 0, "rejected": 0, "ainvoke": 0, "thread": 0}
+        self.queue_ms = 0.0
+        self.run_ms = 0.0
+
+
+class AgentRunner:
+    """Runs agent calls off the event loop under per-agent limits"""
+
+    def __init__(self, limits: Dict[str, int] = None, queue_timeout: float = CHAT_QUEUE_TIMEOUT,
+                 workers: int = CHAT_EXECUTOR_WORKERS, mode: str = CHAT_ASYNC_MODE):
+        self.limits = dict(limits or CHAT_CONCURRENCY)
+        self.queue_timeout = queue_timeout
+        self.workers = max(1, workers)
+        self.mode = mode
+        self._lanes: Dict[str, _Lane] = {}
+        self._native_async: Dict[str, bool] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _lane(self, agent_type: str) -> _Lane:
+        lane = self._lanes.get(agent_type)
+        if lane is None:
+            lane = self._lanes[agent_type] = _Lane(self.limits.get(agent_type, min(self.limits.values())))
+        return lane
+
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chat-agent")
+        return self._pool
+
+    def native_async(self, agent_type: str) -> bool:
+        """Whether ``agent_type``'s LLM client implements async calls (checked once)"""
+        if agent_type not in self._native_async:
+            try:
+                from config.llm import supports_native_async
+                self._native_async[agent_type] = supports_native_async(_agent_llm(agent_type))
+            except Exception as e:
+                print(f"⚠️ Could not inspect the {agent_type} LLM client, using the thread pool: {e}")
+                self._native_async[agent_type] = False
+        return self._native_async[agent_type]
+
+    async def run_blocking(self, fn: Callable, *args) -> Any:
+        """Run ``fn(*args)`` on the chat pool (no agent limit)"""
+        return await asyncio.get_running_loop().run_in_executor(self.pool(), fn, *args)
+
+    async def run(self, agent_type: str, agent, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """``agent.invoke(inputs)`` without blocking the event loop"""
+        lane = self._lane(agent_type)
+        queued = time.perf_counter()
+        lane.waiting += 1
+        try:
+            await asyncio.wait_for(lane.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            lane.stats["rejected"] += 1
+            raise AgentBusy(agent_type, self.queue_timeout)
+        finally:
+            lane.waiting -= 1
+
+        start = time.perf_counter()
+        lane.queue_ms += (start - queued) * 1000
+        lane.in_flight += 1
+        try:
+            native = self.mode != "thread" and hasattr(agent, "ainvoke")
+            if native and agent_type not in self._native_async:
+                # First call: resolving the client may probe endpoints, so keep it off the loop
+                await self.run_blocking(self.native_async, agent_type)
+            if native and self._native_async[agent_type]:
+                lane.stats["ainvoke"] += 1
+                return await agent.ainvoke(inputs)
+            lane.stats["thread"] += 1
+            return await self.run_blocking(agent.invoke, inputs)
+        except Exception:
+            lane.stats["errors"] += 1
+            raise
+        finally:
+            lane.in_flight -= 1
+            lane.stats["calls"] += 1
+            lane.run_ms += (time.perf_counter() - start) * 1000
+            lane.semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        agents = {}
+        for agent_type in sorted(set(self.limits) | set(self._lanes)):
+            lane = self._lanes.get(agent_type)
+            if lane is None:
+                agents[agent_type] = {"limit": self.limits[agent_type], "calls": 0}
+                continue
+            calls = lane.stats["calls"]
+            agents[agent_type] = {
+                "limit": lane.limit,
+                "in_flight": lane.in_flight,
+                "waiting": lane.waiting,
+                "native_async": self._native_async.get(agent_type),
+                **lane.stats,
+                "avg_queue_ms": round(lane.queue_ms / calls, 3) if calls else None,
+                "avg_run_ms": round(lane.run_ms / calls, 3) if calls else None,
+            }
+        return {"mode": self.mode, "workers": self.workers, "queue_timeout_s": self.queue_timeout, "agents": agents,
+                "executor_pools": {pool.name: pool.stats() for pool in list(_agent_pools)}}
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+chat_runner = AgentRunner()
+
+
+def get_chat_runner_stats() -> Dict[str, Any]:
+    return chat_runner.stats()
+
+
+def close_chat_runner():
+    chat_runner.close()
@@ -11,18 +11,26 @@ import json
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from pathlib import Path
 
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain.tools import tool
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
-from langchain_google_genai import GoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 import os
 from langchain_community.document_loaders import UnstructuredMarkdownLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain.chains import RetrievalQA
 
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from query_executor import execute_sql as shared_execute_sql
+from schema_catalog import get_schema_catalog
+from nl_sql_cache import nl_sql_cache
+from schema_linker import link_schema, record_prompt
+from config.llm import get_embeddings, get_gemini_llm
+
 # Set Gemini API key from environment variable
 os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY", "")
 mdPath = "metrics.md"
@@ -30,24 +38,24 @@ presist_dir = "metrics_docs"
 
 
 
+ANALYTICS_MODEL = "gemini-1.5-flash"
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+def analytics_llm():
+    """Shared Gemini client for analytics; LLM_PROVIDER=mock/recorded/record swap in the deterministic providers"""
+    return get_gemini_llm(ANALYTICS_MODEL)
+
 # -------- Database Utilities --------
-def execute_sql(query: str, params: tuple = ()) -> List[Dict]:
-    import sqlite3
-    conn = sqlite3.connect(os.getenv("DB_PATH", ""))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+def execute_sql(query: str, params: tuple = (), budget: Optional[str] = None, cache: bool = True,
+                read_only: Optional[bool] = None) -> List[Dict]:
+    return shared_execute_sql(query, params, budget=budget, cache=cache, read_only=read_only)
 
 def get_table_schema(table_name: str) -> str:
-    schema = execute_sql(f"PRAGMA table_info({table_name})")
-    return f"Table: {table_name}\n" + "\n".join([f"  - {col['name']} ({col['type']})" for col in schema])
+    return get_schema_catalog().snapshot().describe([table_name])
 
 def get_all_tables() -> List[str]:
-    tables = execute_sql("SELECT name FROM sqlite_master WHERE type='table'")
-    return [t['name'] for t in tables]
+    return get_schema_catalog().snapshot().tables
 
 # -------- Tool Functions --------
 @tool
@@ -55,8 +63,10 @@ def text_to_sql(question: str, context: Optional[str] = None) -> str:
     """
     Convert a natural language question to SQL, execute it, and return results. Make sure  it is only a read only query and does not modify the database.
     """
-    tables = get_all_tables()
-    schema_info = "\n".join([get_table_schema(t) for t in tables])  # Limit to first 3 tables for brevity
+    linked = link_schema(question, context)  # only the tables the question is about, with joins
+    schema_info = linked.text
+    sql_query = nl_sql_cache.lookup("text_to_sql", question, context, linked.schema_fingerprint)
+    cached = sql_query is not None
     prompt = f"""
     Given the following database schema:
     {schema_info}
@@ -67,16 +77,22 @@ def text_to_sql(question: str, context: Optional[str] = None) -> str:
     SQL Query:
     """
 
-    llm = GoogleGenerativeAI(model="gemini-1.5-flash")
-    sql_query = llm.invoke(prompt).strip().replace("```sql", "").replace("```", "").strip()
+    if not cached:
+        record_prompt("text_to_sql", prompt, linked)
+        llm = analytics_llm()
+        sql_query = llm.invoke(prompt).strip().replace("```sql", "").replace("```", "").strip()
     try:
-        results = execute_sql(sql_query)
+        results = execute_sql(sql_query, budget="analytics_agent", read_only=True)  # LLM-generated SQL: budgeted, reader lane only
+        if not cached:
+            nl_sql_cache.store("text_to_sql", question, context, linked.schema_fingerprint, sql_query)
         if results:
             df = pd.DataFrame(results)
             return f"Query executed successfully. Results:\n{df.to_string()}\n\nSQL: {sql_query}"
         else:
             return f"Query executed but returned no results.\nSQL: {sql_query}"
     except Exception as e:
+        if cached:
+            nl_sql_cache.invalidate("text_to_sql", question, context, linked.schema_fingerprint)
         return f"Error executing SQL query: {str(e)}\nGenerated SQL: {sql_query}"
 
 @tool
@@ -89,10 +105,10 @@ def rag_definition(query: str) -> str:
         # Ensure persist directory exists to avoid runtime errors
         os.makedirs(presist_dir, exist_ok=True)
         # Use current Google embeddings model name
-        embedding_model = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+        embedding_model = get_embeddings(EMBEDDING_MODEL)
         vectordb = Chroma(persist_directory=presist_dir, embedding_function=embedding_model)
         retriever = vectordb.as_retriever()
-        llm = GoogleGenerativeAI(model="gemini-1.5-flash")
+        llm = analytics_llm()
         qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, return_source_documents=True)
         result = qa_chain.invoke({
             "query": (
@@ -236,7 +252,7 @@ Thought:{agent_scratchpad}"""
 
 # -------- Build the Analytics Agent --------
 def create_analytics_agent():
-    llm = GoogleGenerativeAI(model="gemini-1.5-flash")
+    llm = analytics_llm()
     tools = [text_to_sql, rag_definition, analytics_reporting]
     memory = ConversationBufferMemory()
     prompt = PromptTemplate.from_template(ANALYTICS_AGENT_SYSTEM)
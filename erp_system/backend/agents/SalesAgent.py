@@ -22,6 +22,12 @@ from langchain_google_genai import GoogleGenerativeAI, GoogleGenerativeAIEmbeddi
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from db import get_db
+from query_executor import execute_sql as shared_execute_sql
+from customer_stats import ensure_customer_stats
+from search_index import search
+from schema_catalog import get_schema_catalog
+from nl_sql_cache import nl_sql_cache
+from schema_linker import link_schema, record_prompt
 from config.llm import get_llm
 
 # Load environment variables
@@ -39,26 +45,18 @@ else:
 from memory.base_memory import SalesEntityMemory, RouterGlobalState
 
 # -------- Database Utilities --------
-def execute_sql(query: str, params: tuple = ()) -> List[Dict]:
-    """Execute SQL query using the shared database connection"""
-    import sqlite3
-    conn = sqlite3.connect(os.getenv("DB_PATH", ""))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+def execute_sql(query: str, params: tuple = (), budget: Optional[str] = None, cache: bool = True,
+                read_only: Optional[bool] = None) -> List[Dict]:
+    """Execute SQL query using the shared query executor"""
+    return shared_execute_sql(query, params, budget=budget, cache=cache, read_only=read_only)
 
 def get_table_schema(table_name: str) -> str:
-    """Get the schema information for a specific table"""
-    schema = execute_sql(f"PRAGMA table_info({table_name})")
-    return f"Table: {table_name}\n" + "\n".join([f"  - {col['name']} ({col['type']})" for col in schema])
+    """Get the schema information for a specific table (from the schema catalog)"""
+    return get_schema_catalog().snapshot().describe([table_name])
 
 def get_all_tables() -> List[str]:
-    """Get list of all tables in the database"""
-    tables = execute_sql("SELECT name FROM sqlite_master WHERE type='table'")
-    return [t['name'] for t in tables]
+    """Get list of all tables in the database (from the schema catalog)"""
+    return get_schema_catalog().snapshot().tables
 
 # -------- Tool Functions --------
 @tool
@@ -67,12 +65,13 @@ def sales_sql_query(question: str, context: Optional[str] = None) -> str:
     Convert a natural language sales question to SQL, execute it, and return results.
     Specialized for sales operations: customers, leads, orders, products, suppliers.
     """
-    tables = get_all_tables()
+    schema = get_schema_catalog().snapshot()
     # Focus on sales-related tables
     sales_tables = ['customers', 'leads', 'orders', 'order_items', 'products', 'suppliers', 'invoices', 'payments']
-    relevant_tables = [t for t in tables if any(st in t.lower() for st in sales_tables)]
+    relevant_tables = [t for t in schema.tables if any(st in t.lower() for st in sales_tables)]
     
-    schema_info = "\n".join([get_table_schema(t) for t in relevant_tables])
+    linked = link_schema(question, context, scope=relevant_tables)  # question-relevant subset, with joins
+    schema_info = linked.text
     prompt = f"""
     Given the following sales database schema:
     {schema_info}
@@ -90,23 +89,31 @@ def sales_sql_query(question: str, context: Optional[str] = None) -> str:
     Return only the SQL query without any explanation.
     SQL Query:
     """
-    llm = get_llm()  # Use shared LLM configuration
-    response = llm.invoke(prompt)
-    # Handle both string and AIMessage responses
-    if hasattr(response, 'content'):
-        sql_query = response.content.strip()
-    else:
-        sql_query = str(response).strip()
-    sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
+    sql_query = nl_sql_cache.lookup("sales_sql_query", question, context, linked.schema_fingerprint)
+    cached = sql_query is not None
+    if not cached:
+        record_prompt("sales_sql_query", prompt, linked)
+        llm = get_llm()  # Use shared LLM configuration
+        response = llm.invoke(prompt)
+        # Handle both string and AIMessage responses
+        if hasattr(response, 'content'):
+            sql_query = response.content.strip()
+        else:
+            sql_query = str(response).strip()
+        sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
     
     try:
-        results = execute_sql(sql_query)
+        results = execute_sql(sql_query, budget="sales_agent", read_only=True)  # LLM-generated SQL: budgeted, reader lane only
+        if not cached:
+            nl_sql_cache.store("sales_sql_query", question, context, linked.schema_fingerprint, sql_query)
         if results:
             df = pd.DataFrame(results)
             return f"Query executed successfully. Results:\n{df.to_string()}\n\nSQL: {sql_query}"
         else:
             return f"Query executed but returned no results.\nSQL: {sql_query}"
     except Exception as e:
+        if cached:
+            nl_sql_cache.invalidate("sales_sql_query", question, context, linked.schema_fingerprint)
         return f"Error executing SQL query: {str(e)}\nGenerated SQL: {sql_query}"
 
 @tool
@@ -118,11 +125,10 @@ def customer_management(operation: str, customer_data: Optional[Dict] = None) ->
     try:
         if operation == 'list':
             results = execute_sql("""
-                SELECT c.*, COUNT(o.id) as order_count,
-                       COALESCE(SUM(o.total), 0) as total_spent
+                SELECT c.*, COALESCE(s.order_count, 0) as order_count,
+                       COALESCE(s.total_spent, 0) as total_spent
                 FROM customers c 
-                LEFT JOIN orders o ON c.id = o.customer_id 
-                GROUP BY c.id 
+                LEFT JOIN customer_stats s ON s.customer_id = c.id 
                 ORDER BY c.created_at DESC
                 LIMIT 20
             """)
@@ -171,18 +177,18 @@ def customer_management(operation: str, customer_data: Optional[Dict] = None) ->
             
         elif operation == 'search' and customer_data:
             search_term = customer_data.get('search_term', '')
-            results = execute_sql("""
-                SELECT * FROM customers 
-                WHERE name LIKE ? OR email LIKE ? OR phone LIKE ?
-                ORDER BY created_at DESC
-            """, (f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"))
+            results = search(search_term, ["customers"], limit=20)  # FTS5, bm25-ranked; fuzzy if no hit
             
             if not results:
                 return f"No customers found matching '{search_term}'"
             
-            output = f"🔍 **Search Results for '{search_term}':**\n\n"
+            if results[0].get("match") == "fuzzy":
+                output = f"🔍 **No exact match for '{search_term}'. Closest customers:**\n\n"
+            else:
+                output = f"🔍 **Search Results for '{search_term}':**\n\n"
             for customer in results:
-                output += f"• **{customer['name']}** ({customer['email']})\n"
+                similarity = f" – {customer['similarity']:.0%} match" if customer.get("similarity") is not None else ""
+                output += f"• **{customer['name']}** ({customer['email']}){similarity}\n"
                 output += f"  📞 {customer.get('phone', 'N/A')}\n\n"
             return output
             
@@ -356,12 +362,11 @@ def sales_reporting(report_type: str, params: Optional[Dict] = None) -> str:
             results = execute_sql("""
                 SELECT 
                     c.name, c.email,
-                    COUNT(o.id) as order_count,
-                    SUM(o.total) as total_spent
+                    COALESCE(s.order_count, 0) as order_count,
+                    s.total_spent
                 FROM customers c
-                LEFT JOIN orders o ON c.id = o.customer_id
-                GROUP BY c.id
-                ORDER BY total_spent DESC
+                LEFT JOIN customer_stats s ON s.customer_id = c.id
+                ORDER BY s.total_spent DESC
                 LIMIT ?
             """, (limit,))
             
@@ -430,9 +435,14 @@ class SalesAgentWrapper:
         """Direct invoke method for compatibility"""
         return self.executor.invoke(request_data)
 
+    async def ainvoke(self, request_data: dict) -> dict:
+        """Async invoke, for LLM clients with native async support"""
+        return await self.executor.ainvoke(request_data)
+
 # -------- Build the Sales Agent --------
 def create_sales_agent():
     """Create and configure the Sales Agent"""
+    ensure_customer_stats()  # customer listings read the orders rollup
     llm = get_llm()  # Use shared LLM configuration
     tools = [sales_sql_query, customer_management, lead_management, order_management, sales_reporting]
     memory = ConversationBufferMemory()
@@ -10,6 +10,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 # Fix: Import from db module instead of config.database
 from db import get_db
 from tools.sales_tools import SalesTools
+from search_index import strip_search_command
 from memory.base_memory import SalesEntityMemory, RouterGlobalState
 from langchain.memory import ConversationBufferMemory
 
@@ -27,11 +28,10 @@ class SimpleSalesAgent:
         try:
             # Query using the correct schema
             results = self.sales_tools.sales_sql_read("""
-                SELECT c.*, COUNT(o.id) as order_count,
-                       COALESCE(SUM(o.total), 0) as total_spent
+                SELECT c.*, COALESCE(s.order_count, 0) as order_count,
+                       COALESCE(s.total_spent, 0) as total_spent
                 FROM customers c 
-                LEFT JOIN orders o ON c.id = o.customer_id 
-                GROUP BY c.id 
+                LEFT JOIN customer_stats s ON s.customer_id = c.id 
                 ORDER BY c.created_at DESC
             """)
             
@@ -134,7 +134,8 @@ class SimpleSalesAgent:
                        c.name as customer_name
                 FROM orders o
                 JOIN customers c ON o.customer_id = c.id
-                ORDER BY o.created_at DESC
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT 20
             """)
             
             if not orders or len(orders) == 0:
@@ -153,27 +154,28 @@ class SimpleSalesAgent:
     
     def _search_customers(self, search_term: str) -> str:
         """Search for customers by name or email"""
+        # Extract actual search term ("find customer acme" -> "acme")
+        search_term = strip_search_command(search_term)
         if not search_term or len(search_term) < 3:
             return "Please provide a search term with at least 3 characters."
         
         try:
-            # Extract actual search term if it includes "find customer"
-            if "find customer" in search_term.lower():
-                search_term = search_term.lower().replace("find customer", "").strip()
-            
-            results = self.sales_tools.sales_sql_read(f"""
-                SELECT c.id, c.name, c.email, c.phone, c.created_at
-                FROM customers c 
-                WHERE c.name LIKE '%{search_term}%' OR c.email LIKE '%{search_term}%'
-                ORDER BY c.name
-            """)
+
+            # Parameterized full-text search (the term never touches the SQL text)
+            results = self.sales_tools.search_crm(search_term, ["customers"], limit=20)
             
             if not results or len(results) == 0:
                 return f"No customers found matching '{search_term}'."
             
-            result = f"🔍 **Search Results for '{search_term}':**\n\n"
+            if results[0].get("match") == "fuzzy":
+                result = f"🔍 **No exact match for '{search_term}'. Closest customers:**\n\n"
+            else:
+                result = f"🔍 **Search Results for '{search_term}':**\n\n"
             for customer in results:
-                result += f"• **{customer['name']}** ({customer['email']})\n"
+                result += f"• **{customer['name']}** ({customer['email']})"
+                if customer.get("similarity") is not None:
+                    result += f" – {customer['similarity']:.0%} match"
+                result += "\n"
                 result += f"  📞 {customer.get('phone', 'N/A')}\n"
                 result += f"  📅 Customer since: {customer.get('created_at', 'N/A')}\n\n"
             
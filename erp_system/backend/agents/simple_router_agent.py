@@ -21,7 +21,7 @@ Architecture:
 import os
 import sys
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -32,10 +32,14 @@ from langchain.tools import tool
 from langchain.memory import ConversationBufferWindowMemory
 from config.llm import get_llm
 from mcp.tool_registry import ToolRegistry
-from agents.SalesAgent import create_sales_agent_with_chat
+from agents.SalesAgent import (create_sales_agent_with_chat, sales_sql_query, customer_management, lead_management,
+                               order_management, sales_reporting)
+from intent_router import INTENT_FAST_PATH_ENABLED, IntentFastPath
+from fan_out import FANOUT_ENABLED, FanOutRouter
+from agent_runner import CHAT_CONCURRENCY, AgentPool
 # Import Analytics Agent (with error handling for dependencies)
 try:
-    from agents.AnalyticsAgent import create_analytics_agent
+    from agents.AnalyticsAgent import create_analytics_agent, text_to_sql, rag_definition, analytics_reporting
     ANALYTICS_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️ Analytics Agent import failed: {e}")
@@ -43,18 +47,28 @@ except ImportError as e:
     ANALYTICS_AVAILABLE = False
 from memory.base_memory import RouterGlobalState
 
+# nested: the router LLM picks execute_with_*_agent, the sub-agent runs its own
+#         ReAct loop, and the router LLM restates the result as its Final Answer
+# flat:   the router LLM picks a sales/analytics tool function directly and the
+#         tool's output is the answer (one tool-selection call per request)
+ROUTER_MODE = os.getenv("ROUTER_MODE", "nested").lower()
+
 # Initialize memory and global state
 global_state = RouterGlobalState()
 
 # Initialize the tool registry and agents
 # The tool registry manages all available tools across agents
 tool_registry = ToolRegistry()
-sales_agent = create_sales_agent_with_chat()
+# Sub-agents the routers delegate to: pools with one executor (and memory) per
+# concurrent router call, so two routers never invoke the same executor
+sales_agent = AgentPool("router.sales", create_sales_agent_with_chat, CHAT_CONCURRENCY["router"],
+                        first=create_sales_agent_with_chat())
 
 # Initialize Analytics Agent if available
 if ANALYTICS_AVAILABLE and create_analytics_agent:
     try:
-        analytics_agent = create_analytics_agent()
+        analytics_agent = AgentPool("router.analytics", create_analytics_agent, CHAT_CONCURRENCY["router"],
+                                    first=create_analytics_agent())
         print("✅ Analytics Agent initialized successfully")
     except Exception as e:
         print(f"⚠️ Analytics Agent initialization failed: {e}")
@@ -100,8 +114,8 @@ def execute_with_sales_agent(user_request: str) -> str:
 def get_system_info() -> str:
     """Get system information and health status"""
     try:
-        from db import get_db
-        with get_db() as conn:
+        from db import get_read_db
+        with get_read_db() as conn:
             cursor = conn.cursor()
             
             # Get basic counts
@@ -179,12 +193,90 @@ else:
     print("⚠️ Analytics Agent tool not registered - not available")
 tool_registry.register_tool(get_system_info)
 
+_sales_tools = None
+
+
+def _fast_path_tools():
+    """SalesTools instance behind the fast path, created on first use"""
+    global _sales_tools
+    if _sales_tools is None:
+        from tools.sales_tools import SalesTools
+        _sales_tools = SalesTools()
+    return _sales_tools
+
+
+def fast_path_handlers() -> Dict[str, Callable[[str], str]]:
+    """Intent -> deterministic tool function, used instead of the ReAct loop for obvious requests"""
+    return {
+        "customer_list": lambda _: _fast_path_tools()._list_customers(),
+        "customer_summary": lambda _: _fast_path_tools()._customer_summary(),
+        "customer_search": lambda term: _fast_path_tools()._search_customers(term),
+        "leads": lambda _: _fast_path_tools()._list_leads(),
+        "lead_scoring": lambda _: _fast_path_tools().score_leads(),
+        "orders": lambda _: _fast_path_tools()._list_recent_orders(),
+        "tickets": lambda _: _fast_path_tools()._list_tickets(),
+        "system_info": lambda _: get_system_info.func(),
+        "help": lambda _: _fast_path_tools()._general_sales_help(),
+    }
+
+
+def fan_out_runners() -> Dict[str, Callable[[str], str]]:
+    """
+    Agent -> callable for fan-out branches. Unlike the execute_with_* tools,
+    exceptions propagate, so a failing agent cancels the rest of the plan.
+    Each call checks an executor out of the agent's pool and holds it until
+    it returns, so a branch the plan abandoned keeps its executor to itself.
+    """
+    runners = {"sales": lambda question: sales_agent.invoke({"input": question})["output"]}
+    if ANALYTICS_AVAILABLE and analytics_agent is not None:
+        runners["analytics"] = lambda question: analytics_agent.invoke({"input": question})["output"]
+    return runners
+
+
+def flat_router_tools() -> List:
+    """
+    Sales and analytics tool functions exposed to the router itself.
+    Copies with return_direct=True, so the tool output ends the loop instead of
+    going back through the LLM for a Final Answer rewrite.
+    """
+    tools = [sales_sql_query, customer_management, lead_management, order_management, sales_reporting]
+    if ANALYTICS_AVAILABLE:
+        tools += [text_to_sql, rag_definition, analytics_reporting]
+    tools.append(get_system_info)
+    return [t.model_copy(update={"return_direct": True}) for t in tools]
+
+
+FLAT_ROUTING_INSTRUCTIONS = """IMPORTANT INSTRUCTIONS:
+1. Pick the ONE tool that answers the request; its output is returned to the user as-is
+2. Customers, leads, orders, products and other sales records - use sales_sql_query, or the
+   customer/lead/order management tools for create/update/list operations, sales_reporting for sales reports
+3. Analytics, revenue, metrics, trends or data analysis - use text_to_sql (rag_definition for business definitions)
+4. System info, health or status - use get_system_info
+5. Pass the user's request as the Action Input, keeping any names, numbers and dates"""
+
+NESTED_ROUTING_INSTRUCTIONS = """IMPORTANT INSTRUCTIONS:
+1. If the user asks about customers, leads, orders, sales, or CRM - use execute_with_sales_agent
+2. If the user asks about analytics, reports, revenue, metrics, SQL queries, or data analysis - use execute_with_analytics_agent
+3. If the user asks about system info, health, or status - use get_system_info  
+4. When you get a response from a tool, return EXACTLY what the tool returned in your Final Answer
+5. Do NOT add "Agent Response:" or any wrapper text in your Final Answer
+6. Do NOT say "Here is the information you requested" - just return the actual data"""
+
+
 # Create the router agent
-def create_simple_router_agent():
+def create_simple_router_agent(mode: str = None, fast_path: bool = INTENT_FAST_PATH_ENABLED,
+                               fan_out: bool = FANOUT_ENABLED):
+    """
+    Router executor in ROUTER_MODE ("nested" or "flat", see above), wrapped in
+    the intent fast path and the parallel fan-out unless disabled.
+    """
+    mode = (mode or ROUTER_MODE).lower()
+    if mode not in ("nested", "flat"):
+        raise ValueError(f"Unknown router mode '{mode}' (expected 'nested' or 'flat')")
     llm = get_llm()
     
-    # Get tools from registry
-    tools = tool_registry.get_tools()
+    # Sub-agent delegation tools from the registry, or the sub-agents' own tools
+    tools = flat_router_tools() if mode == "flat" else tool_registry.get_tools()
     
     # Initialize memory with k=5 as per specifications
     memory = ConversationBufferWindowMemory(
@@ -218,13 +310,7 @@ Observation: the result of the action
 Thought: I now know the final answer
 Final Answer: the final answer to the original input question
 
-IMPORTANT INSTRUCTIONS:
-1. If the user asks about customers, leads, orders, sales, or CRM - use execute_with_sales_agent
-2. If the user asks about analytics, reports, revenue, metrics, SQL queries, or data analysis - use execute_with_analytics_agent
-3. If the user asks about system info, health, or status - use get_system_info  
-4. When you get a response from a tool, return EXACTLY what the tool returned in your Final Answer
-5. Do NOT add "Agent Response:" or any wrapper text in your Final Answer
-6. Do NOT say "Here is the information you requested" - just return the actual data
+{instructions}
 
 Begin!
 
@@ -236,7 +322,8 @@ Thought: {agent_scratchpad}"""
         input_variables=["input", "agent_scratchpad", "chat_history"],
         partial_variables={
             "tools": "\n".join([f"{tool.name}: {tool.description}" for tool in tools]),
-            "tool_names": ", ".join([tool.name for tool in tools])
+            "tool_names": ", ".join([tool.name for tool in tools]),
+            "instructions": FLAT_ROUTING_INSTRUCTIONS if mode == "flat" else NESTED_ROUTING_INSTRUCTIONS,
         }
     )
     
@@ -250,6 +337,12 @@ Thought: {agent_scratchpad}"""
         max_iterations=3
     )
     
+    # Questions spanning sales and analytics run both agents in parallel
+    if fan_out:
+        executor = FanOutRouter(executor, fan_out_runners())
+    # Answer obvious requests from the tool functions; only the rest reach the LLM
+    if fast_path:
+        return IntentFastPath(executor, fast_path_handlers())
     return executor
 
 class RouterAgent:
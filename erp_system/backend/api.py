@@ -1,22 +1,30 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Dict, List, Optional
 import sys
 from pathlib import Path
 import json
 import asyncio
+import tempfile
 
 # Add current directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-# Import agents with error handling
+from agent_runner import CHAT_CONCURRENCY, AgentPool
+
+# Import agents with error handling. Each agent type is a pool of executors
+# with their own memory (one per concurrent /chat call, see agent_runner.py);
+# the first executor is built now so import errors surface at startup
 try:
     # Import router agent directly for better error handling
     from agents.simple_router_agent import create_simple_router_agent
-    router_executor = create_simple_router_agent()
+    router_executor = AgentPool("router", create_simple_router_agent, CHAT_CONCURRENCY["router"],
+                                first=create_simple_router_agent())
     ROUTER_AVAILABLE = True
     print("✅ Router agent loaded successfully")
 except Exception as e:
@@ -34,14 +42,15 @@ except Exception as e:
 
 try:
     from agents.SalesAgent import create_sales_agent_with_chat
-    sales_agent = create_sales_agent_with_chat()
+    sales_agent = AgentPool("sales", create_sales_agent_with_chat, CHAT_CONCURRENCY["sales"],
+                            first=create_sales_agent_with_chat())
     SALES_AGENT_AVAILABLE = True
     print("✅ New Sales agent loaded successfully")
 except ImportError as e:
     print(f"Warning: New Sales agent not available, trying fallback: {e}")
     try:
         from agents.sales_agent_simple import SimpleSalesAgent
-        sales_agent = SimpleSalesAgent()
+        sales_agent = AgentPool("sales", SimpleSalesAgent, CHAT_CONCURRENCY["sales"], first=SimpleSalesAgent())
         SALES_AGENT_AVAILABLE = True
         print("✅ Fallback Sales agent loaded successfully")
     except ImportError as e2:
@@ -51,7 +60,8 @@ except ImportError as e:
 
 try:
     from agents.AnalyticsAgent import create_analytics_agent
-    analytics_agent = create_analytics_agent()
+    analytics_agent = AgentPool("analytics", create_analytics_agent, CHAT_CONCURRENCY["analytics"],
+                                first=create_analytics_agent())
     ANALYTICS_AGENT_AVAILABLE = True
     print("✅ Analytics agent loaded successfully")
 except Exception as e:
@@ -59,9 +69,36 @@ except Exception as e:
     analytics_agent = None
     ANALYTICS_AGENT_AVAILABLE = False
 
-from db import get_db
+from db import get_read_db, get_pool, get_pool_stats, close_pools
+from query_executor import execute_sql, get_query_stats, QueryStream, QueryBudgetExceeded
+from result_cache import get_result_cache_stats
+from fuzzy_index import get_fuzzy_index_stats
+from nl_sql_cache import get_nl_sql_cache_stats, nl_sql_cache
+from schema_linker import get_schema_linker_stats
+from intent_router import get_intent_router_stats
+from fan_out import close_fan_out_pool, get_fan_out_stats
+from agent_runner import AgentBusy, chat_runner, close_chat_runner, get_chat_runner_stats
+from schema_catalog import get_schema_catalog
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+from bulk_ingest import INGEST_FORMATS, INGEST_SPECS, ingest as bulk_ingest
+from memory.write_behind import close_all as close_write_behind, get_write_behind_stats
 from tools.sales_tools import SalesTools
 
+try:
+    from config.llm import get_llm_client_stats
+except ImportError:
+    def get_llm_client_stats():
+        return []
+
+try:
+    from config.ollama_endpoints import get_endpoint_stats, stop_endpoint_monitor
+except ImportError:
+    def get_endpoint_stats():
+        return {"resolved": False, "active": None, "endpoints": []}
+
+    def stop_endpoint_monitor():
+        pass
+
 app = FastAPI(
     title="Helios Dynamics ERP API",
     description="Agent-driven ERP system API",
@@ -95,10 +132,23 @@ class ChatResponse(BaseModel):
 class QueryRequest(BaseModel):
     query: str
     table: Optional[str] = None
+    stream: bool = False  # stream rows in chunks instead of one JSON payload
+    format: str = "ndjson"  # "ndjson" or "csv" when streaming
+    max_rows: Optional[int] = None  # capped server-side by QUERY_STREAM_MAX_ROWS
 
 # Global instances
 sales_tools = SalesTools()
 
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush queued memory writes, then release pooled database connections"""
+    stop_endpoint_monitor()
+    close_chat_runner()
+    close_fan_out_pool()
+    close_write_behind()
+    nl_sql_cache.flush_hits()
+    close_pools()
+
 @app.get("/")
 async def root():
     """Serve the main application"""
@@ -131,7 +181,7 @@ async def api_root():
 async def health_check():
     try:
         # Test database connection
-        with get_db() as conn:
+        with get_read_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM customers")
             customer_count = cursor.fetchone()[0]
@@ -145,11 +195,65 @@ async def health_check():
                 "sales": "available" if SALES_AGENT_AVAILABLE else "unavailable",
                 "analytics": "available" if ANALYTICS_AGENT_AVAILABLE else "unavailable"
             },
-            "frontend": "available" if frontend_path.exists() else "unavailable"
+            "frontend": "available" if frontend_path.exists() else "unavailable",
+            "db_pool": {
+                "read": get_pool(read_only=True).stats(),
+                "write": get_pool().stats()
+            }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
 
+@app.get("/metrics")
+async def get_metrics():
+    """Database pool, query timing, cache, LLM client and Ollama endpoint metrics"""
+    return {
+        "db_pools": get_pool_stats(),
+        "queries": get_query_stats(),
+        "memory_write_behind": get_write_behind_stats(),
+        "result_cache": get_result_cache_stats(),
+        "fuzzy_index": get_fuzzy_index_stats(),
+        "nl_sql_cache": get_nl_sql_cache_stats(),
+        "schema_linker": get_schema_linker_stats(),
+        "intent_router": get_intent_router_stats(),
+        "fan_out": get_fan_out_stats(),
+        "chat_agents": get_chat_runner_stats(),
+        "llm_clients": get_llm_client_stats(),
+        "llm_endpoints": get_endpoint_stats()
+    }
+
+@app.get("/llm/endpoints")
+async def get_llm_endpoints():
+    """Ollama endpoint health: circuit state per URL and the active endpoint"""
+    return get_endpoint_stats()
+
+@app.get("/admin/nl-sql-cache")
+async def list_nl_sql_cache(
+    tool: Optional[str] = Query(None, description="text_to_sql or sales_sql_query"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """Hit-rate stats and the most recently used NL-to-SQL translations"""
+    try:
+        return {
+            "stats": await run_in_threadpool(nl_sql_cache.stats),
+            "entries": await run_in_threadpool(nl_sql_cache.entries, tool, limit),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read NL-to-SQL cache: {str(e)}")
+
+@app.delete("/admin/nl-sql-cache")
+async def purge_nl_sql_cache(
+    tool: Optional[str] = Query(None, description="only this tool's entries"),
+    cache_key: Optional[str] = Query(None, description="one entry"),
+    expired_only: bool = Query(False),
+):
+    """Delete cached NL-to-SQL translations (all of them with no filters)"""
+    try:
+        deleted = await run_in_threadpool(nl_sql_cache.purge, tool, cache_key, expired_only)
+        return {"deleted": deleted}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to purge NL-to-SQL cache: {str(e)}")
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_agent(request: ChatRequest):
     """Chat with the ERP agents"""
@@ -162,20 +266,20 @@ async def chat_with_agent(request: ChatRequest):
         # Handle different agent types
         if request.agent == "sales" and SALES_AGENT_AVAILABLE:
             print("Using Sales Agent directly")
-            result = sales_agent.invoke({"input": request.message})
+            result = await chat_runner.run("sales", sales_agent, {"input": request.message})
             response = result['output']
             agent_used = "sales"
             
         elif request.agent == "analytics":
             if ANALYTICS_AGENT_AVAILABLE:
                 print("Using Analytics Agent")
-                result = analytics_agent.invoke({"input": request.message})
+                result = await chat_runner.run("analytics", analytics_agent, {"input": request.message})
                 response = result.get('output', str(result))
                 agent_used = "analytics"
             else:
                 print("Analytics Agent not available, falling back to Sales Agent")
                 if SALES_AGENT_AVAILABLE:
-                    result = sales_agent.invoke({"input": request.message})
+                    result = await chat_runner.run("sales", sales_agent, {"input": request.message})
                     response = result['output']
                     agent_used = "sales"
                 else:
@@ -188,27 +292,30 @@ async def chat_with_agent(request: ChatRequest):
             if router_executor is None:
                 try:
                     from agents.simple_router_agent import create_simple_router_agent
-                    router_executor_temp = create_simple_router_agent()
-                    result = router_executor_temp.invoke({"input": request.message})
+                    router_executor_temp = await chat_runner.run_blocking(create_simple_router_agent)
+                    result = await chat_runner.run("router", router_executor_temp, {"input": request.message})
+                except AgentBusy:
+                    raise
                 except Exception as e:
                     print(f"Router creation failed, falling back to sales: {e}")
                     if SALES_AGENT_AVAILABLE:
-                        result = sales_agent.invoke({"input": request.message})
+                        result = await chat_runner.run("sales", sales_agent, {"input": request.message})
                         response = result['output']
                         agent_used = "sales"
                     else:
                         response = f"Router agent error: {str(e)}"
                         agent_used = "error"
             else:
-                result = router_executor.invoke({"input": request.message})
+                result = await chat_runner.run("router", router_executor, {"input": request.message})
             
             if 'result' in locals() and result:
                 response = result['output']
-                agent_used = "router"
+                agent_used = ("router_fast_path" if result.get("fast_path")
+                              else "router_fan_out" if result.get("fan_out") else "router")
             
         elif SALES_AGENT_AVAILABLE:
             print("Fallback to Sales Agent")
-            result = sales_agent.invoke({"input": request.message})
+            result = await chat_runner.run("sales", sales_agent, {"input": request.message})
             response = result['output']
             agent_used = "sales"
             
@@ -225,6 +332,9 @@ async def chat_with_agent(request: ChatRequest):
             execution_time=execution_time
         )
     
+    except AgentBusy as e:
+        print(f"⏳ {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(f"Chat error: {str(e)}")
         import traceback
@@ -263,16 +373,12 @@ async def list_agents():
     return {"agents": agents}
 
 @app.get("/customers")
-async def get_customers(limit: int = 10):
-    """Get customer list"""
+async def get_customers(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Get one page of customers (newest first); pass next_cursor back for the next page"""
     try:
-        if SALES_AGENT_AVAILABLE:
-            result = sales_agent.invoke({"input": "show customers"})
-            return {"data": result['output'], "limit": limit}
-        else:
-            # Direct database query fallback
-            customers = sales_tools.sales_sql_read(f"SELECT * FROM customers LIMIT {limit}")
-            return {"data": str(customers), "limit": limit}
+        return await run_in_threadpool(sales_tools.list_customers_page, limit, cursor)  # blocking SQLite
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting customers: {str(e)}")
 
@@ -281,26 +387,24 @@ async def get_customer_summary():
     """Get customer summary statistics"""
     try:
         if SALES_AGENT_AVAILABLE:
-            result = sales_agent.invoke({"input": "customer summary"})
+            result = await chat_runner.run("sales", sales_agent, {"input": "customer summary"})
             return {"summary": result['output']}
         else:
             # Direct summary
             summary = sales_tools._customer_summary()
             return {"summary": summary}
+    except AgentBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting customer summary: {str(e)}")
 
 @app.get("/leads")
-async def get_leads():
-    """Get leads list"""
+async def get_leads(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Get one page of leads (newest first); pass next_cursor back for the next page"""
     try:
-        if SALES_AGENT_AVAILABLE:
-            result = sales_agent.invoke({"input": "show leads"})
-            return {"data": result['output']}
-        else:
-            # Direct database query
-            leads = sales_tools.sales_sql_read("SELECT * FROM leads LIMIT 10")
-            return {"data": str(leads)}
+        return await run_in_threadpool(sales_tools.list_leads_page, limit, cursor)  # blocking SQLite
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting leads: {str(e)}")
 
@@ -314,19 +418,56 @@ async def score_leads():
         raise HTTPException(status_code=500, detail=f"Error scoring leads: {str(e)}")
 
 @app.get("/orders")
-async def get_orders():
-    """Get orders list"""
+async def get_orders(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Get one page of orders (newest first); pass next_cursor back for the next page"""
     try:
-        if SALES_AGENT_AVAILABLE:
-            result = sales_agent.invoke({"input": "show orders"})
-            return {"data": result['output']}
-        else:
-            # Direct database query
-            orders = sales_tools.sales_sql_read("SELECT * FROM orders LIMIT 10")
-            return {"data": str(orders)}
+        return await run_in_threadpool(sales_tools.list_orders_page, limit, cursor)  # blocking SQLite
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting orders: {str(e)}")
 
+@app.get("/search")
+async def search_crm(q: str, types: Optional[str] = None, limit: int = Query(10, ge=1, le=100)):
+    """Ranked full-text search over customers, leads and tickets (types: comma-separated)"""
+    entities = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    try:
+        # FTS queries and a possible trigram refresh block: keep them off the event loop
+        results = await run_in_threadpool(sales_tools.search_crm, q, entities, limit=limit)
+        return {"query": q, "results": results, "count": len(results)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
+
+@app.post("/ingest/{table}")
+async def bulk_ingest_rows(table: str, request: Request, format: Optional[str] = None):
+    """
+    Bulk-load customers, leads or orders from a CSV or NDJSON request body.
+    The body is written to a temp file while it streams in, then validated and
+    inserted in chunked transactions; the report lists per-row rejects.
+    """
+    if table not in INGEST_SPECS:
+        raise HTTPException(status_code=404, detail=f"Bulk ingest supports {list(INGEST_SPECS)}")
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("ndjson" if "json" in content_type else "csv")
+    if fmt not in INGEST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(INGEST_FORMATS)}")
+
+    spool = tempfile.TemporaryFile()
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        # SQLite work is blocking: keep it off the event loop
+        return await run_in_threadpool(bulk_ingest, table, spool, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ingest error: {str(e)}")
+    finally:
+        spool.close()
+
 @app.post("/query", response_model=Dict)
 async def execute_query(request: QueryRequest):
     """Execute SQL query"""
@@ -334,9 +475,27 @@ async def execute_query(request: QueryRequest):
         if not request.query.strip().upper().startswith("SELECT"):
             raise HTTPException(status_code=400, detail="Only SELECT queries are allowed")
         
-        results = sales_tools.sales_sql_read(request.query)
+        if request.stream:
+            # Rows are pulled with fetchmany and sent as they are encoded;
+            # the trailing NDJSON line carries row count and rows/second.
+            # Executing blocks on SQLite, so it runs on the threadpool
+            stream = await run_in_threadpool(QueryStream, request.query, fmt=request.format,
+                                             max_rows=request.max_rows, budget="api")
+            return StreamingResponse(
+                iter(stream),
+                media_type=stream.media_type,
+                headers={"X-Row-Limit": str(stream.max_rows)},
+                background=BackgroundTask(stream.close)
+            )
+        
+        # A budgeted query can run for its full time limit: keep it off the event loop
+        results = await run_in_threadpool(execute_sql, request.query, read_only=True, budget="api", cache=True)
         return {"results": results, "row_count": len(results)}
     
+    except HTTPException:
+        raise
+    except QueryBudgetExceeded as e:
+        raise HTTPException(status_code=422, detail=e.to_dict())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
@@ -344,12 +503,10 @@ async def execute_query(request: QueryRequest):
 async def get_database_tables():
     """Get list of database tables"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-            tables = [row[0] for row in cursor.fetchall()]
+        schema = get_schema_catalog().snapshot()
+        tables = schema.tables
         
-        return {"tables": tables, "count": len(tables)}
+        return {"tables": tables, "count": len(tables), "schema_version": schema.schema_version}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -357,7 +514,7 @@ async def get_database_tables():
 async def get_database_stats():
     """Get database statistics"""
     try:
-        with get_db() as conn:
+        with get_read_db() as conn:
             cursor = conn.cursor()
             
             stats = {}
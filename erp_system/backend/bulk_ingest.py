@@ -0,0 +1,437 @@
+"""
+Bulk Ingestion
+
+Loads customers, leads and orders from CSV or NDJSON streams:
+
+1. Rows are parsed lazily and validated in batches of BULK_BATCH_ROWS
+   (types, required fields, enums; order customer ids are checked with one
+   IN query per batch). Bad rows are rejected individually with their line
+   number and reason; the rest of the batch still loads. Non-finite numbers
+   and booleans are rejected for numeric fields. A missing or empty
+   created_at gets the current UTC time (an explicit null is rejected), so
+   every row has a key for keyset pagination.
+2. Each batch is inserted with one ``executemany`` in its own transaction
+   on the writer lane, so chat logging only waits for one chunk at a time.
+   If SQLite refuses a chunk, only that chunk is rolled back: its rows are
+   reported as rejected and the following chunks still load.
+3. Per-row AFTER INSERT triggers that have a set-based equivalent (the
+   FTS sync triggers and the customer_stats rollup) are dropped inside the
+   chunk transaction, the chunk is inserted, the derived tables are caught
+   up with one INSERT ... SELECT over the new id range, and the triggers are
+   recreated before COMMIT. DDL is transactional in SQLite, so no other
+   connection ever sees the table without its triggers. Triggers without
+   a known equivalent are left in place.
+
+Secondary indexes are maintained as usual: rows arrive with ascending ids
+and mostly ascending created_at, which is the cheap case for B-tree
+appends, whereas dropping and recreating an index would rescan the whole
+table on every chunk.
+
+Usage:
+    python bulk_ingest.py leads leads.csv
+    python bulk_ingest.py orders orders.ndjson --format ndjson
+"""
+
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+from db import get_db
+from query_executor import written_tables, query_stats
+from customer_stats import ORDERS_INSERT_CATCHUP_SQL, ensure_customer_stats
+from search_index import SEARCH_ENTITIES, ensure_search_index, insert_catchup_sql
+
+BULK_BATCH_ROWS = int(os.getenv("BULK_BATCH_ROWS", "5000"))
+BULK_MAX_REJECTS_REPORTED = int(os.getenv("BULK_MAX_REJECTS_REPORTED", "1000"))
+BULK_DEFER_TRIGGERS = os.getenv("BULK_DEFER_TRIGGERS", "1") != "0"
+INGEST_FORMATS = ("csv", "ndjson")
+
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_CANONICAL_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+_SQLITE_INTEGER_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+class RowRejected(ValueError):
+    """A single row failed validation"""
+
+
+# -------- Field coercion --------
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _email(value: Any) -> Optional[str]:
+    value = _text(value)
+    if value is not None and not _EMAIL.match(value):
+        raise RowRejected(f"invalid email '{value}'")
+    return value
+
+
+def _real(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        raise RowRejected(f"not a number: {value}")
+    value = _text(value) if not isinstance(value, (int, float)) else value
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RowRejected(f"not a number: '{value}'")
+    if not math.isfinite(number):
+        raise RowRejected(f"not a finite number: '{value}'")
+    return number
+
+
+def _integer(value: Any) -> Optional[int]:
+    number = _real(value)
+    if number is None:
+        return None
+    if number != int(number):
+        raise RowRejected(f"not an integer: '{value}'")
+    number = int(value) if isinstance(value, int) else int(number)
+    if not _SQLITE_INTEGER_RANGE[0] <= number <= _SQLITE_INTEGER_RANGE[1]:
+        raise RowRejected(f"integer out of range: '{value}'")
+    return number
+
+
+def _timestamp(value: Any) -> Optional[str]:
+    """
+    Normalize to UTC 'YYYY-MM-DD HH:MM:SS' (the CURRENT_TIMESTAMP format) so
+    keyset ordering stays consistent; naive timestamps are taken as UTC.
+    """
+    value = _text(value)
+    if value is None:
+        return None
+    if value.lower() == "null":
+        raise RowRejected("timestamp must not be NULL")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise RowRejected(f"invalid timestamp '{value}'")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    elif _CANONICAL_TIMESTAMP.match(value):
+        return value
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _utc_now() -> str:
+    """Same format as SQLite's CURRENT_TIMESTAMP column default"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _one_of(*allowed: str) -> Callable[[Any], Optional[str]]:
+    def check(value: Any) -> Optional[str]:
+        value = _text(value)
+        if value is None:
+            return None
+        value = value.lower()
+        if value not in allowed:
+            raise RowRejected(f"status must be one of {list(allowed)}, got '{value}'")
+        return value
+    return check
+
+
+@dataclass(frozen=True)
+class IngestSpec:
+    """Columns accepted for one table"""
+    table: str
+    columns: Tuple[Tuple[str, Callable[[Any], Any]], ...]  # (column, coercion), in INSERT order
+    required: Tuple[str, ...]
+    aliases: Dict[str, str] = field(default_factory=dict)  # input field -> column
+    defaults: Dict[str, Any] = field(default_factory=dict)  # value or zero-argument callable
+    not_null: Tuple[str, ...] = ("created_at",)  # explicit JSON null is rejected, not defaulted
+
+    @property
+    def column_names(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+    @property
+    def insert_sql(self) -> str:
+        names = self.column_names
+        return (f"INSERT INTO {self.table} ({', '.join(names)}) "
+                f"VALUES ({', '.join('?' for _ in names)})")
+
+
+INGEST_SPECS: Dict[str, IngestSpec] = {
+    "customers": IngestSpec(
+        "customers",
+        columns=(("name", _text), ("email", _email), ("phone", _text), ("created_at", _timestamp)),
+        required=("name",),
+        aliases={"customer_name": "name", "contact_email": "email"},
+        defaults={"created_at": _utc_now},
+    ),
+    "leads": IngestSpec(
+        "leads",
+        columns=(("customer_name", _text), ("contact_email", _email), ("message", _text),
+                 ("score", _real), ("status", _one_of("new", "qualified", "lost")), ("created_at", _timestamp)),
+        required=("customer_name",),
+        aliases={"name": "customer_name", "email": "contact_email"},
+        defaults={"status": "new", "created_at": _utc_now},
+    ),
+    "orders": IngestSpec(
+        "orders",
+        columns=(("customer_id", _integer), ("total", _real),
+                 ("status", _one_of("pending", "paid", "shipped", "cancelled")), ("created_at", _timestamp)),
+        required=("customer_id", "total"),
+        defaults={"status": "pending", "created_at": _utc_now},
+    ),
+}
+
+
+# -------- Parsing --------
+def _text_lines(stream: IO) -> Iterable[str]:
+    """Text lines from a text or binary stream"""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def parse_rows(stream: IO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (line number, raw row) pairs. Undecodable NDJSON lines are
+    yielded as RowRejected so they are reported like validation failures.
+    """
+    if fmt not in INGEST_FORMATS:
+        raise ValueError(f"Unknown ingest format '{fmt}', expected one of {INGEST_FORMATS}")
+    lines = _text_lines(stream)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, RowRejected(f"invalid JSON: {e.msg}")
+            continue
+        yield line_no, row if isinstance(row, dict) else RowRejected("NDJSON line is not an object")
+
+
+@lru_cache(maxsize=256)
+def _column_name(table: str, key: str) -> str:
+    """Map an input field name (header) to a column; cached since headers repeat every row"""
+    key = key.strip().lower()
+    return INGEST_SPECS[table].aliases.get(key, key)
+
+
+def _validate(spec: IngestSpec, raw: Any) -> Tuple:
+    if isinstance(raw, RowRejected):
+        raise raw
+    row = {_column_name(spec.table, key): value for key, value in raw.items() if key is not None}
+    values = []
+    for name, coerce in spec.columns:
+        if name in spec.not_null and name in row and row[name] is None:
+            raise RowRejected(f"'{name}' must not be null")
+        value = coerce(row.get(name))
+        if value is None:
+            # Bound NULLs bypass the column DEFAULT, so fill it in here
+            value = spec.defaults.get(name)
+            if callable(value):
+                value = value()
+        if value is None and name in spec.required:
+            raise RowRejected(f"missing required field '{name}'")
+        values.append(value)
+    return tuple(values)
+
+
+# -------- Deferred triggers --------
+def _catchup_statements() -> Dict[str, str]:
+    """Insert trigger name -> set-based statement over rows with id > ?"""
+    statements = {"trg_orders_stats_insert": ORDERS_INSERT_CATCHUP_SQL}
+    for entity in SEARCH_ENTITIES.values():
+        statements[f"trg_{entity.table}_fts_insert"] = insert_catchup_sql(entity)
+    return statements
+
+
+def _deferrable_triggers(conn, table: str) -> List[Tuple[str, str, str]]:
+    """(name, CREATE sql, catch-up sql) for this table's insert triggers we can replace"""
+    catchup = _catchup_statements()
+    return [
+        (name, sql, catchup[name])
+        for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table,)
+        ).fetchall()
+        if name in catchup
+    ]
+
+
+class BulkIngestor:
+    """Validates and loads one stream into one table"""
+
+    def __init__(self, table: str, db_path: Optional[str] = None, batch_size: int = BULK_BATCH_ROWS,
+                 defer_triggers: bool = BULK_DEFER_TRIGGERS):
+        if table not in INGEST_SPECS:
+            raise ValueError(f"Bulk ingest is not supported for '{table}', expected one of {list(INGEST_SPECS)}")
+        self.spec = INGEST_SPECS[table]
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.defer_triggers = defer_triggers
+        self.rows_read = 0
+        self.rows_inserted = 0
+        self.rows_rejected = 0
+        self.chunks = 0
+        self.chunks_failed = 0
+        self.rejects: List[Dict] = []
+        self.deferred: List[str] = []
+
+        # Derived tables must exist so their triggers (or catch-up) run
+        ensure_customer_stats(db_path)
+        ensure_search_index(db_path)
+
+    def _reject(self, line: int, error: str, raw: Any = None):
+        self.rows_rejected += 1
+        if len(self.rejects) < BULK_MAX_REJECTS_REPORTED:
+            reject = {"line": line, "error": error}
+            if isinstance(raw, dict):
+                reject["row"] = raw
+            self.rejects.append(reject)
+
+    def _validate_batch(self, conn, batch: List[Tuple[int, Any]]) -> List[Tuple[int, Tuple]]:
+        valid: List[Tuple[int, Tuple]] = []
+        for line, raw in batch:
+            try:
+                valid.append((line, _validate(self.spec, raw)))
+            except RowRejected as e:
+                self._reject(line, str(e), raw)
+
+        if self.spec.table == "orders" and valid:
+            # One lookup per batch for the foreign key instead of one per row
+            ids = sorted({values[0] for _, values in valid})
+            placeholders = ", ".join("?" for _ in ids)
+            known = {row[0] for row in conn.execute(
+                f"SELECT id FROM customers WHERE id IN ({placeholders})", ids).fetchall()}
+            checked = []
+            for line, values in valid:
+                if values[0] in known:
+                    checked.append((line, values))
+                else:
+                    self._reject(line, f"unknown customer_id {values[0]}")
+            valid = checked
+        return valid
+
+    def _load_chunk(self, conn, valid: List[Tuple[int, Tuple]]):
+        """Insert one validated chunk; a chunk SQLite refuses is rolled back and its rows rejected"""
+        table = self.spec.table
+        rows = [values for _, values in valid]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            triggers = _deferrable_triggers(conn, table) if self.defer_triggers else []
+            for name, _, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+            conn.executemany(self.spec.insert_sql, rows)
+            for name, create_sql, catchup_sql in triggers:
+                conn.execute(catchup_sql, (last_id,))
+                conn.execute(create_sql)
+            conn.commit()
+        except (sqlite3.Error, OverflowError, ValueError) as e:
+            conn.rollback()
+            self.chunks_failed += 1
+            for line, values in valid:
+                self._reject(line, f"chunk rejected by database: {e}")
+            print(f"⚠️ Bulk ingest chunk of {len(rows)} {table} rows failed: {e}")
+            return
+        except Exception:
+            conn.rollback()
+            raise
+        self.deferred = [name for name, _, _ in triggers]
+        self.rows_inserted += len(rows)
+        self.chunks += 1
+
+    def run(self, stream: IO, fmt: str = "csv") -> Dict:
+        """Ingest a whole stream; returns the load report"""
+        start = time.perf_counter()
+        tables = written_tables([self.spec.insert_sql], self.db_path)
+        batch: List[Tuple[int, Any]] = []
+
+        def flush():
+            with get_db(self.db_path, tables=tables) as conn:
+                valid = self._validate_batch(conn, batch)
+                if valid:
+                    self._load_chunk(conn, valid)
+
+        for line, raw in parse_rows(stream, fmt):
+            self.rows_read += 1
+            batch.append((line, raw))
+            if len(batch) >= self.batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+
+        elapsed = time.perf_counter() - start
+        query_stats.record(f"BULK {self.spec.insert_sql}", elapsed * 1000, rows=self.rows_inserted)
+        report = {
+            "table": self.spec.table,
+            "format": fmt,
+            "rows_read": self.rows_read,
+            "rows_inserted": self.rows_inserted,
+            "rows_rejected": self.rows_rejected,
+            "chunks": self.chunks,
+            "chunks_failed": self.chunks_failed,
+            "deferred_triggers": self.deferred,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "rows_per_second": round(self.rows_inserted / elapsed, 1) if elapsed > 0 else None,
+            "rejects": self.rejects,
+            "rejects_truncated": self.rows_rejected > len(self.rejects),
+        }
+        print(f"📥 Ingested {self.rows_inserted} {self.spec.table} rows "
+              f"({self.rows_rejected} rejected, {report['rows_per_second']} rows/s)")
+        return report
+
+
+def ingest(table: str, stream: IO, fmt: str = "csv", db_path: Optional[str] = None,
+           batch_size: int = BULK_BATCH_ROWS) -> Dict:
+    """
+    Bulk-load a CSV or NDJSON stream into customers, leads or orders.
+
+    Raises:
+        ValueError: for an unsupported table or format
+    """
+    return BulkIngestor(table, db_path, batch_size).run(stream, fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load customers, leads or orders from CSV/NDJSON")
+    parser.add_argument("table", choices=list(INGEST_SPECS))
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=INGEST_FORMATS, default=None,
+                        help="defaults to ndjson for .ndjson/.jsonl files, csv otherwise")
+    parser.add_argument("--db", default=None, help="database file (defaults to DB_PATH)")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_ROWS)
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    if args.path == "-":
+        report = ingest(args.table, sys.stdin.buffer, fmt, args.db, args.batch_size)
+    else:
+        with open(args.path, "rb") as stream:
+            report = ingest(args.table, stream, fmt, args.db, args.batch_size)
+    print(json.dumps({k: v for k, v in report.items() if k != "rejects"}, indent=2))
+    for reject in report["rejects"][:20]:
+        print(f"   line {reject['line']}: {reject['error']}")
+
+
+if __name__ == "__main__":
+    main()
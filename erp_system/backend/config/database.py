@@ -1,12 +1,8 @@
-from db import get_db
+from schema_catalog import get_schema_catalog
 
 def get_table_names():
     """Get list of table names from the database"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            return [table[0] for table in tables]
+        return get_schema_catalog().snapshot().tables
     except Exception as e:
         return []
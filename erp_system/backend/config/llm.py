@@ -1,25 +1,52 @@
+import hashlib
+import json
 import os
-from typing import Any, List, Optional, Dict
-from langchain_core.language_models.llms import LLM
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+import threading
+import time
+from typing import Any, Callable, List, Optional, Dict
+from uuid import UUID
+from langchain_core.language_models.llms import LLM, BaseLLM
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 
 try:
     from langchain_ollama import OllamaLLM
+    from config.ollama_endpoints import get_endpoint_monitor, is_connection_error
     OLLAMA_AVAILABLE = True
 except ImportError:
     OLLAMA_AVAILABLE = False
 
 try:
-    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAI, GoogleGenerativeAIEmbeddings
     GOOGLE_GENAI_AVAILABLE = True
 except ImportError:
     GOOGLE_GENAI_AVAILABLE = False
 
+# LLM_PROVIDER: auto (Gemini, then Ollama, then MockLLM), mock, recorded, or
+# record (wrap the auto provider and save every response to LLM_RECORDINGS)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "auto").lower()
+LLM_RECORDINGS = os.getenv(
+    "LLM_RECORDINGS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                 "benchmarks", "llm_recordings.json"),
+)
+# Simulated provider latency for mock/recorded responses
+LLM_MOCK_LATENCY_MS = float(os.getenv("LLM_MOCK_LATENCY_MS", "0"))
+# Send one tiny prompt when a shared provider client is created, so the TLS
+# handshake and connection setup happen off the request path
+LLM_WARMUP = os.getenv("LLM_WARMUP", "0") == "1"
+LLM_WARMUP_PROMPT = "ping"
+
+GEMINI_CHAT_MODEL = "gemini-2.5-flash-lite"
+OLLAMA_MODEL = "llama3.1:8b"
+
 class MockLLM(LLM):
     """Mock LLM for testing when Ollama is not available"""
     
     # Use class variable instead of instance variable
     _call_count: int = 0
+    latency_ms: float = 0.0
     
     @property
     def _llm_type(self) -> str:
@@ -34,6 +61,8 @@ class MockLLM(LLM):
     ) -> str:
         # Increment call count to avoid infinite loops
         MockLLM._call_count += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
         
         # Simple mock responses for testing
         prompt_lower = prompt.lower()
@@ -43,6 +72,7 @@ class MockLLM(LLM):
             
             # Extract the question/input from the prompt
             question = ""
+            question_part = ""
             if "question:" in prompt_lower:
                 question_part = prompt_lower.split("question:")[-1]
                 if "thought:" in question_part:
@@ -68,11 +98,17 @@ class MockLLM(LLM):
                 available_tools.append("get_customer_summary")
             if "search_customers" in prompt_lower:
                 available_tools.append("search_customers")
+            if "text_to_sql" in prompt_lower:
+                available_tools.append("text_to_sql")
+            if "sales_sql_query" in prompt_lower:
+                available_tools.append("sales_sql_query")
             
-            # Check if we've already taken an action (to avoid loops)
-            if "observation:" in prompt_lower and MockLLM._call_count > 1:
-                return """Thought: I now have the final answer
-Final Answer: Here is the information you requested based on the previous action."""
+            # An observation in the scratchpad means a tool already ran: restate it, as a model would
+            if "observation:" in question_part:
+                observation = prompt[prompt.lower().rindex("observation:") + len("observation:"):]
+                observation = observation.split("\nThought:")[0].strip()
+                return f"""Thought: I now have the final answer
+Final Answer: {observation}"""
             
             # Router Agent responses
             if "execute_with_sales_agent" in available_tools:
@@ -117,6 +153,29 @@ Action Input: """
 Action: get_customers
 Action Input: """
             
+            # Sales Agent, or the flat router that exposes the sub-agents' tools directly
+            elif "sales_sql_query" in available_tools:
+                if "get_system_info" in available_tools and ("system" in question or "health" in question):
+                    return """I should get system information.
+
+Action: get_system_info
+Action Input: """
+                tool = "sales_sql_query"
+                if "text_to_sql" in available_tools and any(
+                        word in question for word in ("revenue", "trend", "average", "total", "analy")):
+                    tool = "text_to_sql"
+                return f"""I should query the database for this.
+
+Action: {tool}
+Action Input: {question}"""
+            
+            # Analytics Agent responses
+            elif "text_to_sql" in available_tools:
+                return f"""I should query the database for this.
+
+Action: text_to_sql
+Action Input: {question}"""
+            
             # Fallback for unknown tools
             else:
                 if "customer" in question:
@@ -128,6 +187,10 @@ Action Input: """
                     return """I need to help with this request.
 
 Final Answer: I can help you with various tasks. Please specify what you need assistance with."""
+        elif "to a sql query" in prompt_lower:
+            # text_to_sql / sales_sql_query prompt: a representative aggregate over orders
+            return ("SELECT status, COUNT(*) AS orders, ROUND(SUM(total), 2) AS revenue "
+                    "FROM orders GROUP BY status ORDER BY revenue DESC")
         else:
             # Regular response
             return "Mock response: I'm a test LLM. Ollama is not available."
@@ -138,53 +201,421 @@ Final Answer: I can help you with various tasks. Please specify what you need as
         MockLLM._call_count = 0
         return self
 
+def prompt_key(prompt: str, stop: Optional[List[str]] = None) -> str:
+    """Stable key for a prompt in a recordings file"""
+    raw = prompt + "\x00" + "\x1f".join(stop or [])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+_recordings: Dict[str, Dict[str, str]] = {}
+_recordings_lock = threading.Lock()
+
+
+def _load_recordings(path: str) -> Dict[str, str]:
+    with _recordings_lock:
+        if path not in _recordings:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    _recordings[path] = json.load(f).get("responses", {})
+            except FileNotFoundError:
+                _recordings[path] = {}
+        return _recordings[path]
+
+
+class RecordedLLM(LLM):
+    """
+    Replays responses saved by RecordingLLM, keyed by prompt_key(). Prompts
+    that were never recorded get the MockLLM answer, so runs stay
+    deterministic either way.
+    """
+
+    recordings_path: str = LLM_RECORDINGS
+    latency_ms: float = 0.0
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "recorded"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        response = _load_recordings(self.recordings_path).get(prompt_key(prompt, stop))
+        if response is None:
+            self.misses += 1
+            return MockLLM(latency_ms=self.latency_ms)._call(prompt, stop)
+        self.hits += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return response
+
+
+class RecordingLLM(LLM):
+    """Pass-through to a real provider that saves every response for RecordedLLM"""
+
+    inner: Any
+    recordings_path: str = LLM_RECORDINGS
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        result = self.inner.invoke(prompt, stop=stop)
+        response = getattr(result, "content", result)  # chat models return messages
+        responses = _load_recordings(self.recordings_path)
+        with _recordings_lock:
+            responses[prompt_key(prompt, stop)] = response
+            os.makedirs(os.path.dirname(self.recordings_path) or ".", exist_ok=True)
+            tmp_path = f"{self.recordings_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "responses": responses}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.recordings_path)
+        return response
+
+
+class FailoverOllamaLLM(LLM):
+    """
+    Ollama client that follows the endpoint monitor. Agent executors keep
+    their LLM for the life of the process, so instead of binding one
+    base_url at startup this resolves the monitor's active endpoint on
+    every call and delegates to that endpoint's shared client. A call that
+    fails to connect opens the breaker (via the client's on_error) and is
+    retried once on the endpoint the monitor fails over to.
+    """
+
+    model: str = OLLAMA_MODEL
+    temperature: float = 0.1
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-failover"
+
+    def _client(self):
+        base_url = get_endpoint_monitor().active_endpoint()
+        if not base_url:
+            raise ConnectionError("No Ollama endpoint is up")
+        return base_url, _ollama_client(base_url, self.model, self.temperature)
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        base_url, client = self._client()
+        try:
+            return client.invoke(prompt, stop=stop, **kwargs)
+        except Exception as e:
+            if not is_connection_error(e) or get_endpoint_monitor().active_endpoint() in (None, base_url):
+                raise
+            return self._client()[1].invoke(prompt, stop=stop, **kwargs)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        base_url, client = self._client()
+        try:
+            return await client.ainvoke(prompt, stop=stop, **kwargs)
+        except Exception as e:
+            if not is_connection_error(e) or get_endpoint_monitor().active_endpoint() in (None, base_url):
+                raise
+            return await self._client()[1].ainvoke(prompt, stop=stop, **kwargs)
+
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """
+    Records call latency and time to first token for one shared client.
+    Non-streaming calls deliver every token at the end, so their first
+    token time is the full call.
+    """
+
+    def __init__(self, stats: Dict[str, Any], lock: threading.Lock,
+                 on_error: Optional[Callable[[BaseException], None]] = None):
+        self.stats = stats
+        self._lock = lock
+        self._on_error = on_error
+        self._starts: Dict[UUID, float] = {}
+        self._first_token: Dict[UUID, float] = {}
+
+    def _start(self, run_id: UUID):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._start(run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        if run_id in self._starts and run_id not in self._first_token:
+            self._first_token[run_id] = time.perf_counter() - self._starts[run_id]
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        first_token = self._first_token.pop(run_id, None)
+        first_token_ms = first_token * 1000 if first_token is not None else elapsed_ms
+        with self._lock:
+            stats = self.stats
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["total_first_token_ms"] += first_token_ms
+            if stats["first_call_ms"] is None:
+                # Includes connection setup and TLS handshake unless warmed up
+                stats["first_call_ms"] = round(elapsed_ms, 3)
+                stats["first_call_first_token_ms"] = round(first_token_ms, 3)
+            stats["last_ms"] = round(elapsed_ms, 3)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._starts.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+        with self._lock:
+            self.stats["errors"] += 1
+        if self._on_error is not None:
+            self._on_error(error)
+
+
+class LLMClientRegistry:
+    """
+    Process-wide LLM clients keyed by provider, model and parameters.
+
+    Each key is constructed once and then shared by every agent, tool and
+    request thread, so the provider's HTTP/gRPC connection stays open
+    between questions instead of paying client setup and a TLS handshake
+    per call. LangChain provider clients are safe to share across threads.
+    """
+
+    def __init__(self):
+        self._clients: Dict[tuple, Any] = {}
+        self._stats: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(provider: str, model: str, params: Dict[str, Any]) -> tuple:
+        return provider, model, tuple(sorted((name, repr(value)) for name, value in params.items()))
+
+    def get(self, provider: str, model: str, factory: Callable[[List[BaseCallbackHandler]], Any], *,
+            on_error: Optional[Callable[[BaseException], None]] = None, **params) -> Any:
+        """
+        Shared client for (provider, model, params), built by ``factory``
+        on first use. ``factory`` receives the timing callbacks to attach;
+        ``params`` only identify the client, so keep secrets out of them.
+        ``on_error`` is called with every exception the client raises.
+        """
+        key = self._key(provider, model, params)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    stats = {
+                        "construct_ms": None, "reuses": 0, "calls": 0, "errors": 0,
+                        "first_call_ms": None, "first_call_first_token_ms": None, "last_ms": None,
+                        "total_ms": 0.0, "total_first_token_ms": 0.0, "warmup_ms": None,
+                    }
+                    start = time.perf_counter()
+                    client = factory([LLMTimingCallback(stats, self._lock, on_error)])
+                    stats["construct_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                    self._clients[key] = client
+                    self._stats[key] = stats
+                    print(f"🤖 Created shared {provider} client {model} ({stats['construct_ms']:.1f} ms)")
+                    if LLM_WARMUP and provider in ("gemini", "gemini-chat", "ollama"):
+                        threading.Thread(target=self._warm_up, args=(client, stats), daemon=True,
+                                         name=f"llm-warmup-{provider}").start()
+                    return client
+        with self._lock:
+            self._stats[key]["reuses"] += 1
+        return client
+
+    def _warm_up(self, client: Any, stats: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            client.invoke(LLM_WARMUP_PROMPT)
+            stats["warmup_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        except Exception as e:
+            print(f"⚠️ LLM warm-up failed: {e}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = []
+            for (provider, model, params), stats in self._stats.items():
+                stats = dict(stats)
+                calls = stats["calls"]
+                total_ms = stats.pop("total_ms")
+                total_first_token_ms = stats.pop("total_first_token_ms")
+                stats["avg_ms"] = round(total_ms / calls, 3) if calls else None
+                stats["avg_first_token_ms"] = round(total_first_token_ms / calls, 3) if calls else None
+                rows.append({"provider": provider, "model": model, "params": dict(params), **stats})
+            return rows
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._stats.clear()
+
+
+_registry = LLMClientRegistry()
+
+
+def get_llm_registry() -> LLMClientRegistry:
+    return _registry
+
+
+def get_llm_client_stats() -> List[Dict[str, Any]]:
+    """Construction, reuse, latency and first-token timings per shared client"""
+    return _registry.stats()
+
+
+def _mock_llm():
+    return _registry.get(
+        "mock", "mock",
+        lambda callbacks: MockLLM(latency_ms=LLM_MOCK_LATENCY_MS, callbacks=callbacks),
+        latency_ms=LLM_MOCK_LATENCY_MS,
+    )
+
+
+def _recorded_llm():
+    return _registry.get(
+        "recorded", "recorded",
+        lambda callbacks: RecordedLLM(recordings_path=LLM_RECORDINGS, latency_ms=LLM_MOCK_LATENCY_MS,
+                                      callbacks=callbacks),
+        recordings=LLM_RECORDINGS, latency_ms=LLM_MOCK_LATENCY_MS,
+    )
+
+
+def _recording_llm(inner):
+    """RecordingLLM around a shared client (one wrapper per inner client)"""
+    return _registry.get(
+        "record", getattr(inner, "model", None) or inner._llm_type,
+        lambda callbacks: RecordingLLM(inner=inner, recordings_path=LLM_RECORDINGS, callbacks=callbacks),
+        recordings=LLM_RECORDINGS, inner=id(inner),
+    )
+
+
 def get_llm():
-    """Get the appropriate LLM instance"""
-    import os
-    
+    """Shared LLM client selected by LLM_PROVIDER"""
+    if LLM_PROVIDER == "mock":
+        return _mock_llm()
+    if LLM_PROVIDER == "recorded":
+        return _recorded_llm()
+    if LLM_PROVIDER == "record":
+        return _recording_llm(_auto_llm())
+    return _auto_llm()
+
+
+def supports_native_async(llm) -> bool:
+    """
+    True when the client implements async generation itself (Gemini and
+    Ollama do). For the others LangChain's ainvoke just runs the sync call
+    on the event loop's default executor, so callers are better off using
+    their own bounded pool.
+    """
+    cls = type(llm)
+    if isinstance(llm, LLM):
+        return cls._acall is not LLM._acall or cls._agenerate is not LLM._agenerate
+    for base in (BaseChatModel, BaseLLM):
+        if isinstance(llm, base):
+            return cls._agenerate is not base._agenerate
+    return False
+
+
+def get_gemini_llm(model: str, **params):
+    """
+    Shared GoogleGenerativeAI (completion) client for ``model``; mock,
+    recorded and record providers apply as in get_llm()
+    """
+    if LLM_PROVIDER == "mock":
+        return _mock_llm()
+    if LLM_PROVIDER == "recorded":
+        return _recorded_llm()
+    llm = _registry.get(
+        "gemini", model,
+        lambda callbacks: GoogleGenerativeAI(model=model, callbacks=callbacks, **params),
+        **params,
+    )
+    if LLM_PROVIDER == "record":
+        return _recording_llm(llm)
+    return llm
+
+
+def get_embeddings(model: str):
+    """Shared Google embeddings client for ``model``"""
+    return _registry.get("gemini-embeddings", model, lambda callbacks: GoogleGenerativeAIEmbeddings(model=model))
+
+
+def _auto_llm():
+    """Shared Gemini, Ollama or MockLLM client, in that order of preference"""
     # Try Google Gemini first
     if GOOGLE_GENAI_AVAILABLE:
         google_api_key = os.getenv("GOOGLE_API_KEY")
         if google_api_key:
             try:
-                print("🤖 Using Google Gemini")
-                return ChatGoogleGenerativeAI(
-                    # model="gemini-2.5-flash",
-                    model="gemini-2.5-flash-lite",
-                    google_api_key=google_api_key,
+                return _registry.get(
+                    "gemini-chat", GEMINI_CHAT_MODEL,
+                    lambda callbacks: ChatGoogleGenerativeAI(
+                        model=GEMINI_CHAT_MODEL,
+                        google_api_key=google_api_key,
+                        temperature=0.1,
+                        convert_system_message_to_human=True,
+                        callbacks=callbacks,
+                    ),
                     temperature=0.1,
-                    convert_system_message_to_human=True
                 )
             except Exception as e:
                 print(f"⚠️ Google Gemini configuration error: {e}")
     
-    # Fallback to Ollama
+    # Fallback to Ollama: the endpoint comes from the background health
+    # checker, so a down Ollama costs nothing here. The failover wrapper
+    # re-resolves it per call, so executors built now follow later failovers
     if OLLAMA_AVAILABLE:
         try:
-            # Try to connect to Ollama - try both localhost and host.docker.internal
-            import requests
-            ollama_urls = [
-                "http://localhost:11434",
-                "http://host.docker.internal:11434",
-                "http://172.17.0.1:11434",  # Docker bridge network
-            ]
-            
-            for base_url in ollama_urls:
-                try:
-                    response = requests.get(f"{base_url}/api/tags", timeout=2)
-                    if response.status_code == 200:
-                        print(f"✅ Connected to Ollama at {base_url}")
-                        return OllamaLLM(
-                            model="llama3.1:8b",  # Use the model we actually have
-                            base_url=base_url,
-                            temperature=0.1
-                        )
-                except requests.RequestException:
-                    continue
-                    
-            print("⚠️ Ollama not reachable from any URL")
+            if get_endpoint_monitor().active_endpoint():
+                return _registry.get(
+                    "ollama-failover", OLLAMA_MODEL,
+                    lambda callbacks: FailoverOllamaLLM(model=OLLAMA_MODEL, temperature=0.1, callbacks=callbacks),
+                    temperature=0.1,
+                )
         except Exception as e:
             print(f"Warning: Ollama configuration error: {e}")
     
-    print("Using MockLLM for testing")
-    return MockLLM()
+    return _mock_llm()
+
+
+def _ollama_client(base_url: str, model: str = OLLAMA_MODEL, temperature: float = 0.1):
+    """Shared OllamaLLM bound to ``base_url``; connection errors open its breaker"""
+    monitor = get_endpoint_monitor()
+
+    def report_failure(error: BaseException):
+        if is_connection_error(error):
+            monitor.report_failure(base_url, error)
+
+    return _registry.get(
+        "ollama", model,
+        lambda callbacks: OllamaLLM(
+            model=model,  # Use the model we actually have
+            base_url=base_url,
+            temperature=temperature,
+            callbacks=callbacks,
+        ),
+        on_error=report_failure,
+        base_url=base_url, temperature=temperature,
+    )
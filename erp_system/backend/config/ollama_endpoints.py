@@ -0,0 +1,230 @@
+"""
+Ollama endpoint discovery with background health checking
+==========================================================
+Resolves which Ollama URL to use once, then keeps the answer current from
+a daemon thread, so get_llm() never waits on a probe. The client get_llm()
+hands out asks active_endpoint() on every call, so long-lived agent
+executors follow failovers.
+
+Each endpoint is a small circuit breaker:
+- up:      probes pass; the first up endpoint (in OLLAMA_URLS order) is active
+- down:    OLLAMA_FAILURE_THRESHOLD consecutive probe failures, or a failed
+           LLM call reported by the client; callers fail over immediately
+- unknown: not probed yet
+
+Down endpoints stay in the probe loop, so they come back as soon as a
+health check succeeds. State is exposed at GET /llm/endpoints.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+
+DEFAULT_OLLAMA_URLS = [
+    "http://localhost:11434",
+    "http://host.docker.internal:11434",
+    "http://172.17.0.1:11434",  # Docker bridge network
+]
+OLLAMA_URLS = [url.strip().rstrip("/") for url in os.getenv("OLLAMA_URLS", ",".join(DEFAULT_OLLAMA_URLS)).split(",")
+               if url.strip()]
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "30"))
+OLLAMA_PROBE_TIMEOUT = float(os.getenv("OLLAMA_PROBE_TIMEOUT", "2"))
+OLLAMA_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "2"))
+
+
+class EndpointState:
+    """Health of one Ollama URL"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.state = "unknown"
+        self.consecutive_failures = 0
+        self.last_checked: Optional[float] = None
+        self.last_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.down_since: Optional[float] = None
+        self.probes = 0
+        self.failures = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_checked": self.last_checked,
+            "last_latency_ms": self.last_latency_ms,
+            "last_error": self.last_error,
+            "down_since": self.down_since,
+            "probes": self.probes,
+            "failures": self.failures,
+        }
+
+
+class OllamaEndpointMonitor:
+    """Background health checker and circuit breaker for a list of Ollama URLs"""
+
+    def __init__(self, urls: List[str] = None, interval: float = OLLAMA_HEALTH_INTERVAL,
+                 timeout: float = OLLAMA_PROBE_TIMEOUT, failure_threshold: int = OLLAMA_FAILURE_THRESHOLD):
+        self.endpoints = [EndpointState(url) for url in (urls if urls is not None else OLLAMA_URLS)]
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = max(1, failure_threshold)
+        self.session = requests.Session()  # keep-alive across probes
+        self.resolved = False
+        self.failovers = 0
+        self._active: Optional[str] = None
+        self._lock = threading.Lock()
+        self._resolve_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------ probing
+    def _probe(self, endpoint: EndpointState) -> bool:
+        start = time.perf_counter()
+        try:
+            response = self.session.get(f"{endpoint.url}/api/tags", timeout=self.timeout)
+            ok = response.status_code == 200
+            error = None if ok else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        with self._lock:
+            endpoint.probes += 1
+            endpoint.last_checked = time.time()
+            endpoint.last_latency_ms = round((time.perf_counter() - start) * 1000, 3)
+            if ok:
+                self._mark_up(endpoint)
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                endpoint.last_error = error
+                # A never-seen endpoint is down on its first failure; a healthy one gets a grace probe
+                if endpoint.state == "unknown" or endpoint.consecutive_failures >= self.failure_threshold:
+                    self._mark_down(endpoint)
+            self._update_active()
+        return ok
+
+    def check_all(self):
+        """Probe every endpoint in parallel (one timeout of wall time, not one per URL)"""
+        if not self.endpoints:
+            return
+        with ThreadPoolExecutor(max_workers=len(self.endpoints), thread_name_prefix="ollama-probe") as pool:
+            list(pool.map(self._probe, self.endpoints))
+
+    def _mark_up(self, endpoint: EndpointState):
+        if endpoint.state != "up":
+            print(f"✅ Ollama endpoint up: {endpoint.url}")
+        endpoint.state = "up"
+        endpoint.consecutive_failures = 0
+        endpoint.last_error = None
+        endpoint.down_since = None
+
+    def _mark_down(self, endpoint: EndpointState):
+        if endpoint.state != "down":
+            if endpoint.state == "up":
+                print(f"⚠️ Ollama endpoint down: {endpoint.url} ({endpoint.last_error})")
+            endpoint.state = "down"
+            endpoint.down_since = time.time()
+
+    def _update_active(self):
+        active = next((endpoint.url for endpoint in self.endpoints if endpoint.state == "up"), None)
+        if self._active is not None and active != self._active:
+            self.failovers += 1
+            print(f"🔀 Ollama failover: {self._active} -> {active or 'none'}")
+        self._active = active
+
+    # ------------------------------------------------------------- public
+    def active_endpoint(self) -> Optional[str]:
+        """
+        URL of the preferred healthy endpoint, or None when all are down.
+        Only the very first call waits on probes; after that the answer
+        comes from the background checker and reported failures.
+        """
+        if not self.resolved:
+            with self._resolve_lock:
+                if not self.resolved:
+                    self.check_all()
+                    self.resolved = True
+                    self.start()
+        return self._active
+
+    def report_failure(self, url: str, error: BaseException):
+        """Open the breaker for ``url`` after a failed call, so the next caller fails over"""
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.url == url.rstrip("/"):
+                    endpoint.failures += 1
+                    endpoint.consecutive_failures += 1
+                    endpoint.last_error = f"{type(error).__name__}: {error}"
+                    self._mark_down(endpoint)
+            self._update_active()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="ollama-health", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_all()
+            except Exception as e:
+                print(f"⚠️ Ollama health check failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        self.session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resolved": self.resolved,
+                "active": self._active,
+                "failovers": self.failovers,
+                "interval_s": self.interval,
+                "failure_threshold": self.failure_threshold,
+                "endpoints": [endpoint.to_dict() for endpoint in self.endpoints],
+            }
+
+
+_monitor: Optional[OllamaEndpointMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_endpoint_monitor() -> OllamaEndpointMonitor:
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = OllamaEndpointMonitor()
+    return _monitor
+
+
+def get_endpoint_stats() -> Dict[str, Any]:
+    """Endpoint states without triggering discovery"""
+    if _monitor is None:
+        return {"resolved": False, "active": None, "endpoints": [{"url": url, "state": "unknown"} for url in OLLAMA_URLS]}
+    return _monitor.stats()
+
+
+def stop_endpoint_monitor():
+    global _monitor
+    with _monitor_lock:
+        if _monitor is not None:
+            _monitor.stop()
+            _monitor = None
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Transport-level failures (refused, reset, timed out) as opposed to model errors"""
+    if isinstance(error, (OSError, requests.ConnectionError, requests.Timeout)):
+        return True
+    # httpx (used by the Ollama client) has its own hierarchy
+    return any(name in ("TransportError", "TimeoutException") for name in
+               (cls.__name__ for cls in type(error).__mro__))
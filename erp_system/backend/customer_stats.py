@@ -0,0 +1,270 @@
+"""
+Customer Stats Rollup
+
+``customer_stats`` holds one row per customer with ``order_count``,
+``total_spent`` and ``last_order_at``. Triggers on ``orders`` keep it
+current on every INSERT, UPDATE and DELETE, so customer listings join one
+row per customer instead of aggregating the whole order history on each call.
+
+Customers without orders have no row; readers LEFT JOIN and COALESCE to 0.
+
+Usage:
+    python customer_stats.py install   # create table + triggers, backfill if new
+    python customer_stats.py rebuild   # recompute every row from orders
+    python customer_stats.py check     # report rows that disagree with orders
+"""
+
+import argparse
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+from db import DB_PATH, get_db, get_read_db
+
+# Incremental += / -= on REAL drifts by a few ulps; differences below this are not reported
+TOTAL_TOLERANCE = 0.005
+
+# One statement per entry, so install can run them with execute() inside a
+# single transaction together with the backfill (executescript commits first)
+CUSTOMER_STATS_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS customer_stats (
+        customer_id INTEGER PRIMARY KEY REFERENCES customers(id),
+        order_count INTEGER NOT NULL DEFAULT 0,
+        total_spent REAL NOT NULL DEFAULT 0,
+        last_order_at DATETIME
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_customer_stats_total_spent ON customer_stats(total_spent DESC)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_orders_stats_insert AFTER INSERT ON orders
+    BEGIN
+        INSERT INTO customer_stats (customer_id, order_count, total_spent, last_order_at)
+        VALUES (NEW.customer_id, 1, COALESCE(NEW.total, 0), NEW.created_at)
+        ON CONFLICT(customer_id) DO UPDATE SET
+            order_count = order_count + 1,
+            total_spent = total_spent + excluded.total_spent,
+            last_order_at = CASE WHEN last_order_at IS NULL OR excluded.last_order_at > last_order_at
+                                 THEN excluded.last_order_at ELSE last_order_at END;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_orders_stats_delete AFTER DELETE ON orders
+    BEGIN
+        UPDATE customer_stats SET
+            order_count = order_count - 1,
+            total_spent = total_spent - COALESCE(OLD.total, 0),
+            last_order_at = (SELECT MAX(created_at) FROM orders WHERE customer_id = OLD.customer_id)
+        WHERE customer_id = OLD.customer_id;
+        DELETE FROM customer_stats WHERE customer_id = OLD.customer_id AND order_count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_orders_stats_update AFTER UPDATE OF customer_id, total, created_at ON orders
+    BEGIN
+        UPDATE customer_stats SET
+            order_count = order_count - 1,
+            total_spent = total_spent - COALESCE(OLD.total, 0)
+        WHERE customer_id = OLD.customer_id;
+        DELETE FROM customer_stats WHERE customer_id = OLD.customer_id AND order_count <= 0;
+        INSERT INTO customer_stats (customer_id, order_count, total_spent, last_order_at)
+        VALUES (NEW.customer_id, 1, COALESCE(NEW.total, 0), NEW.created_at)
+        ON CONFLICT(customer_id) DO UPDATE SET
+            order_count = order_count + 1,
+            total_spent = total_spent + excluded.total_spent;
+        UPDATE customer_stats SET
+            last_order_at = (SELECT MAX(created_at) FROM orders WHERE customer_id = customer_stats.customer_id)
+        WHERE customer_id IN (OLD.customer_id, NEW.customer_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_customers_stats_delete AFTER DELETE ON customers
+    BEGIN
+        DELETE FROM customer_stats WHERE customer_id = OLD.id;
+    END
+    """,
+)
+
+ROLLUP_TRIGGERS = (
+    "trg_orders_stats_insert",
+    "trg_orders_stats_delete",
+    "trg_orders_stats_update",
+    "trg_customers_stats_delete",
+)
+
+# Rollup computed from scratch; used by rebuild() and check()
+_AGGREGATE_SQL = """
+    SELECT customer_id, COUNT(*) AS order_count, COALESCE(SUM(total), 0) AS total_spent,
+           MAX(created_at) AS last_order_at
+    FROM orders
+    GROUP BY customer_id
+"""
+
+# Set-based equivalent of trg_orders_stats_insert for orders with id > ?,
+# used by bulk ingest when it defers the per-row trigger
+ORDERS_INSERT_CATCHUP_SQL = """
+    INSERT INTO customer_stats (customer_id, order_count, total_spent, last_order_at)
+    SELECT customer_id, COUNT(*), COALESCE(SUM(total), 0), MAX(created_at)
+    FROM orders
+    WHERE id > ?
+    GROUP BY customer_id
+    ON CONFLICT(customer_id) DO UPDATE SET
+        order_count = order_count + excluded.order_count,
+        total_spent = total_spent + excluded.total_spent,
+        last_order_at = CASE WHEN last_order_at IS NULL OR excluded.last_order_at > last_order_at
+                             THEN excluded.last_order_at ELSE last_order_at END
+"""
+
+_installed = set()
+_install_lock = threading.Lock()
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def ensure_customer_stats(db_path: Optional[str] = None) -> bool:
+    """
+    Create the rollup table and its triggers if missing, backfilling a new
+    table from orders. Cheap after the first call per database.
+
+    Returns:
+        True if the rollup is available
+    """
+    path = os.path.abspath(str(db_path or DB_PATH))
+    if path in _installed:
+        return True
+    with _install_lock:
+        if path in _installed:
+            return True
+        try:
+            with get_db(db_path, tables=None) as conn:
+                if not _table_exists(conn, "orders"):
+                    return False
+                created = not _table_exists(conn, "customer_stats")
+                # Table, triggers and backfill commit together: a failed
+                # backfill must not leave an empty rollup that looks installed
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for statement in CUSTOMER_STATS_DDL:
+                        conn.execute(statement)
+                    if created:
+                        _rebuild(conn)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                if created:
+                    print("📊 Created customer_stats rollup")
+        except Exception as e:
+            print(f"⚠️ Could not install customer_stats rollup: {e}")
+            return False
+        _installed.add(path)
+        return True
+
+
+def _rebuild(conn) -> int:
+    conn.execute("DELETE FROM customer_stats")
+    conn.execute(f"""
+        INSERT INTO customer_stats (customer_id, order_count, total_spent, last_order_at)
+        {_AGGREGATE_SQL}
+    """)
+    return conn.execute("SELECT COUNT(*) FROM customer_stats").fetchone()[0]
+
+
+def rebuild(db_path: Optional[str] = None) -> int:
+    """Recompute every rollup row from orders in one transaction; returns the row count"""
+    ensure_customer_stats(db_path)
+    with get_db(db_path, tables={"customer_stats"}) as conn:
+        try:
+            rows = _rebuild(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    print(f"✅ Rebuilt customer_stats ({rows} customers with orders)")
+    return rows
+
+
+def check(db_path: Optional[str] = None, limit: int = 100) -> Dict:
+    """
+    Compare the rollup with a full aggregation of orders.
+
+    Returns:
+        Dict with ``ok``, the number of ``mismatches`` and up to ``limit``
+        example rows (expected vs. stored values)
+    """
+    with get_read_db(db_path) as conn:
+        if not _table_exists(conn, "customer_stats"):
+            return {"ok": False, "error": "customer_stats table does not exist",
+                    "mismatches": 0, "missing_triggers": list(ROLLUP_TRIGGERS), "examples": []}
+        missing_triggers = [
+            name for name in ROLLUP_TRIGGERS
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)).fetchone() is None
+        ]
+        # Full outer join of expected and stored rows (SQLite < 3.39 has no FULL JOIN)
+        rows = conn.execute(f"""
+            WITH expected AS ({_AGGREGATE_SQL})
+            SELECT e.customer_id, e.order_count, e.total_spent, s.order_count, s.total_spent
+            FROM expected e LEFT JOIN customer_stats s ON s.customer_id = e.customer_id
+            WHERE s.customer_id IS NULL OR s.order_count != e.order_count
+               OR ABS(s.total_spent - e.total_spent) > ?
+            UNION ALL
+            SELECT s.customer_id, 0, 0, s.order_count, s.total_spent
+            FROM customer_stats s
+            WHERE NOT EXISTS (SELECT 1 FROM orders o WHERE o.customer_id = s.customer_id)
+        """, (TOTAL_TOLERANCE,)).fetchall()
+
+    examples: List[Dict] = [
+        {
+            "customer_id": r[0],
+            "expected": {"order_count": r[1], "total_spent": r[2]},
+            "stored": {"order_count": r[3], "total_spent": r[4]},
+        }
+        for r in rows[:limit]
+    ]
+    return {
+        "ok": not rows and not missing_triggers,
+        "mismatches": len(rows),
+        "missing_triggers": missing_triggers,
+        "examples": examples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the customer_stats rollup table")
+    parser.add_argument("command", choices=["install", "rebuild", "check"])
+    parser.add_argument("--db", default=None, help="database file (defaults to DB_PATH)")
+    args = parser.parse_args()
+
+    if args.command == "install":
+        sys.exit(0 if ensure_customer_stats(args.db) else 1)
+    if args.command == "rebuild":
+        rebuild(args.db)
+        return
+
+    result = check(args.db)
+    if result["ok"]:
+        print("✅ customer_stats is consistent with orders")
+        return
+    if result.get("error"):
+        print(f"❌ {result['error']}")
+    if result["missing_triggers"]:
+        print(f"❌ Missing triggers: {', '.join(result['missing_triggers'])}")
+    if result["mismatches"]:
+        print(f"❌ {result['mismatches']} customers disagree with orders (run 'rebuild' to fix):")
+        for example in result["examples"][:20]:
+            print(f"   customer {example['customer_id']}: expected {example['expected']}, stored {example['stored']}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
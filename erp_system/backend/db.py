@@ -1,20 +1,318 @@
 import sqlite3
 import os
+import threading
+import time
 from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import quote
 
 # Get the directory of this file
 BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
 # Go up one level to the erp_system directory, then to databases
 DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(BACKEND_DIR), "databases", "erp.db"))
 
+# Pool configuration (override via environment)
+# Reads use a pool of read-only connections; writes go through a single
+# serialized writer connection per database (the "writer lane").
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # NORMAL is durable across app crashes in WAL mode
+
+# Pragmas applied once when a pooled connection is created
+CONNECTION_PRAGMAS = [
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    f"PRAGMA synchronous = {DB_SYNCHRONOUS}",
+    "PRAGMA cache_size = -8000",  # 8 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+# Callbacks notified after the writer lane changed a database:
+# callback(db_path, tables) where tables is a set of table names, or None
+# when the writer did not declare which tables it touched.
+_write_listeners: List[Callable[[str, Optional[set]], None]] = []
+
+
+def add_write_listener(callback: Callable[[str, Optional[set]], None]):
+    """Register a callback for in-process writes (used by caches)"""
+    if callback not in _write_listeners:
+        _write_listeners.append(callback)
+
+
+def _notify_write(db_path: str, tables: Optional[set]):
+    for callback in list(_write_listeners):
+        try:
+            callback(db_path, tables)
+        except Exception as e:
+            print(f"⚠️ Write listener failed: {e}")
+
+
+class ConnectionPool:
+    """
+    Thread-aware pool of long-lived SQLite connections for one database file.
+
+    Connections are created lazily up to ``max_size`` and handed back to the
+    pool on release instead of being closed. A thread that already holds a
+    connection gets the same one back for nested ``get_db()`` calls, so
+    helpers that open the database inside another ``with get_db()`` block
+    cannot deadlock the pool.
+
+    A ``read_only`` pool opens connections with ``mode=ro`` so they can never
+    take the write lock; a writer pool with ``max_size=1`` serializes writes.
+    """
+
+    def __init__(self, db_path: str, max_size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 read_only: bool = False):
+        self.db_path = db_path
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.read_only = read_only
+        self._idle = []  # LIFO so the most recently used (warm) connection is reused first
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {"created": 0, "checkouts": 0, "waits": 0, "timeouts": 0, "wait_ms": 0.0}
+
+        # Ensure the database directory exists (once per pool, not per checkout)
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            target, uri = f"file:{quote(self.db_path)}?mode=ro", True
+        else:
+            target, uri = self.db_path, False
+        conn = sqlite3.connect(
+            target,
+            uri=uri,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # connections move between worker threads
+            cached_statements=DB_STATEMENT_CACHE_SIZE,  # per-connection prepared statement cache
+        )
+        conn.row_factory = sqlite3.Row  # returns dict-like rows
+        if not self.read_only and DB_JOURNAL_MODE:
+            # Journal mode is persistent in the database file; readers inherit it
+            conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if self.read_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool, waiting up to ``timeout`` seconds"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout(f"Connection pool for {self.db_path} is closed")
+            waited = False
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1  # reserve a slot, connect outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout:.1f}s waiting for a database connection "
+                        f"({self._in_use}/{self.max_size} in use)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_ms"] += (time.monotonic() - start) * 1000
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """Return a connection to the pool (or close it if it is unusable)"""
+        if not discard:
+            try:
+                # Never hand an open transaction to the next caller
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.row_factory = sqlite3.Row
+            except sqlite3.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, tables: Optional[Iterable[str]] = None):
+        """
+        Context manager yielding a pooled connection, re-entrant per thread.
+
+        On the writer lane, ``tables`` declares which tables the block
+        writes; if the connection changed any rows, write listeners are
+        notified with the declared tables (or None if undeclared).
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            if tables is not None and self._local.tables is not None:
+                self._local.tables.update(tables)
+            else:
+                self._local.tables = None
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        self._local.tables = set(tables) if tables is not None else None
+        changes_before = conn.total_changes
+        discard = False
+        try:
+            yield conn
+        except sqlite3.ProgrammingError:
+            # A closed or misused handle should not go back into the pool
+            discard = True
+            raise
+        finally:
+            written_tables = self._local.tables
+            self._local.conn = None
+            self._local.depth = 0
+            self._local.tables = None
+            changed = not self.read_only and not discard and conn.total_changes != changes_before
+            self.release(conn, discard=discard)
+            if changed:
+                _notify_write(self.db_path, written_tables)
+
+    def stats(self) -> Dict:
+        """Pool occupancy and checkout statistics"""
+        with self._cond:
+            checkouts = self._stats["checkouts"]
+            return {
+                "db_path": self.db_path,
+                "lane": "read" if self.read_only else "write",
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "created": self._stats["created"],
+                "checkouts": checkouts,
+                "waits": self._stats["waits"],
+                "timeouts": self._stats["timeouts"],
+                "avg_wait_ms": round(self._stats["wait_ms"] / self._stats["waits"], 3) if self._stats["waits"] else 0.0,
+            }
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed when released"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._size -= 1
+                self._idle.pop().close()
+            self._cond.notify_all()
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Optional[str] = None, read_only: bool = False) -> ConnectionPool:
+    """
+    Get (or lazily create) a connection pool for a database file.
+
+    The writer lane (``read_only=False``) holds a single connection, so
+    writers queue in-process instead of fighting over SQLite's lock. The
+    reader lane is created after the writer so the file exists and is
+    already in WAL mode when the first read-only connection opens.
+    """
+    path = os.path.abspath(str(db_path or DB_PATH))
+    key = (path, read_only)
+    pool = _pools.get(key)
+    if pool is None:
+        if read_only:
+            _ensure_database(path)
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                if read_only:
+                    pool = ConnectionPool(path, max_size=DB_POOL_SIZE, read_only=True)
+                else:
+                    pool = ConnectionPool(path, max_size=1)
+                _pools[key] = pool
+    return pool
+
+
+def _ensure_database(path: str):
+    """Open the writer lane once so the file exists and WAL mode is set"""
+    writer = get_pool(path)
+    if writer.stats()["created"] == 0:
+        with writer.connection():
+            pass
+
+
+def get_pool_stats() -> Dict[str, Dict]:
+    """Occupancy statistics for every open pool"""
+    return {
+        f"{path} ({'read' if read_only else 'write'})": pool.stats()
+        for (path, read_only), pool in list(_pools.items())
+    }
+
+
+def close_pools():
+    """Close all pools (called on application shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+@contextmanager
+def get_db(db_path: Optional[str] = None, tables: Optional[Iterable[str]] = None):
+    """
+    Read-write connection on the serialized writer lane.
+
+    Pass ``tables`` to declare which tables the block writes, so caches
+    invalidate only those tables instead of the whole database.
+    """
+    with get_pool(db_path).connection(tables) as conn:
+        yield conn
+
+
 @contextmanager
-def get_db():
-    # Ensure the database directory exists
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # returns dict-like rows
-    try:
+def get_read_db(db_path: Optional[str] = None):
+    """Read-only connection from the reader pool"""
+    with get_pool(db_path, read_only=True).connection() as conn:
         yield conn
-    finally:
-        conn.close()
\ No newline at end of file
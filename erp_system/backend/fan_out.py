@@ -0,0 +1,353 @@
+"""
+Parallel Fan-Out for Multi-Agent Questions
+
+"Compare this month's revenue with open leads" needs the Analytics Agent
+and the Sales Agent. The router's ReAct loop would call them one after the
+other (and spend an LLM step deciding to); here the question is split into
+independent sub-tasks up front and the agents run them concurrently, so
+latency is the slowest branch instead of the sum.
+
+Planning is rule-based:
+- "compare A with/to/against B" splits into its two parts; otherwise the
+  question splits on "and/plus/as well as/vs" only when every clause is a
+  request of its own, starting with a verb or question word ("show revenue
+  and list open leads"). "list customers and total spend" or "show sales
+  and marketing leads" are one request and are not split
+- each clause goes to the agent whose vocabulary it uses (analytics terms
+  win over CRM terms); a clause that matches neither, or that refers back
+  to another clause ("... and their orders"), means the parts are not
+  independent and the question goes to the router LLM unchanged
+- a plan needs at least two branches on different agents, and each agent
+  runs at most one branch
+
+Execution uses one bounded thread pool (FANOUT_MAX_WORKERS) shared by all
+requests:
+- a branch that exceeds FANOUT_BRANCH_TIMEOUT (counted from when it
+  started, or was queued if it never started) is reported as timed out;
+  the other branches keep going
+- a branch that raises fails hard: queued branches are cancelled, running
+  ones are told to stop and their results are dropped
+- a thread cannot be interrupted mid LLM call, so an abandoned branch
+  holds its worker until the call returns
+
+Runners are expected to be ``agent_runner.AgentPool`` invokes: a branch
+checks an executor (with its own memory) out of the agent's pool and keeps
+it until its call returns, even after the plan has timed it out or
+cancelled it. The router request can finish and the next /chat call gets
+a different executor, so an abandoned branch never shares an executor or
+its memory with a later run. Abandoned branches still running are counted
+as ``abandoned_running`` in the stats.
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+FANOUT_ENABLED = os.getenv("FANOUT_ENABLED", "1") != "0"
+FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "4"))
+FANOUT_BRANCH_TIMEOUT = float(os.getenv("FANOUT_BRANCH_TIMEOUT", "60"))
+FANOUT_MAX_BRANCHES = 3
+
+AGENT_LABELS = {"sales": "🛍️ Sales", "analytics": "📊 Analytics"}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_COMPARE = re.compile(r"^\s*compare\s+(?P<first>.+?)\s+(?:with|to|against|and|vs\.?|versus)\s+(?P<second>.+?)\s*[?.!]*\s*$",
+                      re.IGNORECASE)
+_SPLIT = re.compile(r"\s*(?:;|,?\s+\b(?:and also|as well as|along with|and|plus|versus|vs\.?)\b)\s+", re.IGNORECASE)
+
+ANALYTICS_TERMS = {
+    "revenue", "revenues", "sales", "trend", "trends", "average", "avg", "aov", "total", "totals", "growth", "profit",
+    "profits", "margin", "margins", "kpi", "kpis", "metric", "metrics", "chart", "report", "analysis", "analyze",
+    "forecast", "monthly", "quarterly", "yearly", "income", "spend", "spending",
+}
+SALES_TERMS = {
+    "lead", "leads", "prospect", "prospects", "customer", "customers", "client", "clients", "ticket", "tickets",
+    "pipeline", "opportunity", "opportunities", "order", "orders",
+}
+# A clause using these depends on another clause's result
+REFERENCES = {"their", "them", "they", "those", "these", "it", "its", "same", "respective"}
+QUESTION_STARTS = {"what", "how", "which", "who", "when", "where", "show", "list", "get", "give", "count", "find",
+                   "display", "tell", "fetch", "check", "calculate", "compute", "summarize"}
+
+
+@dataclass
+class Branch:
+    """One sub-task of a fan-out plan"""
+    agent: str
+    question: str
+    status: str = "pending"  # ok, error, timeout, cancelled
+    output: Optional[str] = None
+    error: Optional[str] = None
+    queued_at: float = 0.0
+    started_at: Optional[float] = None
+    elapsed_ms: Optional[float] = None
+    running: bool = False  # the runner call is in progress (possibly abandoned)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"agent": self.agent, "question": self.question, "status": self.status, "error": self.error,
+                "elapsed_ms": self.elapsed_ms}
+
+
+@dataclass
+class FanOutPlan:
+    question: str
+    branches: List[Branch] = field(default_factory=list)
+
+
+def classify_clause(clause: str) -> Optional[str]:
+    """'sales', 'analytics', or None when the clause is not a standalone request"""
+    words = set(_WORD.findall(clause.lower().replace("'s", "")))
+    if words & REFERENCES:
+        return None
+    if words & ANALYTICS_TERMS:
+        return "analytics"
+    if words & SALES_TERMS:
+        return "sales"
+    return None
+
+
+def _starts_request(clause: str) -> bool:
+    """True when a clause opens with a verb or question word, i.e. is a request of its own"""
+    first = _WORD.match(clause.strip(" ,.?!").lower())
+    return first is not None and first.group(0) in QUESTION_STARTS
+
+
+def _as_question(clause: str) -> str:
+    clause = clause.strip(" ,.?!")
+    return clause if _starts_request(clause) else f"Show {clause}"
+
+
+def plan_fan_out(question: str, agents: List[str], max_branches: int = FANOUT_MAX_BRANCHES) -> Optional[FanOutPlan]:
+    """Independent per-agent sub-tasks of ``question``, or None when it should not be split"""
+    match = _COMPARE.match(question or "")
+    clauses = [match.group("first"), match.group("second")] if match else _SPLIT.split(question or "")
+    clauses = [clause for clause in clauses if clause and clause.strip(" ,.?!")]
+    if not 2 <= len(clauses) <= max_branches:
+        return None
+    if not match and not all(_starts_request(clause) for clause in clauses):
+        # "and" inside one request (a list, a filter), not between requests
+        return None
+    plan = FanOutPlan(question)
+    for clause in clauses:
+        agent = classify_clause(clause)
+        if agent is None or agent not in agents or any(b.agent == agent for b in plan.branches):
+            return None
+        plan.branches.append(Branch(agent, _as_question(clause)))
+    return plan
+
+
+class FanOutStats:
+    """Process-wide counters: how often plans run and what parallelism saved"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, plan: FanOutPlan, wall_ms: float):
+        complete = all(b.status == "ok" for b in plan.branches)
+        with self._lock:
+            self._stats["fan_outs"] += 1
+            self._stats["branches"] += len(plan.branches)
+            for branch in plan.branches:
+                self._by_status[branch.status] = self._by_status.get(branch.status, 0) + 1
+            if any(b.status == "error" for b in plan.branches):
+                self._stats["hard_failures"] += 1
+            # Timed out or cancelled while running: still holding a pooled executor
+            self._abandoned.extend(b for b in plan.branches if b.running and b.status in ("timeout", "cancelled"))
+            self._wall_ms += wall_ms
+            # Savings are only comparable when every branch ran to completion
+            if complete:
+                self._complete += 1
+                self._complete_wall_ms += wall_ms
+                self._sequential_ms += sum(b.elapsed_ms for b in plan.branches)
+
+    def record_skip(self):
+        with self._lock:
+            self._stats["not_split"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._abandoned = [b for b in self._abandoned if b.running]
+            runs, complete = self._stats["fan_outs"], self._complete
+            return {
+                **self._stats,
+                "abandoned_running": len(self._abandoned),
+                "branch_status": dict(self._by_status),
+                "avg_wall_ms": round(self._wall_ms / runs, 3) if runs else None,
+                # Over fully successful fan-outs: parallel wall time vs the sum of branch times
+                # (what running them one after the other would have cost)
+                "avg_complete_wall_ms": round(self._complete_wall_ms / complete, 3) if complete else None,
+                "avg_sequential_ms": round(self._sequential_ms / complete, 3) if complete else None,
+                "saved_ms": round(self._sequential_ms - self._complete_wall_ms, 3),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats = {"fan_outs": 0, "not_split": 0, "branches": 0, "hard_failures": 0}
+            self._by_status: Dict[str, int] = {}
+            self._wall_ms = 0.0
+            self._complete = 0
+            self._complete_wall_ms = 0.0
+            self._sequential_ms = 0.0
+            self._abandoned: List[Branch] = []
+
+
+fan_out_stats = FanOutStats()
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_fan_out_pool() -> ThreadPoolExecutor:
+    """Bounded pool shared by every fan-out"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="fan-out")
+    return _pool
+
+
+def close_fan_out_pool():
+    """Stop the pool; queued branches are dropped, running ones finish in the background"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _run_branch(branch: Branch, runner: Callable[[str], str], cancel: threading.Event) -> str:
+    if cancel.is_set():
+        raise RuntimeError("cancelled before start")
+    branch.started_at = time.monotonic()
+    branch.running = True
+    try:
+        return runner(branch.question)
+    finally:
+        branch.running = False
+        branch.elapsed_ms = round((time.monotonic() - branch.started_at) * 1000, 3)
+
+
+def execute_plan(plan: FanOutPlan, runners: Dict[str, Callable[[str], str]],
+                 timeout: float = FANOUT_BRANCH_TIMEOUT, pool: ThreadPoolExecutor = None) -> FanOutPlan:
+    """Run every branch concurrently; statuses and outputs are filled in on ``plan``"""
+    pool = pool or get_fan_out_pool()
+    cancel = threading.Event()
+    futures: Dict[Future, Branch] = {}
+    for branch in plan.branches:
+        branch.queued_at = time.monotonic()
+        futures[pool.submit(_run_branch, branch, runners[branch.agent], cancel)] = branch
+
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        deadlines = [(futures[f].started_at or futures[f].queued_at) + timeout for f in pending]
+        done, pending = wait(pending, timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            branch = futures[future]
+            try:
+                branch.output, branch.status = future.result(), "ok"
+            except Exception as e:
+                branch.status, branch.error = "error", f"{type(e).__name__}: {e}"
+                print(f"❌ Fan-out {branch.agent} branch failed, cancelling the rest: {branch.error}")
+                cancel.set()
+        if cancel.is_set():
+            for future in pending:
+                future.cancel()
+                futures[future].status = "cancelled"
+            break
+        now = time.monotonic()
+        for future in list(pending):
+            branch = futures[future]
+            if now >= (branch.started_at or branch.queued_at) + timeout:
+                future.cancel()  # only succeeds while still queued
+                branch.status, branch.error = "timeout", f"no answer within {timeout:g}s"
+                print(f"⏱️ Fan-out {branch.agent} branch timed out after {timeout:g}s")
+                pending.discard(future)
+    return plan
+
+
+def merge_results(plan: FanOutPlan) -> str:
+    """One answer with a section per branch, in the order the question asked"""
+    sections = []
+    for branch in plan.branches:
+        header = f"**{AGENT_LABELS.get(branch.agent, branch.agent)} — {branch.question}**"
+        if branch.status == "ok":
+            body = branch.output
+        elif branch.status == "cancelled":
+            body = "⚠️ Cancelled because another part of the question failed."
+        else:
+            body = f"⚠️ Could not answer this part ({branch.error})."
+        sections.append(f"{header}\n{body}")
+    return "\n\n".join(sections)
+
+
+class FanOutRouter:
+    """
+    Wraps the router executor: questions that split into independent
+    per-agent sub-tasks are answered by ``runners[agent](question)`` in
+    parallel, everything else by ``executor.invoke``.
+    """
+
+    def __init__(self, executor, runners: Dict[str, Callable[[str], str]], timeout: float = FANOUT_BRANCH_TIMEOUT,
+                 stats: FanOutStats = None):
+        self.executor = executor
+        self.runners = runners
+        self.timeout = timeout
+        self.stats = stats or fan_out_stats
+
+    def try_fan_out(self, message: str, plan: FanOutPlan = None) -> Optional[Dict[str, Any]]:
+        plan = plan or plan_fan_out(message, list(self.runners))
+        if plan is None:
+            self.stats.record_skip()
+            return None
+
+        start = time.perf_counter()
+        print(f"🔀 Fan-out: {', '.join(f'{b.agent}: {b.question}' for b in plan.branches)}")
+        execute_plan(plan, self.runners, self.timeout)
+        wall_ms = (time.perf_counter() - start) * 1000
+        self.stats.record(plan, wall_ms)
+        output = merge_results(plan)
+
+        memory = getattr(self.executor, "memory", None)
+        if memory is not None:
+            try:
+                memory.save_context({"input": message}, {"output": output})
+            except Exception as e:
+                print(f"⚠️ Could not save fan-out turn to router memory: {e}")
+        return {"input": message, "output": output, "fan_out": True,
+                "branches": [branch.to_dict() for branch in plan.branches], "wall_ms": round(wall_ms, 3)}
+
+    def invoke(self, inputs, *args, **kwargs) -> Dict[str, Any]:
+        message = inputs.get("input", "") if isinstance(inputs, dict) else str(inputs)
+        result = self.try_fan_out(message)
+        if result is not None:
+            return result
+        return self.executor.invoke(inputs, *args, **kwargs)
+
+    async def ainvoke(self, inputs, *args, **kwargs) -> Dict[str, Any]:
+        message = inputs.get("input", "") if isinstance(inputs, dict) else str(inputs)
+        plan = plan_fan_out(message, list(self.runners))
+        if plan is not None:
+            # Waits on the branch pool, so off the event loop
+            return await asyncio.to_thread(self.try_fan_out, message, plan)
+        self.stats.record_skip()
+        return await self.executor.ainvoke(inputs, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.executor, name)
+
+
+def get_fan_out_stats() -> Dict[str, Any]:
+    return {
+        "enabled": FANOUT_ENABLED,
+        "max_workers": FANOUT_MAX_WORKERS,
+        "branch_timeout_s": FANOUT_BRANCH_TIMEOUT,
+        **fan_out_stats.snapshot(),
+    }
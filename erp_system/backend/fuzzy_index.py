@@ -0,0 +1,345 @@
+"""
+Fuzzy Name Index
+
+In-memory trigram index over customer and lead names for typo-tolerant
+lookups ("globx" -> "Globex Corp"). Names are lower-cased, split into
+words and each word is padded the way pg_trgm does ("  acme "), so word
+starts weigh more than word middles.
+
+A lookup counts shared trigrams through the posting lists and scores each
+candidate as::
+
+    0.7 * shared / |query trigrams|  +  0.3 * Jaccard(query, name)
+
+Query coverage lets a short query match a longer name ("globex" ->
+"Globex Corporation Ltd"); the Jaccard term ranks the closest full name
+first. Matches below FUZZY_MIN_SIMILARITY are dropped.
+
+The index is kept current without rescanning the table on every write:
+
+- writes on the writer lane that touch customers or leads mark it stale
+  (``db.add_write_listener``), and it also expires after FUZZY_INDEX_TTL
+  seconds to pick up writes from other processes
+- a stale index is refreshed, not rebuilt: rows with an id above the last
+  indexed one are added to it in place
+- UPDATE triggers that fire only when the name actually changes, and
+  DELETE triggers, bump a per-entity version in ``fuzzy_name_versions``;
+  only a version change forces a full rebuild, so score or status updates
+  cost two indexed queries
+- refreshes run under a per-entity build lock; other lookups keep using
+  the current index meanwhile, and full rebuilds of an existing index run
+  on a background thread
+"""
+
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from db import DB_PATH, add_write_listener, get_db
+from query_executor import execute_sql
+
+FUZZY_MIN_SIMILARITY = float(os.getenv("FUZZY_MIN_SIMILARITY", "0.35"))
+FUZZY_INDEX_TTL = float(os.getenv("FUZZY_INDEX_TTL", "300"))
+
+# entity -> (table, name column)
+FUZZY_SOURCES: Dict[str, Tuple[str, str]] = {
+    "customers": ("customers", "name"),
+    "leads": ("leads", "customer_name"),
+}
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+VERSION_TABLE = "fuzzy_name_versions"
+_installed: Dict[str, bool] = {}
+_install_lock = threading.Lock()
+
+
+def _ddl(entity: str, table: str, column: str) -> str:
+    bump = (f"INSERT INTO {VERSION_TABLE}(entity, version) VALUES ('{entity}', 1) "
+            f"ON CONFLICT(entity) DO UPDATE SET version = version + 1;")
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_fuzzy_update AFTER UPDATE OF {column} ON {table}
+    WHEN old.{column} IS NOT new.{column} BEGIN
+        {bump}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_fuzzy_delete AFTER DELETE ON {table} BEGIN
+        {bump}
+    END;
+    """
+
+
+def ensure_fuzzy_index(db_path: Optional[str] = None) -> bool:
+    """
+    Create the name-version table and its triggers. Cheap after the first
+    call per database.
+
+    Returns:
+        False when they could not be created (e.g. a read-only database);
+        every stale index is then rebuilt in full
+    """
+    path = os.path.abspath(str(db_path or DB_PATH))
+    if path in _installed:
+        return _installed[path]
+    with _install_lock:
+        if path in _installed:
+            return _installed[path]
+        available = True
+        try:
+            with get_db(db_path, tables=None) as conn:
+                existing = {row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+                script = f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (entity TEXT PRIMARY KEY, version INTEGER NOT NULL);"
+                for entity, (table, column) in FUZZY_SOURCES.items():
+                    if table in existing:
+                        script += _ddl(entity, table, column)
+                conn.executescript(script)
+        except sqlite3.Error as e:
+            available = False
+            print(f"⚠️ Fuzzy index name versions unavailable, every refresh rebuilds: {e}")
+        _installed[path] = available
+        return available
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm-style trigrams of every word in ``text``"""
+    grams = set()
+    for word in _NON_WORD.sub(" ", (text or "").lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Posting lists from trigram to document ids for one set of names"""
+
+    def __init__(self, names: Sequence[Tuple[int, str]], version: Optional[int] = None):
+        self.ids: List[int] = []
+        self.names: List[str] = []
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self.max_id = 0
+        self.version = version  # name version the rows were read at
+        self.add(names)
+
+    def add(self, names: Sequence[Tuple[int, str]]):
+        """
+        Append rows. Safe while other threads look up: a document's fields
+        are stored before it is added to any posting list.
+        """
+        for row_id, name in names:
+            self.max_id = max(self.max_id, row_id)
+            grams = trigrams(name)
+            if not grams:
+                continue
+            doc = len(self.ids)
+            self.ids.append(row_id)
+            self.names.append(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(doc)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lookup(self, query: str, k: int = 5, min_similarity: float = FUZZY_MIN_SIMILARITY) -> List[Dict]:
+        """Top-k names by similarity, best first"""
+        grams = trigrams(query)
+        if not grams:
+            return []
+        # Counter over the chained posting lists counts shared trigrams in C
+        shared = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+
+        q = len(grams)
+        scored = []
+        for doc, count in shared.items():
+            score = 0.7 * count / q + 0.3 * count / (q + self.sizes[doc] - count)
+            if score >= min_similarity:
+                scored.append((score, doc))
+        return [
+            {"id": self.ids[doc], "name": self.names[doc], "similarity": round(score, 4)}
+            for score, doc in heapq.nlargest(k, scored)
+        ]
+
+
+class FuzzyNameIndex:
+    """Lazily built, incrementally refreshed per-entity trigram indexes for one database"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._indexes: Dict[str, TrigramIndex] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._stale: Set[str] = set()
+        self._lock = threading.Lock()
+        self._build_locks = {entity: threading.Lock() for entity in FUZZY_SOURCES}
+        self._stats = {"builds": 0, "refreshes": 0, "rows_added": 0, "lookups": 0,
+                       "last_build_ms": 0.0, "lookup_ms_total": 0.0}
+
+    def mark_stale(self, tables: Optional[set]):
+        with self._lock:
+            for entity, (table, _) in FUZZY_SOURCES.items():
+                if tables is None or table in tables:
+                    self._stale.add(entity)
+
+    def _needs_refresh(self, entity: str) -> bool:
+        return (
+            entity in self._stale
+            or time.monotonic() - self._checked_at[entity] >= FUZZY_INDEX_TTL
+        )
+
+    def _name_version(self, entity: str) -> Optional[int]:
+        if not ensure_fuzzy_index(self.db_path):
+            return None
+        rows = execute_sql(f"SELECT version FROM {VERSION_TABLE} WHERE entity = ?", (entity,),
+                           row_format="tuple", db_path=self.db_path)
+        return rows[0][0] if rows else 0
+
+    def _build(self, entity: str) -> TrigramIndex:
+        """Full scan of the name column; call with the entity's build lock held"""
+        table, column = FUZZY_SOURCES[entity]
+        start = time.perf_counter()
+        with self._lock:
+            # Cleared before reading so a write during the build marks it stale again
+            self._stale.discard(entity)
+        version = self._name_version(entity)
+        rows = execute_sql(f"SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL",
+                           row_format="tuple", db_path=self.db_path)
+        index = TrigramIndex(rows, version)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._indexes[entity] = index
+            self._checked_at[entity] = time.monotonic()
+            self._stats["builds"] += 1
+            self._stats["last_build_ms"] = round(elapsed_ms, 3)
+        print(f"🔤 Built trigram index for {entity} ({len(index)} names, {elapsed_ms:.1f} ms)")
+        return index
+
+    def _rebuild_in_background(self, entity: str):
+        try:
+            self._build(entity)
+        except Exception as e:
+            print(f"⚠️ Trigram index rebuild for {entity} failed: {e}")
+        finally:
+            self._build_locks[entity].release()
+
+    def _refresh(self, index: TrigramIndex, entity: str):
+        """
+        Bring ``index`` up to date with the build lock held: append new rows,
+        or rebuild in the background when names were changed or deleted.
+        """
+        with self._lock:
+            self._stale.discard(entity)
+        version = self._name_version(entity)
+        if version is None or version != index.version:
+            threading.Thread(target=self._rebuild_in_background, args=(entity,),
+                             name=f"fuzzy-rebuild-{entity}", daemon=True).start()
+            return False  # the thread releases the build lock
+        table, column = FUZZY_SOURCES[entity]
+        rows = execute_sql(f"SELECT id, {column} FROM {table} WHERE id > ? AND {column} IS NOT NULL ORDER BY id",
+                           (index.max_id,), row_format="tuple", db_path=self.db_path)
+        index.add(rows)
+        with self._lock:
+            self._checked_at[entity] = time.monotonic()
+            self._stats["refreshes"] += 1
+            self._stats["rows_added"] += len(rows)
+        return True
+
+    def _index(self, entity: str) -> TrigramIndex:
+        with self._lock:
+            index = self._indexes.get(entity)
+            if index is not None and not self._needs_refresh(entity):
+                return index
+
+        build_lock = self._build_locks[entity]
+        if index is None:
+            # Nothing to serve yet: the first caller builds, the others wait for it
+            with build_lock:
+                with self._lock:
+                    index = self._indexes.get(entity)
+                return index if index is not None else self._build(entity)
+
+        # Serve the current index while someone else refreshes it
+        if not build_lock.acquire(blocking=False):
+            return index
+        release = True
+        try:
+            with self._lock:
+                if not self._needs_refresh(entity):
+                    return self._indexes[entity]
+            release = self._refresh(index, entity)
+        finally:
+            if release:
+                build_lock.release()
+        return index
+
+    def lookup(self, query: str, entities: Sequence[str] = ("customers",), k: int = 5,
+               min_similarity: float = FUZZY_MIN_SIMILARITY) -> List[Dict]:
+        """
+        Top-k fuzzy name matches across ``entities``.
+
+        Returns:
+            Dicts with ``entity``, ``id``, ``name`` and ``similarity`` (0..1),
+            best first
+        """
+        unknown = [e for e in entities if e not in FUZZY_SOURCES]
+        if unknown:
+            raise ValueError(f"No fuzzy index for {unknown}, expected any of {list(FUZZY_SOURCES)}")
+        indexes = [(entity, self._index(entity)) for entity in entities]
+
+        start = time.perf_counter()
+        matches = [
+            {"entity": entity, **match}
+            for entity, index in indexes
+            for match in index.lookup(query, k, min_similarity)
+        ]
+        matches.sort(key=lambda m: m["similarity"], reverse=True)
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats["lookup_ms_total"] += (time.perf_counter() - start) * 1000
+        return matches[:k]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                "names": {entity: len(index) for entity, index in self._indexes.items()},
+                "builds": self._stats["builds"],
+                "refreshes": self._stats["refreshes"],
+                "rows_added": self._stats["rows_added"],
+                "last_build_ms": self._stats["last_build_ms"],
+                "lookups": lookups,
+                "avg_lookup_ms": round(self._stats["lookup_ms_total"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+_indexes: Dict[str, FuzzyNameIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_fuzzy_index(db_path: Optional[str] = None) -> FuzzyNameIndex:
+    """Shared fuzzy index per database file"""
+    path = os.path.abspath(str(db_path or DB_PATH))
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = FuzzyNameIndex(db_path)
+            _indexes[path] = index
+        return index
+
+
+def _on_write(db_path: str, tables: Optional[set]):
+    index = _indexes.get(os.path.abspath(db_path))
+    if index is not None:
+        index.mark_stale(tables)
+
+
+def get_fuzzy_index_stats() -> Dict[str, Dict]:
+    return {path: index.stats() for path, index in list(_indexes.items())}
+
+
+add_write_listener(_on_write)
@@ -0,0 +1,342 @@
+"""
+Intent Fast Path for the Router Agent
+
+Every router ``/chat`` request used to go through the ReAct loop (one LLM
+call to pick a tool, then the Sales Agent's own LLM call) even for "show
+customers". This module classifies the message first and answers the
+obvious requests straight from the deterministic tool functions; only
+ambiguous requests fall through to the LLM.
+
+Classification is a table lookup, not a model:
+- message words are mapped through a precompiled word -> term table
+  (filler words such as "show me all" are dropped)
+- an intent matches when all of its required term groups are present
+- confidence = share of the remaining words the intent explains, so
+  "show customers" is 1.0 while "customers from Berlin" is 0.33
+- the best intent is dispatched when it is unique and its confidence is
+  at least INTENT_FAST_PATH_MIN_CONFIDENCE; everything else goes to the LLM
+
+Intents that take an argument (customer search) treat the unexplained
+words as the argument instead, as long as it is short and free of
+analytic words ("who", "top", numbers, ...), of prepositions that
+make it a filter ("customers in Cairo") rather than a name, and of
+words that belong to another intent ("find customer orders").
+
+Decision latency, hit rate and fall-through reasons are reported by
+``get_intent_router_stats()`` (``/metrics`` -> ``intent_router``).
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+INTENT_FAST_PATH_ENABLED = os.getenv("INTENT_FAST_PATH_ENABLED", "1") != "0"
+INTENT_FAST_PATH_MIN_CONFIDENCE = float(os.getenv("INTENT_FAST_PATH_MIN_CONFIDENCE", "1.0"))
+MAX_ARGUMENT_WORDS = 4
+LATENCY_WINDOW = 1000
+
+_WORD = re.compile(r"[a-z0-9]+(?:['.-][a-z0-9]+)*")
+
+# Words that never change what a listing request means
+FILLER = {
+    "show", "me", "list", "display", "get", "view", "see", "give", "fetch", "pull", "bring",
+    "all", "the", "our", "my", "a", "an", "please", "can", "could", "would", "you", "i", "want",
+    "to", "like", "let", "us", "current", "recent", "latest", "what", "are", "is", "tell", "about",
+    "some", "now", "quick", "hi", "hey", "thanks",
+}
+
+# Surface word -> canonical term
+TERMS = {
+    "customer": "customer", "customers": "customer", "client": "customer", "clients": "customer",
+    "lead": "lead", "leads": "lead", "prospect": "lead", "prospects": "lead",
+    "order": "order", "orders": "order", "purchases": "order",
+    "ticket": "ticket", "tickets": "ticket", "support": "ticket", "issues": "ticket",
+    "summary": "summary", "stats": "summary", "statistics": "summary", "overview": "summary",
+    "score": "score", "scores": "score", "scoring": "score", "qualify": "score",
+    "find": "find", "search": "find", "lookup": "find", "look": "find",
+    "up": "up", "for": "for", "named": "named", "called": "named", "with": "named",
+    "system": "system", "database": "system", "db": "system",
+    "status": "status", "health": "status", "healthy": "status", "info": "info", "information": "info",
+    "check": "check",
+    "help": "help", "commands": "help",
+}
+
+# Words that turn a lookup into an analytic question; never part of a search term
+ANALYTIC = {
+    "who", "which", "where", "when", "why", "how", "many", "much", "top", "best", "biggest", "largest",
+    "most", "least", "total", "revenue", "sales", "spent", "spend", "average", "avg", "count", "trend",
+    "compare", "by", "per", "than", "over", "under", "more", "less", "last", "this", "since", "between",
+    "month", "year", "week", "chart", "report", "sql",
+}
+
+# Words that turn a search argument into a filter ("in cairo", "from egypt"); never part of a name lookup
+FILTER_PREPOSITIONS = {
+    "in", "from", "at", "near", "around", "inside", "outside", "within", "located", "based", "without", "whose",
+}
+
+
+@dataclass(frozen=True)
+class Intent:
+    """A deterministic request the router can answer without the LLM"""
+    name: str
+    required: Tuple[FrozenSet[str], ...]  # every group must contribute a term
+    optional: FrozenSet[str] = frozenset()  # terms the intent also explains
+    takes_argument: bool = False  # unexplained words become the argument
+
+    @property
+    def vocabulary(self) -> FrozenSet[str]:
+        return frozenset().union(self.optional, *self.required)
+
+
+def _terms(*names: str) -> FrozenSet[str]:
+    return frozenset(names)
+
+
+INTENTS = (
+    Intent("customer_list", (_terms("customer"),)),
+    Intent("customer_summary", (_terms("customer"), _terms("summary"))),
+    Intent("customer_search", (_terms("find"), _terms("customer")), _terms("up", "for", "named"), takes_argument=True),
+    Intent("leads", (_terms("lead"),)),
+    Intent("lead_scoring", (_terms("lead"), _terms("score"))),
+    Intent("orders", (_terms("order"),)),
+    Intent("tickets", (_terms("ticket"),)),
+    Intent("system_info", (_terms("status", "info"),), _terms("system", "check")),
+    Intent("help", (_terms("help"),)),
+)
+
+
+@dataclass
+class IntentDecision:
+    """Outcome of classifying one message"""
+    intent: Optional[str]
+    confidence: float
+    dispatch: bool
+    reason: str  # "matched", "no_match", "ambiguous", "low_confidence", "disabled"
+    argument: Optional[str] = None
+    candidates: Dict[str, float] = field(default_factory=dict)
+    decision_ms: float = 0.0
+
+
+class IntentClassifier:
+    """Table-driven classifier over INTENTS"""
+
+    def __init__(self, intents: Tuple[Intent, ...] = INTENTS, min_confidence: float = INTENT_FAST_PATH_MIN_CONFIDENCE,
+                 enabled: bool = INTENT_FAST_PATH_ENABLED):
+        self.intents = intents
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        # Terms each intent must not swallow into its argument: other intents' vocabulary
+        self._foreign_terms = {
+            intent.name: frozenset().union(*(other.vocabulary for other in intents)) - intent.vocabulary
+            for intent in intents
+        }
+
+    @staticmethod
+    def words(message: str) -> List[str]:
+        """Lowercased words without filler"""
+        return [word for word in _WORD.findall((message or "").lower()) if word not in FILLER]
+
+    def _score(self, intent: Intent, words: List[str], terms: List[Optional[str]]) -> Optional[Tuple[float, Optional[str]]]:
+        present = {term for term in terms if term}
+        if not all(group & present for group in intent.required):
+            return None
+        vocabulary = intent.vocabulary
+        rest = [(word, term) for word, term in zip(words, terms) if term not in vocabulary]
+        if not intent.takes_argument:
+            return (len(words) - len(rest)) / len(words), None
+        foreign = self._foreign_terms[intent.name]
+        if not rest or len(rest) > MAX_ARGUMENT_WORDS or any(
+                w in ANALYTIC or w in FILTER_PREPOSITIONS or w.isdigit() or t in foreign for w, t in rest):
+            return 0.0, None
+        return 1.0, " ".join(word for word, _ in rest)
+
+    def classify(self, message: str) -> IntentDecision:
+        start = time.perf_counter()
+        decision = self._classify(message)
+        decision.decision_ms = (time.perf_counter() - start) * 1000
+        return decision
+
+    def _classify(self, message: str) -> IntentDecision:
+        if not self.enabled:
+            return IntentDecision(None, 0.0, False, "disabled")
+        words = self.words(message)
+        if not words:
+            return IntentDecision(None, 0.0, False, "no_match")
+        terms = [TERMS.get(word) for word in words]
+
+        scored = {}
+        for intent in self.intents:
+            result = self._score(intent, words, terms)
+            if result is not None:
+                scored[intent.name] = result
+        if not scored:
+            return IntentDecision(None, 0.0, False, "no_match")
+
+        candidates = {name: round(confidence, 3) for name, (confidence, _) in scored.items()}
+        ranked = sorted(scored.items(), key=lambda item: item[1][0], reverse=True)
+        name, (confidence, argument) = ranked[0]
+        if len(ranked) > 1 and ranked[1][1][0] == confidence:
+            return IntentDecision(None, confidence, False, "ambiguous", candidates=candidates)
+        if confidence < self.min_confidence:
+            return IntentDecision(name, confidence, False, "low_confidence", candidates=candidates)
+        return IntentDecision(name, confidence, True, "matched", argument, candidates)
+
+
+class IntentStats:
+    """Process-wide counters for fast-path decisions"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self.reset()
+
+    def record(self, decision: IntentDecision, handler_ms: Optional[float] = None, error: bool = False):
+        with self._lock:
+            self._decisions += 1
+            self._decision_ms.append(decision.decision_ms)
+            if decision.dispatch and not error:
+                self._hits += 1
+                self._by_intent[decision.intent] = self._by_intent.get(decision.intent, 0) + 1
+                self._handler_ms_total += handler_ms or 0.0
+            else:
+                reason = "handler_error" if error else decision.reason
+                self._fallthroughs[reason] = self._fallthroughs.get(reason, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._decision_ms)
+            decisions, hits = self._decisions, self._hits
+
+            def percentile(p: float) -> Optional[float]:
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4)
+
+            return {
+                "decisions": decisions,
+                "fast_path_hits": hits,
+                "llm_fallthroughs": decisions - hits,
+                "hit_rate": round(hits / decisions, 4) if decisions else 0.0,
+                "by_intent": dict(self._by_intent),
+                "fallthrough_reasons": dict(self._fallthroughs),
+                "decision_ms": {
+                    "avg": round(sum(latencies) / len(latencies), 4) if latencies else None,
+                    "p50": percentile(0.5),
+                    "p95": percentile(0.95),
+                    "max": round(latencies[-1], 4) if latencies else None,
+                },
+                "avg_handler_ms": round(self._handler_ms_total / hits, 3) if hits else None,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._decisions = 0
+            self._hits = 0
+            self._by_intent: Dict[str, int] = {}
+            self._fallthroughs: Dict[str, int] = {}
+            self._decision_ms = deque(maxlen=self._window)
+            self._handler_ms_total = 0.0
+
+
+intent_classifier = IntentClassifier()
+intent_stats = IntentStats()
+
+
+class IntentFastPath:
+    """
+    Wraps the router's AgentExecutor: high-confidence requests are answered
+    by ``handlers[intent](message)``, everything else by ``executor.invoke``.
+
+    Fast-path answers are also saved to the executor's memory so follow-up
+    questions that do reach the LLM still see them in the chat history.
+    """
+
+    def __init__(self, executor, handlers: Dict[str, Callable[[str], str]],
+                 classifier: IntentClassifier = None, stats: IntentStats = None):
+        self.executor = executor
+        self.handlers = handlers
+        self.classifier = classifier or intent_classifier
+        self.stats = stats or intent_stats
+
+    def try_fast_path(self, message: str, decision: IntentDecision = None) -> Optional[Dict[str, Any]]:
+        """Result dict when the message was answered without the LLM, else None"""
+        decision = decision or self.classifier.classify(message)
+        handler = self.handlers.get(decision.intent) if decision.dispatch else None
+        if handler is None:
+            if decision.dispatch:
+                decision.reason = "no_handler"
+                decision.dispatch = False
+            self.stats.record(decision)
+            return None
+
+        start = time.perf_counter()
+        try:
+            output = handler(decision.argument if decision.argument is not None else message)
+        except Exception as e:
+            print(f"⚠️ Fast path {decision.intent} failed, falling back to the router LLM: {e}")
+            self.stats.record(decision, error=True)
+            return None
+        handler_ms = (time.perf_counter() - start) * 1000
+        self.stats.record(decision, handler_ms)
+        print(f"⚡ Fast path: {decision.intent} ({decision.decision_ms:.3f} ms decision, {handler_ms:.1f} ms handler)")
+
+        memory = getattr(self.executor, "memory", None)
+        if memory is not None:
+            try:
+                memory.save_context({"input": message}, {"output": output})
+            except Exception as e:
+                print(f"⚠️ Could not save fast-path turn to router memory: {e}")
+        return {"input": message, "output": output, "intent": decision.intent, "fast_path": True}
+
+    def invoke(self, inputs, *args, **kwargs) -> Dict[str, Any]:
+        message = inputs.get("input", "") if isinstance(inputs, dict) else str(inputs)
+        result = self.try_fast_path(message)
+        if result is not None:
+            return result
+        return self.executor.invoke(inputs, *args, **kwargs)
+
+    async def ainvoke(self, inputs, *args, **kwargs) -> Dict[str, Any]:
+        message = inputs.get("input", "") if isinstance(inputs, dict) else str(inputs)
+        decision = self.classifier.classify(message)  # microseconds: fine on the event loop
+        if decision.dispatch:
+            result = await asyncio.to_thread(self.try_fast_path, message, decision)  # handlers query the DB
+        else:
+            result = self.try_fast_path(message, decision)
+        if result is not None:
+            return result
+        return await self.executor.ainvoke(inputs, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # Everything else (memory, tools, agent, ...) is the executor's
+        return getattr(self.executor, name)
+
+
+def get_intent_router_stats() -> Dict[str, Any]:
+    return {
+        "enabled": intent_classifier.enabled,
+        "min_confidence": intent_classifier.min_confidence,
+        **intent_stats.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the router fast path classifies messages")
+    parser.add_argument("messages", nargs="+")
+    args = parser.parse_args()
+
+    for message in args.messages:
+        decision = intent_classifier.classify(message)
+        verdict = f"⚡ {decision.intent}" if decision.dispatch else f"🤖 LLM ({decision.reason})"
+        argument = f" [{decision.argument}]" if decision.argument else ""
+        print(f"{message!r}: {verdict}{argument} confidence={decision.confidence:.2f} "
+              f"({decision.decision_ms:.3f} ms) {decision.candidates or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ Implements required memory systems according to specifications
 """
 
 import sqlite3
+import sys
 import json
 from datetime import datetime
 from typing import Dict, List, Any, Optional
@@ -11,20 +12,43 @@ from pathlib import Path
 from langchain.memory import ConversationBufferWindowMemory, ConversationBufferMemory
 from langchain.schema import BaseMessage, HumanMessage, AIMessage
 
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from db import get_db
+from query_executor import execute_sql, execute_write
+from memory.write_behind import WRITE_BEHIND_ENABLED, get_write_behind_queue
+
+def utc_timestamp() -> str:
+    """Timestamp in SQLite CURRENT_TIMESTAMP format, taken when the row is queued"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
 def get_db_path():
     """Get database path"""
     return Path(__file__).parent.parent.parent / "databases" / "erp.db"
 
 class RouterGlobalState:
-    """Manages router's global state and persistence"""
+    """
+    Manages router's global state and persistence.
+    
+    Messages and tool calls are written behind the request path: they are
+    queued and flushed in batches by a background thread (disable with
+    MEMORY_WRITE_BEHIND=0). Conversation history reads flush first, so a
+    caller always sees its own writes.
+    """
     
     def __init__(self, db_path: str = None):
         self.db_path = db_path or str(get_db_path())
+        self._write_queue = get_write_behind_queue(self.db_path) if WRITE_BEHIND_ENABLED else None
+        self._conversation_ids: Dict[tuple, int] = {}
         self._init_tables()
     
     def _init_tables(self):
         """Initialize required memory tables"""
-        conn = sqlite3.connect(self.db_path)
+        with get_db(self.db_path) as conn:
+            self._migrate_tables(conn)
+    
+    def _migrate_tables(self, conn: sqlite3.Connection):
+        """Add missing columns and create memory tables on a pooled connection"""
         cursor = conn.cursor()
         
         # Check if conversations table exists and has required columns
@@ -63,6 +87,17 @@ class RouterGlobalState:
                 cursor.execute('ALTER TABLE messages ADD COLUMN timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
                 print("✅ Added missing timestamp column to messages table")
         
+        # Check tool_calls table columns (older schemas use agent/input_json/output_json)
+        cursor.execute("PRAGMA table_info(tool_calls)")
+        tool_columns = [col[1] for col in cursor.fetchall()]
+        
+        if tool_columns:
+            for column, column_type in [('agent_type', 'TEXT'), ('input_data', 'TEXT'),
+                                        ('output_data', 'TEXT'), ('timestamp', 'TIMESTAMP')]:
+                if column not in tool_columns:
+                    cursor.execute(f'ALTER TABLE tool_calls ADD COLUMN {column} {column_type}')
+                    print(f"✅ Added missing {column} column to tool_calls table")
+        
         # Create required tables for memory
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS conversations (
@@ -109,81 +144,74 @@ class RouterGlobalState:
         ''')
         
         conn.commit()
-        conn.close()
     
     def get_or_create_conversation(self, user_id: str = "default_user", session_id: str = None, agent_type: str = "router"):
         """Get or create conversation session"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         if session_id:
-            cursor.execute('''
+            cached = self._conversation_ids.get((session_id, user_id))
+            if cached is not None:
+                return cached
+            
+            result = execute_sql('''
                 SELECT id FROM conversations WHERE session_id = ? AND user_id = ?
-            ''', (session_id, user_id))
-            result = cursor.fetchone()
+            ''', (session_id, user_id), row_format="tuple", db_path=self.db_path)
             if result:
-                conn.close()
-                return result[0]
+                self._conversation_ids[(session_id, user_id)] = result[0][0]
+                return result[0][0]
         
         # Create new conversation
-        cursor.execute('''
+        result = execute_write('''
             INSERT INTO conversations (user_id, session_id, agent_type, created_at)
             VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (user_id, session_id or f"{agent_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}", agent_type))
+        ''', (user_id, session_id or f"{agent_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}", agent_type),
+            db_path=self.db_path)
         
-        conversation_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        conversation_id = result["lastrowid"]
+        if session_id:
+            self._conversation_ids[(session_id, user_id)] = conversation_id
         return conversation_id
     
+    def _write(self, query: str, params: tuple):
+        """Queue a logging INSERT, or write it immediately when write-behind is off"""
+        if self._write_queue is not None:
+            self._write_queue.enqueue(query, params)
+        else:
+            execute_write(query, params, db_path=self.db_path)
+    
+    def flush(self):
+        """Write any queued messages/tool calls now"""
+        if self._write_queue is not None:
+            self._write_queue.flush()
+    
     def add_message(self, conversation_id: int, role: str, content: str):
         """Add message to conversation"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self._write('''
             INSERT INTO messages (conversation_id, role, content, timestamp)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (conversation_id, role, content))
-        
-        conn.commit()
-        conn.close()
+            VALUES (?, ?, ?, ?)
+        ''', (conversation_id, role, content, utc_timestamp()))
     
     def get_conversation_history(self, conversation_id: int, limit: int = 10) -> List[Dict]:
         """Get conversation history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Read-your-writes: make queued messages visible first. flush() also
+        # waits for a batch the background thread is already writing
+        self.flush()
         
-        cursor.execute('''
+        messages = execute_sql('''
             SELECT role, content, timestamp FROM messages
             WHERE conversation_id = ?
-            ORDER BY timestamp DESC
+            ORDER BY timestamp DESC, id DESC
             LIMIT ?
-        ''', (conversation_id, limit))
+        ''', (conversation_id, limit), db_path=self.db_path)
         
-        messages = []
-        for role, content, timestamp in cursor.fetchall():
-            messages.append({
-                'role': role,
-                'content': content,
-                'timestamp': timestamp
-            })
-        
-        conn.close()
         return list(reversed(messages))  # Return in chronological order
     
     def log_tool_call(self, agent_type: str, tool_name: str, input_data: Any, output_data: Any):
         """Log tool call for tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self._write('''
             INSERT INTO tool_calls (agent_type, tool_name, input_data, output_data, timestamp)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (agent_type, tool_name, json.dumps(input_data), json.dumps(output_data)))
-        
-        conn.commit()
-        conn.close()
+            VALUES (?, ?, ?, ?, ?)
+        ''', (agent_type, tool_name, json.dumps(input_data, default=str),
+              json.dumps(output_data, default=str), utc_timestamp()))
 
 class SalesEntityMemory:
     """Manages customer entity memory for Sales Agent"""
@@ -194,10 +222,7 @@ class SalesEntityMemory:
     
     def _init_customer_kv_table(self):
         """Initialize customer key-value memory table"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        execute_write('''
             CREATE TABLE IF NOT EXISTS customer_kv (
                 customer_id INTEGER,
                 key TEXT,
@@ -205,43 +230,27 @@ class SalesEntityMemory:
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 PRIMARY KEY (customer_id, key)
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        ''', db_path=self.db_path)
     
     def set_customer_info(self, customer_id: int, key: str, value: str):
         """Store customer entity information"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        execute_write('''
             INSERT OR REPLACE INTO customer_kv (customer_id, key, value, updated_at)
             VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (customer_id, key, value))
-        
-        conn.commit()
-        conn.close()
+        ''', (customer_id, key, value), db_path=self.db_path)
     
     def get_customer_info(self, customer_id: int, key: str = None) -> Any:
         """Retrieve customer entity information"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         if key:
-            cursor.execute('''
+            result = execute_sql('''
                 SELECT value FROM customer_kv WHERE customer_id = ? AND key = ?
-            ''', (customer_id, key))
-            result = cursor.fetchone()
-            conn.close()
-            return result[0] if result else None
+            ''', (customer_id, key), row_format="tuple", db_path=self.db_path)
+            return result[0][0] if result else None
         else:
-            cursor.execute('''
+            result = execute_sql('''
                 SELECT key, value FROM customer_kv WHERE customer_id = ?
-            ''', (customer_id,))
-            result = dict(cursor.fetchall())
-            conn.close()
-            return result
+            ''', (customer_id,), row_format="tuple", db_path=self.db_path)
+            return dict(result)
     
     def update_last_interaction(self, customer_id: int, interaction_type: str):
         """Update customer's last interaction info"""
@@ -257,10 +266,7 @@ class AnalyticsReportMemory:
     
     def _init_saved_reports_table(self):
         """Initialize saved_reports table"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        execute_write('''
             CREATE TABLE IF NOT EXISTS saved_reports (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 report_name TEXT UNIQUE,
@@ -271,41 +277,27 @@ class AnalyticsReportMemory:
                 last_run TIMESTAMP,
                 run_count INTEGER DEFAULT 0
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        ''', db_path=self.db_path)
     
     def save_report(self, report_name: str, sql_query: str, parameters: dict = None, created_by: str = "analytics_agent") -> str:
         """Save a report for future use"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
+            execute_write('''
                 INSERT INTO saved_reports (report_name, sql_query, parameters, created_by, created_at)
                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (report_name, sql_query, json.dumps(parameters or {}), created_by))
-            
-            conn.commit()
-            conn.close()
+            ''', (report_name, sql_query, json.dumps(parameters or {}), created_by), db_path=self.db_path)
             return f"Report '{report_name}' saved successfully"
         except sqlite3.IntegrityError:
-            conn.close()
             return f"Report '{report_name}' already exists"
     
     def get_saved_report(self, report_name: str) -> Optional[Dict]:
         """Retrieve a saved report"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        rows = execute_sql('''
             SELECT report_name, sql_query, parameters, created_by, created_at, last_run, run_count
             FROM saved_reports WHERE report_name = ?
-        ''', (report_name,))
+        ''', (report_name,), row_format="tuple", db_path=self.db_path)
         
-        result = cursor.fetchone()
-        conn.close()
+        result = rows[0] if rows else None
         
         if result:
             return {
@@ -321,14 +313,8 @@ class AnalyticsReportMemory:
     
     def update_report_run(self, report_name: str):
         """Update report run statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        execute_write('''
             UPDATE saved_reports 
             SET last_run = CURRENT_TIMESTAMP, run_count = run_count + 1
             WHERE report_name = ?
-        ''', (report_name,))
-        
-        conn.commit()
-        conn.close()
+        ''', (report_name,), db_path=self.db_path)
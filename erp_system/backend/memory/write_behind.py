@@ -0,0 +1,194 @@
+"""
+Write-Behind Queue for Memory Logging
+
+Chat logging (messages, tool calls) does not need to be durable before the
+agent answers. Instead of one INSERT + commit per call on the request path,
+rows are queued in memory and a background thread writes them in batched
+``executemany`` transactions on the writer lane, either when the batch is
+full or when the flush interval elapses.
+
+Readers that need to see their own writes call ``flush()`` first; pending
+rows are flushed on interpreter exit and on API shutdown.
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from db import get_db
+from query_executor import written_tables
+
+WRITE_BEHIND_ENABLED = os.getenv("MEMORY_WRITE_BEHIND", "1") != "0"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "500"))
+
+
+class WriteBehindQueue:
+    """Buffers INSERT statements and writes them in batches from a background thread"""
+
+    def __init__(self, db_path: str, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_MS / 1000):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[str, Sequence[Any]]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # held while a batch is being written
+        self._in_flight = 0  # rows taken off _pending but not committed yet
+        self._closed = False
+        self._thread = None
+        self._stats = {"enqueued": 0, "written": 0, "batches": 0, "failed_rows": 0, "last_batch_ms": 0.0}
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, query: str, params: Sequence[Any]):
+        """Queue one INSERT; it is written by the background thread"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write-behind queue is closed")
+            self._start()
+            self._pending.append((query, params))
+            self._stats["enqueued"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def has_pending(self) -> bool:
+        """True while rows are queued or a batch is being written"""
+        with self._cond:
+            return bool(self._pending) or self._in_flight > 0
+
+    def flush(self):
+        """
+        Write everything queued so far before returning (read-your-writes).
+        A batch the background thread is writing holds ``_flush_lock``, so
+        this also waits for it to commit.
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._in_flight = len(batch)
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.batch_size,
+                    timeout=self.flush_interval,
+                )
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _write(self, batch: List[Tuple[str, Sequence[Any]]]):
+        # Group rows per statement (insertion order is kept within each group)
+        groups: "OrderedDict[str, List[Sequence[Any]]]" = OrderedDict()
+        for query, params in batch:
+            groups.setdefault(query, []).append(params)
+
+        tables = written_tables(groups, self.db_path)
+        start = time.perf_counter()
+        failed = 0
+        try:
+            with get_db(self.db_path, tables=tables) as conn:
+                try:
+                    for query, rows in groups.items():
+                        conn.executemany(query, rows)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    print(f"⚠️ Batched memory write failed ({e}), retrying row by row")
+                    failed = self._write_rows(conn, groups)
+        except Exception as e:
+            failed = len(batch)
+            print(f"⚠️ Memory write-behind lost {failed} rows: {e}")
+
+        with self._cond:
+            self._stats["written"] += len(batch) - failed
+            self._stats["failed_rows"] += failed
+            self._stats["batches"] += 1
+            self._stats["last_batch_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    @staticmethod
+    def _write_rows(conn, groups: Dict[str, List[Sequence[Any]]]) -> int:
+        """Fallback that isolates bad rows so one failure does not drop the batch"""
+        failed = 0
+        for query, rows in groups.items():
+            for params in rows:
+                try:
+                    conn.execute(query, params)
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️ Dropped memory row: {e}")
+        conn.commit()
+        return failed
+
+    def close(self):
+        """Stop the background thread after flushing pending rows"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=10)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {"db_path": self.db_path, "pending": len(self._pending), "in_flight": self._in_flight,
+                    **self._stats}
+
+
+_queues: Dict[str, WriteBehindQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_behind_queue(db_path: str) -> WriteBehindQueue:
+    """Shared queue per database file so every RouterGlobalState batches together"""
+    path = os.path.abspath(db_path)
+    with _queues_lock:
+        queue = _queues.get(path)
+        if queue is None or queue._closed:
+            queue = WriteBehindQueue(path)
+            _queues[path] = queue
+        return queue
+
+
+def flush_all():
+    """Flush every queue (e.g. before a consistent read across tables)"""
+    for queue in list(_queues.values()):
+        queue.flush()
+
+
+def close_all():
+    """Flush and stop every queue; registered for interpreter exit and API shutdown"""
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for queue in queues:
+        queue.close()
+
+
+def get_write_behind_stats() -> List[Dict]:
+    return [queue.stats() for queue in list(_queues.values())]
+
+
+atexit.register(close_all)
@@ -0,0 +1,356 @@
+"""
+NL-to-SQL Translation Cache
+
+Persists the SQL an LLM generated for a question in the ``nl_sql_cache``
+table, so ``text_to_sql`` and ``sales_sql_query`` skip the LLM call when the
+same question comes back.
+
+Key: tool name, normalized question and context (case, whitespace and
+trailing punctuation folded), and a hash of the schema the tool links
+against (``LinkedSchema.schema_fingerprint``). That hash is the schema
+version as the LLM sees it: adding a column changes it, while unrelated DDL
+(indexes, FTS tables) does not, and the same schema in another database
+file shares entries.
+
+On an exact miss, ``semantic_cache`` looks for a paraphrase among the
+entries of the same tool, schema and context and reuses its SQL after an
+EXPLAIN check.
+
+Only SQL that executed successfully is stored, and a cached statement that
+later fails is dropped. Entries expire after NL_SQL_CACHE_TTL seconds and
+the least recently used are evicted beyond NL_SQL_CACHE_MAX_ENTRIES.
+
+A hit is a single read: hit counts and last-use times are accumulated in
+memory and written in one batched UPDATE every NL_SQL_CACHE_HIT_FLUSH_S
+seconds, and before anything that reads them (eviction in ``store``,
+``entries``, ``stats``) and at exit.
+
+Usage:
+    cached = nl_sql_cache.lookup("text_to_sql", question, context, linked.schema_fingerprint)
+    if cached is None:
+        sql = <ask the LLM>
+        ... execute ...
+        nl_sql_cache.store("text_to_sql", question, context, linked.schema_fingerprint, sql)
+
+    python nl_sql_cache.py stats
+    python nl_sql_cache.py purge [--tool text_to_sql] [--expired]
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+from db import DB_PATH, get_db, get_read_db
+from semantic_cache import SemanticIndex
+
+NL_SQL_CACHE_ENABLED = os.getenv("NL_SQL_CACHE_ENABLED", "1") != "0"
+NL_SQL_CACHE_TTL = float(os.getenv("NL_SQL_CACHE_TTL", str(7 * 24 * 3600)))
+NL_SQL_CACHE_MAX_ENTRIES = int(os.getenv("NL_SQL_CACHE_MAX_ENTRIES", "5000"))
+NL_SQL_CACHE_HIT_FLUSH_S = float(os.getenv("NL_SQL_CACHE_HIT_FLUSH_S", "30"))
+
+CACHE_TABLE = "nl_sql_cache"
+
+_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+    cache_key TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    question TEXT NOT NULL,
+    context TEXT NOT NULL DEFAULT '',
+    schema_hash TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE}_last_used ON {CACHE_TABLE}(last_used_at);
+CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE}_expires ON {CACHE_TABLE}(expires_at);
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!;]+$")
+
+
+def normalize_question(text: Optional[str]) -> str:
+    """'  What is  revenue by status?? ' -> 'what is revenue by status'"""
+    if not text or text.strip().lower() == "none":
+        return ""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", text).strip().lower())
+
+
+def schema_hash(schema_info: str) -> str:
+    return hashlib.sha256(schema_info.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(tool: str, question: str, context: Optional[str], schema_info: str) -> str:
+    raw = "\x1f".join([tool, normalize_question(question), normalize_question(context), schema_hash(schema_info)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class NLSQLCache:
+    """SQLite-backed cache of generated SQL with TTL and LRU eviction"""
+
+    def __init__(self, db_path: Optional[str] = None, ttl: float = NL_SQL_CACHE_TTL,
+                 max_entries: int = NL_SQL_CACHE_MAX_ENTRIES, enabled: bool = NL_SQL_CACHE_ENABLED):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._installed = set()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0,
+                       "invalidations": 0, "errors": 0}
+        self.semantic = SemanticIndex()
+        self.version = 0  # bumped on every change made in this process; semantic indexes rebuild on it
+        self._semantic_sources: "OrderedDict[str, str]" = OrderedDict()  # question key -> paraphrase key reused
+        self._pending_hits: Dict[str, List[float]] = {}  # cache_key -> [hits, last_used_at] not yet written
+        self._hits_flushed_at = time.time()
+
+    def _changed(self, n: int = 1):
+        if n:
+            with self._lock:
+                self.version += 1
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    def ensure_table(self, db_path: Optional[str] = None):
+        path = os.path.abspath(str(db_path or self.db_path or DB_PATH))
+        if path in self._installed:
+            return
+        with self._lock:
+            if path in self._installed:
+                return
+            with get_db(db_path or self.db_path, tables=(CACHE_TABLE,)) as conn:
+                conn.executescript(_DDL)
+            self._installed.add(path)
+
+    def lookup(self, tool: str, question: str, context: Optional[str], schema_info: str) -> Optional[str]:
+        """Cached SQL for the question, or None (also when disabled or on any cache error)"""
+        if not self.enabled:
+            return None
+        key = cache_key(tool, question, context, schema_info)
+        now = time.time()
+        try:
+            self.ensure_table()
+            with get_read_db(self.db_path) as conn:
+                row = conn.execute(f"SELECT sql, expires_at FROM {CACHE_TABLE} WHERE cache_key = ?",
+                                   (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                with get_db(self.db_path, tables=(CACHE_TABLE,)) as conn:
+                    conn.execute(f"DELETE FROM {CACHE_TABLE} WHERE cache_key = ?", (key,))
+                    conn.commit()
+                self._count("expired")
+                self._changed()
+                row = None
+            if row is None:
+                match = self._semantic_lookup(tool, question, context, schema_info, now)
+                if match is None:
+                    self._count("misses")
+                    return None
+                with self._lock:
+                    self._semantic_sources[key] = match["cache_key"]
+                    if len(self._semantic_sources) > self.max_entries:
+                        self._semantic_sources.popitem(last=False)
+                key, sql, counter = match["cache_key"], match["sql"], "semantic_hits"
+            else:
+                sql, counter = row[0], "hits"
+            with self._lock:
+                self._stats[counter] += 1
+                pending = self._pending_hits.setdefault(key, [0, now])
+                pending[0] += 1
+                pending[1] = now
+                due = now - self._hits_flushed_at >= NL_SQL_CACHE_HIT_FLUSH_S
+            if due:
+                self.flush_hits()
+            return sql
+        except sqlite3.Error as e:
+            self._count("errors")
+            print(f"⚠️ NL-to-SQL cache lookup failed: {e}")
+            return None
+
+    def flush_hits(self, conn: Optional[sqlite3.Connection] = None):
+        """Write buffered hit counts; inside ``conn``'s transaction when given"""
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, {}
+            self._hits_flushed_at = time.time()
+        if not pending:
+            return
+        rows = [(hits, last_used, key) for key, (hits, last_used) in pending.items()]
+        update = f"UPDATE {CACHE_TABLE} SET hits = hits + ?, last_used_at = MAX(last_used_at, ?) WHERE cache_key = ?"
+        try:
+            if conn is not None:
+                conn.executemany(update, rows)
+                return
+            with get_db(self.db_path, tables=(CACHE_TABLE,)) as conn:
+                conn.executemany(update, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            self._count("errors")
+            print(f"⚠️ NL-to-SQL cache lost {len(rows)} hit counters: {e}")
+
+    def _semantic_lookup(self, tool: str, question: str, context: Optional[str], schema_info: str,
+                         now: float) -> Optional[Dict[str, Any]]:
+        partition = (tool, schema_hash(schema_info), normalize_question(context))
+
+        def load_rows():
+            with get_read_db(self.db_path) as conn:
+                return conn.execute(f"""
+                    SELECT cache_key, question, sql FROM {CACHE_TABLE}
+                    WHERE tool = ? AND schema_hash = ? AND context = ? AND expires_at > ?
+                """, (*partition, now)).fetchall()
+
+        return self.semantic.search(partition, self.version, load_rows, question, self.db_path)
+
+    def store(self, tool: str, question: str, context: Optional[str], schema_info: str, sql: str):
+        """Save SQL that executed successfully; evicts expired and least recently used entries"""
+        if not self.enabled or not sql:
+            return
+        key = cache_key(tool, question, context, schema_info)
+        now = time.time()
+        try:
+            self.ensure_table()
+            with get_db(self.db_path, tables=(CACHE_TABLE,)) as conn:
+                conn.execute(f"""
+                    INSERT INTO {CACHE_TABLE}
+                        (cache_key, tool, question, context, schema_hash, sql, hits, created_at, last_used_at, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
+                    ON CONFLICT(cache_key) DO UPDATE SET
+                        sql = excluded.sql, created_at = excluded.created_at,
+                        last_used_at = excluded.last_used_at, expires_at = excluded.expires_at
+                """, (key, tool, normalize_question(question), normalize_question(context),
+                      schema_hash(schema_info), sql, now, now, now + self.ttl))
+                # Eviction orders by last_used_at, so buffered hits must land first
+                self.flush_hits(conn)
+                expired = conn.execute(f"DELETE FROM {CACHE_TABLE} WHERE expires_at <= ?", (now,)).rowcount
+                evicted = conn.execute(f"""
+                    DELETE FROM {CACHE_TABLE} WHERE cache_key IN (
+                        SELECT cache_key FROM {CACHE_TABLE} ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,)).rowcount
+                conn.commit()
+            self._count("stores")
+            self._count("expired", expired)
+            self._count("evictions", evicted)
+            self._changed()
+        except sqlite3.Error as e:
+            self._count("errors")
+            print(f"⚠️ NL-to-SQL cache store failed: {e}")
+
+    def invalidate(self, tool: str, question: str, context: Optional[str], schema_info: str):
+        """Drop a cached statement that no longer executes"""
+        if not self.enabled:
+            return
+        key = cache_key(tool, question, context, schema_info)
+        with self._lock:
+            source = self._semantic_sources.pop(key, None)
+        self._count("invalidations", self.purge(cache_key=source or key))
+
+    def entries(self, tool: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recently used entries"""
+        self.ensure_table()
+        self.flush_hits()
+        where, params = ("WHERE tool = ?", [tool]) if tool else ("", [])
+        with get_read_db(self.db_path) as conn:
+            cursor = conn.execute(f"""
+                SELECT cache_key, tool, question, context, schema_hash, sql, hits,
+                       created_at, last_used_at, expires_at
+                FROM {CACHE_TABLE} {where} ORDER BY last_used_at DESC LIMIT ?
+            """, (*params, limit))
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def purge(self, tool: Optional[str] = None, cache_key: Optional[str] = None, expired_only: bool = False) -> int:
+        """Delete matching entries (all of them with no filters); returns the number removed"""
+        self.ensure_table()
+        clauses, params = [], []
+        if tool:
+            clauses.append("tool = ?")
+            params.append(tool)
+        if cache_key:
+            clauses.append("cache_key = ?")
+            params.append(cache_key)
+        if expired_only:
+            clauses.append("expires_at <= ?")
+            params.append(time.time())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with get_db(self.db_path, tables=(CACHE_TABLE,)) as conn:
+            deleted = conn.execute(f"DELETE FROM {CACHE_TABLE} {where}", params).rowcount
+            conn.commit()
+        self._changed(deleted)
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["semantic_hits"] + stats["misses"]
+        result = {
+            "enabled": self.enabled,
+            "ttl_s": self.ttl,
+            "max_entries": self.max_entries,
+            "hit_rate": round((stats["hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0,
+            **stats,
+            "semantic": self.semantic.stats(),
+        }
+        try:
+            self.ensure_table()
+            self.flush_hits()
+            with get_read_db(self.db_path) as conn:
+                result["entries_by_tool"] = {
+                    tool: {"entries": entries, "hits": hits}
+                    for tool, entries, hits in conn.execute(
+                        f"SELECT tool, COUNT(*), COALESCE(SUM(hits), 0) FROM {CACHE_TABLE} GROUP BY tool"
+                    ).fetchall()
+                }
+            result["entries"] = sum(t["entries"] for t in result["entries_by_tool"].values())
+        except sqlite3.Error as e:
+            result["error"] = str(e)
+        return result
+
+
+nl_sql_cache = NLSQLCache()
+atexit.register(nl_sql_cache.flush_hits)
+
+
+def get_nl_sql_cache_stats() -> Dict[str, Any]:
+    return nl_sql_cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or purge the NL-to-SQL translation cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="hit rate and entries per tool")
+    list_parser = sub.add_parser("list", help="most recently used entries")
+    list_parser.add_argument("--tool", default=None)
+    list_parser.add_argument("--limit", type=int, default=20)
+    purge_parser = sub.add_parser("purge", help="delete entries")
+    purge_parser.add_argument("--tool", default=None)
+    purge_parser.add_argument("--expired", action="store_true", help="only expired entries")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(nl_sql_cache.stats(), indent=2))
+    elif args.command == "list":
+        for entry in nl_sql_cache.entries(args.tool, args.limit):
+            print(f"{entry['tool']:<16} hits {entry['hits']:>5}  {entry['question'][:60]}")
+            print(f"{'':<16} {entry['sql'][:100]}")
+    else:
+        deleted = nl_sql_cache.purge(tool=args.tool, expired_only=args.expired)
+        print(f"🧹 Removed {deleted} cached translations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Keyset Pagination
+
+Listings are ordered newest first on ``(created_at, id)``. Instead of
+OFFSET (which scans and discards every skipped row), the next page starts
+strictly after the last row returned::
+
+    WHERE (COALESCE(created_at, ''), id) < (:last_created_at, :last_id)
+    ORDER BY COALESCE(created_at, '') DESC, id DESC
+    LIMIT :limit
+
+A row-value comparison against a NULL created_at is NULL, so the key uses
+COALESCE(created_at, ''): rows without a timestamp sort after every dated
+row instead of silently dropping out of cursor pages. With an expression
+index on ``(COALESCE(created_at, ''), id)`` every page is one index seek
+plus ``limit`` rows, so page 1000 costs the same as page 1.
+
+The position is handed to clients as an opaque URL-safe base64 cursor.
+"""
+
+import base64
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+from db import DB_PATH, get_db
+from query_executor import execute_sql
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "10"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "100"))
+
+# Tables paged on (created_at, id)
+PAGINATED_TABLES = ("customers", "leads", "orders")
+
+_indexed = set()
+_index_lock = threading.Lock()
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(created_at: Any, row_id: int) -> str:
+    """Opaque cursor for the position after (created_at, id)"""
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Inverse of encode_cursor; raises InvalidCursor for anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        if not isinstance(row_id, int):
+            raise TypeError("id must be an integer")
+        return created_at, row_id
+    except Exception as e:
+        raise InvalidCursor(f"Invalid pagination cursor: {cursor!r}") from e
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def ensure_pagination_indexes(db_path: Optional[str] = None):
+    """Create the (COALESCE(created_at, ''), id) indexes the keyset queries seek on"""
+    path = os.path.abspath(str(db_path or DB_PATH))
+    if path in _indexed:
+        return
+    with _index_lock:
+        if path in _indexed:
+            return
+        try:
+            with get_db(db_path, tables=set()) as conn:
+                existing = {
+                    row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+                }
+                for table in PAGINATED_TABLES:
+                    if table in existing:
+                        conn.execute(
+                            f"CREATE INDEX IF NOT EXISTS idx_{table}_keyset ON {table}(COALESCE(created_at, ''), id)"
+                        )
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not create pagination indexes: {e}")
+            return
+        _indexed.add(path)
+
+
+def keyset_page(select_sql: str, alias: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                params: Sequence[Any] = (), db_path: Optional[str] = None) -> Dict:
+    """
+    Fetch one page of a newest-first listing.
+
+    Args:
+        select_sql: ``SELECT ... FROM ... [JOIN ...]`` with no WHERE, ORDER
+            BY or LIMIT; must select ``<alias>.id`` and ``<alias>.created_at``
+            as ``id`` and ``created_at``
+        alias: table alias (or name) carrying created_at and id
+        limit: page size, clamped to 1..PAGE_SIZE_MAX
+        cursor: ``next_cursor`` from the previous page, None for the first page
+
+    Returns:
+        Dict with ``data`` (list of row dicts), ``limit`` and ``next_cursor``
+        (None on the last page)
+
+    Raises:
+        InvalidCursor: when ``cursor`` was not produced by this module
+    """
+    limit = clamp_limit(limit)
+    where = ""
+    params = list(params)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        where = f" WHERE (COALESCE({alias}.created_at, ''), {alias}.id) < (?, ?)"
+        params += [created_at or "", row_id]
+
+    # One extra row tells whether another page exists
+    rows = execute_sql(
+        f"{select_sql}{where} ORDER BY COALESCE({alias}.created_at, '') DESC, {alias}.id DESC LIMIT ?",
+        params + [limit + 1],
+        db_path=db_path,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return {"data": rows, "limit": limit, "next_cursor": next_cursor}
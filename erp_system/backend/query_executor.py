@@ -0,0 +1,593 @@
+"""
+Shared Query Executor
+
+Single entry point for every SQL round-trip made by the agents, tools and
+memory classes. Queries run on pooled connections from ``db.get_pool()``;
+each connection keeps its own prepared-statement cache (sized by
+DB_STATEMENT_CACHE_SIZE), so parameterized statements are compiled once per
+connection and reused afterwards.
+
+Row formats:
+- "dict":    list of {column: value} dicts (default, what the agents expect)
+- "tuple":   list of plain tuples
+- "columns": {column: [values...]} columnar arrays, ready for DataFrames
+
+Read-only statements (SELECT/WITH/EXPLAIN and non-assigning PRAGMAs) run
+on the read-only reader lane automatically; everything else goes through
+the serialized writer lane, so chat logging never blocks SQL reads. That
+routing is for trusted internal SQL only: LLM-generated and ad hoc SQL is
+pinned to the reader lane (``read_only=True``, implied by a budget).
+
+Every statement is timed and aggregated per normalized SQL text so that
+``get_query_stats()`` can show where database time goes.
+
+Untrusted SQL (LLM-generated or ad hoc from the API) runs under a
+``QueryBudget``: wall-clock time and VM steps are enforced with SQLite's
+progress handler (plus an ``interrupt()`` watchdog), and returned rows are
+capped while fetching. Exceeding any limit raises ``QueryBudgetExceeded``
+naming the limit that was hit. Budgets are configured per caller.
+
+Read queries can opt into the shared result cache (``cache=True``, see
+``result_cache``); writes report the table they modify to the writer lane
+so only cached results that read that table are invalidated.
+
+Large exports use ``QueryStream``, which pulls rows with ``fetchmany`` and
+encodes them as NDJSON or CSV chunk by chunk, so memory stays constant no
+matter how many rows the query returns.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import threading
+import time
+import sqlite3
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from db import get_db, get_read_db, get_pool
+from result_cache import RESULT_CACHE_ENABLED, result_cache
+from schema_catalog import get_schema_catalog
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+ROW_FORMATS = ("dict", "tuple", "columns")
+STREAM_FORMATS = ("ndjson", "csv")
+STREAM_CHUNK_ROWS = int(os.getenv("QUERY_STREAM_CHUNK_ROWS", "1000"))
+STREAM_MAX_ROWS = int(os.getenv("QUERY_STREAM_MAX_ROWS", "1000000"))
+PROGRESS_HANDLER_STEPS = 10000  # VM instructions between budget checks
+
+_WHITESPACE = re.compile(r"\s+")
+_LEADING_COMMENTS = re.compile(r"^\s*(?:(?:--[^\n]*\n)|(?:/\*.*?\*/)|\s)*", re.DOTALL)
+_WRITE_TARGET = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE,
+)
+READ_KEYWORDS = ("SELECT", "WITH", "EXPLAIN", "VALUES")
+
+
+def is_read_query(query: str) -> bool:
+    """True when a statement can run on a read-only connection"""
+    body = _LEADING_COMMENTS.sub("", query, count=1).lstrip("( \t\n").upper()
+    if body.startswith(READ_KEYWORDS):
+        return True
+    return body.startswith("PRAGMA") and "=" not in body
+
+
+def write_target_tables(query: str) -> Optional[set]:
+    """
+    Table modified by a single INSERT/REPLACE/UPDATE/DELETE statement.
+
+    Returns None when the target cannot be determined (DDL, CTE-prefixed
+    writes, scripts), which callers treat as "anything may have changed".
+    """
+    match = _WRITE_TARGET.match(_LEADING_COMMENTS.sub("", query, count=1))
+    return {match.group(1)} if match else None
+
+
+def written_tables(queries: Iterable[str], db_path: Optional[str] = None) -> Optional[set]:
+    """
+    Tables changed by a batch of write statements, including tables written
+    by triggers (e.g. the customer_stats rollup behind orders). None when
+    any statement's target is unknown.
+    """
+    tables = set()
+    for query in queries:
+        target = write_target_tables(query)
+        if target is None:
+            return None
+        tables |= target
+    return get_schema_catalog(db_path).snapshot().with_trigger_targets(tables)
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """Per-query resource limits"""
+    max_ms: float = 10000
+    max_vm_steps: int = 200_000_000
+    max_rows: int = 10000
+
+
+def _budget_from_env(caller: str, default: QueryBudget) -> QueryBudget:
+    """Read QUERY_BUDGET_<CALLER>_MS / _VM_STEPS / _ROWS overrides"""
+    prefix = f"QUERY_BUDGET_{caller.upper()}"
+    return QueryBudget(
+        max_ms=float(os.getenv(f"{prefix}_MS", default.max_ms)),
+        max_vm_steps=int(os.getenv(f"{prefix}_VM_STEPS", default.max_vm_steps)),
+        max_rows=int(os.getenv(f"{prefix}_ROWS", default.max_rows)),
+    )
+
+
+# Budgets per caller: ad hoc API SQL, Sales Agent and Analytics Agent NL-to-SQL
+QUERY_BUDGETS: Dict[str, QueryBudget] = {
+    "api": _budget_from_env("api", QueryBudget(max_ms=10000, max_vm_steps=200_000_000, max_rows=10000)),
+    "sales_agent": _budget_from_env("sales_agent", QueryBudget(max_ms=5000, max_vm_steps=100_000_000, max_rows=1000)),
+    "analytics_agent": _budget_from_env("analytics_agent", QueryBudget(max_ms=15000, max_vm_steps=500_000_000, max_rows=5000)),
+}
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a query hits its time, VM-step or row budget"""
+
+    def __init__(self, limit: str, budget: QueryBudget, caller: Optional[str] = None, elapsed_ms: float = 0.0):
+        self.limit = limit  # "time", "vm_steps" or "rows"
+        self.budget = budget
+        self.caller = caller
+        self.elapsed_ms = elapsed_ms
+        allowed = {
+            "time": f"{budget.max_ms:.0f} ms",
+            "vm_steps": f"{budget.max_vm_steps} VM steps",
+            "rows": f"{budget.max_rows} rows",
+        }[limit]
+        super().__init__(f"Query budget exceeded: {limit} limit of {allowed} reached"
+                         f"{f' for {caller}' if caller else ''}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "error": str(self),
+            "limit": self.limit,
+            "caller": self.caller,
+            "budget": asdict(self.budget),
+            "elapsed_ms": round(self.elapsed_ms, 3),
+        }
+
+
+def resolve_budget(budget: Union[QueryBudget, str, None]) -> tuple:
+    """Return (QueryBudget or None, caller name) for a budget or caller name"""
+    if budget is None or isinstance(budget, QueryBudget):
+        return budget, None
+    if budget not in QUERY_BUDGETS:
+        raise ValueError(f"Unknown query budget '{budget}', expected one of {list(QUERY_BUDGETS)}")
+    return QUERY_BUDGETS[budget], budget
+
+
+class QueryStats:
+    """Thread-safe per-statement timing aggregates"""
+
+    def __init__(self, max_statements: int = 200):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._statements: Dict[str, Dict] = {}
+        self._totals = {"queries": 0, "errors": 0, "rows": 0, "total_ms": 0.0}
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Collapse whitespace so formatting differences share one entry"""
+        return _WHITESPACE.sub(" ", query).strip()[:300]
+
+    def record(self, query: str, elapsed_ms: float, rows: int = 0, error: bool = False):
+        key = self.normalize(query)
+        with self._lock:
+            self._totals["queries"] += 1
+            self._totals["rows"] += rows
+            self._totals["total_ms"] += elapsed_ms
+            if error:
+                self._totals["errors"] += 1
+
+            entry = self._statements.get(key)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    # Drop the cheapest statement to make room
+                    cheapest = min(self._statements, key=lambda k: self._statements[k]["total_ms"])
+                    del self._statements[cheapest]
+                entry = {"count": 0, "errors": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0}
+                self._statements[key] = entry
+            entry["count"] += 1
+            entry["rows"] += rows
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            if error:
+                entry["errors"] += 1
+
+        if elapsed_ms >= SLOW_QUERY_MS:
+            print(f"🐢 Slow query ({elapsed_ms:.1f} ms): {key[:120]}")
+
+    def snapshot(self, top: int = 10) -> Dict:
+        with self._lock:
+            totals = dict(self._totals)
+            statements = [
+                {
+                    "sql": sql,
+                    **entry,
+                    "total_ms": round(entry["total_ms"], 3),
+                    "max_ms": round(entry["max_ms"], 3),
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 3),
+                }
+                for sql, entry in self._statements.items()
+            ]
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        totals["total_ms"] = round(totals["total_ms"], 3)
+        totals["avg_ms"] = round(totals["total_ms"] / totals["queries"], 3) if totals["queries"] else 0.0
+        return {"totals": totals, "top_statements": statements[:top]}
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._totals = {"queries": 0, "errors": 0, "rows": 0, "total_ms": 0.0}
+
+
+query_stats = QueryStats()
+
+
+def format_rows(columns: List[str], rows: List[tuple], row_format: str = "dict") -> Union[List, Dict]:
+    """Convert raw tuples into the requested row format"""
+    if row_format == "tuple":
+        return rows
+    if row_format == "columns":
+        if not rows:
+            return {col: [] for col in columns}
+        return {col: list(values) for col, values in zip(columns, zip(*rows))}
+    return [dict(zip(columns, row)) for row in rows]
+
+
+class _BudgetGuard:
+    """
+    Progress handler plus ``interrupt()`` watchdog enforcing a budget's time
+    and VM-step limits on one connection until ``remove()`` is called.
+
+    Only time while the guard is running counts against ``max_ms``: streams
+    ``pause()`` it between fetches so a slow client does not use up the
+    budget, and ``resume()`` it for the next fetch.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, budget: QueryBudget, caller: Optional[str]):
+        self.conn = conn
+        self.budget = budget
+        self.caller = caller
+        self.used = 0.0  # seconds spent running before the current run
+        self.deadline = 0.0
+        self.steps = 0
+        self.limit: Optional[str] = None
+        self.removed = False
+        self._run_start: Optional[float] = None
+        self._run = 0  # bumped per resume() so a stale watchdog can tell it is stale
+        self._timer: Optional[threading.Timer] = None
+        # Timer.cancel() does not stop a callback that already started: the
+        # watchdog checks its run under this lock before interrupting
+        self._lock = threading.Lock()
+
+        conn.set_progress_handler(self._progress_handler, PROGRESS_HANDLER_STEPS)
+        self.resume()
+
+    def resume(self):
+        """Start counting time again and re-arm the watchdog for what is left"""
+        with self._lock:
+            if self._run_start is not None or self.removed:
+                return
+            self._run += 1
+            self._run_start = time.perf_counter()
+            remaining = max(0.0, self.budget.max_ms / 1000 - self.used)
+            self.deadline = self._run_start + remaining
+            self._timer = threading.Timer(remaining + 0.5, self._watchdog, args=(self._run,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pause(self):
+        """Stop counting time (e.g. while a stream waits for its client)"""
+        with self._lock:
+            self._pause_locked()
+
+    def _pause_locked(self):
+        if self._run_start is None:
+            return
+        self._timer.cancel()
+        self._timer = None
+        self.used += time.perf_counter() - self._run_start
+        self._run_start = None
+
+    def elapsed_ms(self) -> float:
+        running = time.perf_counter() - self._run_start if self._run_start is not None else 0.0
+        return (self.used + running) * 1000
+
+    def _progress_handler(self) -> int:
+        self.steps += PROGRESS_HANDLER_STEPS
+        if self.steps > self.budget.max_vm_steps:
+            self.limit = "vm_steps"
+            return 1
+        if self._run_start is not None and time.perf_counter() > self.deadline:
+            self.limit = "time"
+            return 1
+        return 0
+
+    def _watchdog(self, run: int):
+        # Backstop for long stretches without progress callbacks. Only interrupt
+        # while this run is still active: after pause() or remove() the
+        # connection may be idle or already checked out by another request
+        with self._lock:
+            if self.removed or run != self._run or self._run_start is None:
+                return
+            self.limit = self.limit or "time"
+            self.conn.interrupt()
+
+    def exceeded(self, limit: Optional[str] = None) -> QueryBudgetExceeded:
+        return QueryBudgetExceeded(limit or self.limit, self.budget, self.caller, self.elapsed_ms())
+
+    def remove(self):
+        with self._lock:
+            self.removed = True
+            self._pause_locked()
+        self.conn.set_progress_handler(None, 0)
+
+
+def _run_with_budget(conn: sqlite3.Connection, cursor: sqlite3.Cursor, query: str,
+                     params: Sequence[Any], budget: QueryBudget, caller: Optional[str]) -> List[tuple]:
+    """Execute and fetch under a budget using the progress handler and interrupt()"""
+    guard = _BudgetGuard(conn, budget, caller)
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchmany(budget.max_rows + 1)
+    except sqlite3.OperationalError:
+        if guard.limit:
+            raise guard.exceeded()
+        raise
+    finally:
+        guard.remove()
+
+    if len(rows) > budget.max_rows:
+        raise guard.exceeded("rows")
+    return rows
+
+
+def execute_sql(query: str, params: Sequence[Any] = (), row_format: str = "dict",
+                db_path: Optional[str] = None, read_only: Optional[bool] = None,
+                budget: Union[QueryBudget, str, None] = None, cache: bool = False) -> Union[List, Dict]:
+    """
+    Execute a query on a pooled connection and return its rows.
+
+    Args:
+        query: SQL text; pass values through ``params`` so the statement
+            cache can reuse the compiled statement
+        params: positional or named parameters
+        row_format: one of "dict", "tuple" or "columns"
+        db_path: database file, defaults to DB_PATH
+        read_only: force the reader (True) or writer (False) lane; by
+            default the lane is picked from the statement text, except
+            for budgeted queries, which always use the reader lane.
+            Picking from the text is only for trusted internal SQL; LLM
+            and ad hoc callers pass True
+        budget: a QueryBudget or caller name ("api", "sales_agent",
+            "analytics_agent") to limit time, VM steps and rows
+        cache: serve repeated read queries from the result cache until a
+            table they read is written; ignored for non-deterministic SQL
+
+    Raises:
+        ValueError: for an unknown row format or budget name
+        QueryBudgetExceeded: when a budgeted query hits one of its limits
+        sqlite3.Error: whatever SQLite raises for the statement
+    """
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"Unknown row format '{row_format}', expected one of {ROW_FORMATS}")
+
+    budget, caller = resolve_budget(budget)
+    if read_only is None:
+        # Budgeted SQL is untrusted: never let it reach the writer lane
+        read_only = budget is not None or is_read_query(query)
+    connect = get_read_db if read_only else get_db
+
+    cache_key = None
+    if cache and read_only and RESULT_CACHE_ENABLED and not result_cache.is_cacheable(query):
+        result_cache.note_uncacheable()  # date('now'), random(), ...: always run
+        cache = False
+    if cache and read_only and RESULT_CACHE_ENABLED:
+        tables = result_cache.referenced_tables(query, get_schema_catalog(db_path).snapshot().all_tables())
+        cached, cache_key, token = result_cache.lookup(db_path, query, params, tables)
+        if cached is not None:
+            return format_rows(cached[0], list(cached[1]), row_format)
+
+    start = time.perf_counter()
+    rows: List[tuple] = []
+    try:
+        with connect(db_path) as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None  # plain tuples, formatted below
+            if budget is not None:
+                rows = _run_with_budget(conn, cursor, query, params, budget, caller)
+            else:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            columns = [col[0] for col in cursor.description] if cursor.description else []
+    except Exception:
+        query_stats.record(query, (time.perf_counter() - start) * 1000, error=True)
+        raise
+    query_stats.record(query, (time.perf_counter() - start) * 1000, rows=len(rows))
+    if cache_key is not None:
+        result_cache.store(cache_key, token, columns, rows)
+    return format_rows(columns, rows, row_format)
+
+
+def execute_write(query: str, params: Union[Sequence[Any], List[Sequence[Any]]] = (),
+                  many: bool = False, db_path: Optional[str] = None) -> Dict:
+    """
+    Execute a write statement (or ``executemany`` batch) and commit.
+
+    Returns:
+        Dict with ``rows_affected`` and ``lastrowid``
+    """
+    start = time.perf_counter()
+    try:
+        with get_db(db_path, tables=written_tables([query], db_path)) as conn:
+            cursor = conn.cursor()
+            if many:
+                cursor.executemany(query, params)
+            else:
+                cursor.execute(query, params)
+            conn.commit()
+            result = {"rows_affected": cursor.rowcount, "lastrowid": cursor.lastrowid}
+    except Exception:
+        query_stats.record(query, (time.perf_counter() - start) * 1000, error=True)
+        raise
+    query_stats.record(query, (time.perf_counter() - start) * 1000, rows=max(result["rows_affected"], 0))
+    return result
+
+
+class QueryStream:
+    """
+    Cursor-backed streaming result set.
+
+    The statement is executed on construction (so SQL errors surface before
+    any bytes are sent); iterating yields encoded chunks of ``chunk_size``
+    rows. The read connection is held by the stream itself rather than the
+    calling thread, because web servers may resume the iterator on a
+    different worker thread, and it is returned to the pool when the stream
+    is exhausted or closed. ``close()`` may run on another thread while a
+    fetch is in flight (client disconnects), so fetches and the release
+    share a lock and a closed stream simply ends.
+
+    The budget's VM-step limit covers the whole stream, from execute to the
+    last fetch; its time limit counts only time spent inside SQLite, not time
+    waiting for the client to read a chunk, so slow consumers do not cut a
+    long export short. Its row limit does not apply (``max_rows`` caps the
+    stream instead). Construction blocks on SQLite, so async callers
+    should build the stream on a worker thread.
+    """
+
+    def __init__(self, query: str, params: Sequence[Any] = (), fmt: str = "ndjson",
+                 chunk_size: int = STREAM_CHUNK_ROWS, max_rows: Optional[int] = None,
+                 db_path: Optional[str] = None, budget: Union[QueryBudget, str, None] = "api"):
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f"Unknown stream format '{fmt}', expected one of {STREAM_FORMATS}")
+        self.query = query
+        self.fmt = fmt
+        self.chunk_size = max(1, chunk_size)
+        self.max_rows = min(max_rows or STREAM_MAX_ROWS, STREAM_MAX_ROWS)
+        self.summary: Optional[Dict] = None
+        budget, caller = resolve_budget(budget)
+        self._lock = threading.Lock()
+
+        self._pool = get_pool(db_path, read_only=True)
+        self._conn = self._pool.acquire()
+        self._guard = _BudgetGuard(self._conn, budget, caller) if budget is not None else None
+        self._start = time.perf_counter()
+        try:
+            self._cursor = self._conn.cursor()
+            self._cursor.row_factory = None
+            self._cursor.execute(query, params)
+            if self._guard is not None:
+                self._guard.pause()
+        except Exception as e:
+            query_stats.record(query, (time.perf_counter() - self._start) * 1000, error=True)
+            limit = self._guard.limit if self._guard else None
+            self._release()
+            if limit and isinstance(e, sqlite3.OperationalError):
+                raise QueryBudgetExceeded(limit, budget, caller, (time.perf_counter() - self._start) * 1000)
+            raise
+        self.columns = [col[0] for col in self._cursor.description] if self._cursor.description else []
+
+    def _fetch(self, size: int) -> List[tuple]:
+        """fetchmany with the budget's clock running only for the fetch itself; [] once closed"""
+        with self._lock:
+            if self._conn is None:
+                return []
+            if self._guard is None:
+                return self._cursor.fetchmany(size)
+            self._guard.resume()
+            try:
+                return self._cursor.fetchmany(size)
+            finally:
+                self._guard.pause()
+
+    @property
+    def media_type(self) -> str:
+        return "application/x-ndjson" if self.fmt == "ndjson" else "text/csv"
+
+    def _encode(self, rows: List[tuple]) -> str:
+        if self.fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            return buffer.getvalue()
+        return "".join(json.dumps(dict(zip(self.columns, row)), default=str) + "\n" for row in rows)
+
+    def __iter__(self) -> Iterator[str]:
+        sent = 0
+        truncated = False
+        error = False
+        exceeded: Optional[QueryBudgetExceeded] = None
+        try:
+            if self.fmt == "csv":
+                buffer = io.StringIO()
+                csv.writer(buffer).writerow(self.columns)
+                yield buffer.getvalue()
+
+            while sent < self.max_rows:
+                rows = self._fetch(min(self.chunk_size, self.max_rows - sent))
+                if not rows:
+                    break
+                sent += len(rows)
+                yield self._encode(rows)
+            else:
+                # Row cap reached: report truncation only if more rows existed
+                truncated = bool(self._fetch(1))
+        except sqlite3.OperationalError:
+            error = True
+            if not (self._guard and self._guard.limit):
+                raise
+            # Headers are already sent: end the body early and say why
+            exceeded = self._guard.exceeded()
+            truncated = True
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - self._start
+            self.summary = {
+                "rows": sent,
+                "truncated": truncated,
+                "max_rows": self.max_rows,
+                "elapsed_ms": round(elapsed * 1000, 3),
+                "rows_per_second": round(sent / elapsed, 1) if elapsed > 0 else None,
+            }
+            if exceeded is not None:
+                self.summary["budget_exceeded"] = exceeded.to_dict()
+            query_stats.record(self.query, elapsed * 1000, rows=sent, error=error)
+            self._release()
+            if exceeded is not None:
+                print(f"⏱️ Stream stopped after {sent} rows: {exceeded}")
+            else:
+                print(f"📤 Streamed {sent} rows as {self.fmt} ({self.summary['rows_per_second']} rows/s)")
+
+        if self.fmt == "ndjson":
+            yield json.dumps({"_summary": self.summary}) + "\n"
+
+    def _release(self):
+        # Waits for an in-flight fetch, so the connection is never pooled while in use
+        with self._lock:
+            conn, self._conn = self._conn, None
+            if conn is not None:
+                if self._guard is not None:
+                    self._guard.remove()
+                cursor = getattr(self, "_cursor", None)
+                if cursor is not None:
+                    cursor.close()  # finalize the statement so it holds no read snapshot
+                self._pool.release(conn)
+
+    def close(self):
+        """Release the connection early (e.g. client disconnected before iterating)"""
+        self._release()
+
+
+def get_query_stats(top: int = 10) -> Dict:
+    """Aggregated per-statement timings"""
+    stats = query_stats.snapshot(top)
+    stats["budgets"] = {caller: asdict(budget) for caller, budget in QUERY_BUDGETS.items()}
+    return stats
@@ -0,0 +1,219 @@
+"""
+Read Query Result Cache
+
+Caches the raw rows of read queries keyed by normalized SQL text and
+parameters, so repeated dashboard questions (top customers, revenue
+report, customer summary) do not hit the disk while the data is unchanged.
+
+Invalidation:
+- In-process writes go through the writer lane, which reports the tables it
+  touched (``db.add_write_listener``). Each table has a write counter and an
+  entry is valid only while the counters of the tables it reads are
+  unchanged, so chat logging into ``messages`` does not evict order reports.
+  Writers that do not declare their tables invalidate the whole database.
+- Writes from other processes are detected through ``PRAGMA data_version``
+  on a dedicated probe connection and invalidate the whole database.
+- Entries also expire after RESULT_CACHE_TTL seconds as a safety net.
+
+Statements whose result changes without any write (``date('now')``,
+``CURRENT_TIMESTAMP``, ``random()``, ``changes()``, ...) are never cached.
+
+Entries are evicted least-recently-used once the cache exceeds
+RESULT_CACHE_MAX_BYTES.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from db import DB_PATH, add_write_listener
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") != "0"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(2 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+_WHITESPACE = re.compile(r"\s+")
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# Functions and keywords whose value is not fixed by the data; matching a
+# column of the same name only costs a cache miss
+_NON_DETERMINISTIC = re.compile(
+    r"\b(?:now|current_timestamp|current_date|current_time|random|randomblob|"
+    r"changes|total_changes|last_insert_rowid)\b",
+    re.IGNORECASE,
+)
+
+
+class _DatabaseVersion:
+    """Write counters and data_version probe for one database file"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.epoch = 0  # bumped when any table may have changed
+        self.table_counters: Dict[str, int] = {}
+        self._probe: Optional[sqlite3.Connection] = None
+        self._acked_data_version: Optional[int] = None
+
+    def _data_version(self) -> Optional[int]:
+        try:
+            if self._probe is None:
+                self._probe = sqlite3.connect(self.db_path, check_same_thread=False)
+            return self._probe.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def check_external(self):
+        """Bump the epoch if another connection committed since the last check"""
+        version = self._data_version()
+        if version is not None and version != self._acked_data_version:
+            if self._acked_data_version is not None:
+                self.epoch += 1
+            self._acked_data_version = version
+
+    def note_write(self, tables: Optional[set]):
+        """Record an in-process write and acknowledge it on the probe"""
+        if tables is None:
+            self.epoch += 1
+        else:
+            for table in tables:
+                self.table_counters[table] = self.table_counters.get(table, 0) + 1
+        self._acked_data_version = self._data_version()
+
+    def token(self, tables: Tuple[str, ...]) -> Tuple:
+        return (self.epoch,) + tuple(self.table_counters.get(t, 0) for t in tables)
+
+    def close(self):
+        if self._probe is not None:
+            self._probe.close()
+            self._probe = None
+
+
+class ResultCache:
+    """Byte-bounded LRU cache of read query results"""
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES, ttl: float = RESULT_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._versions: Dict[str, _DatabaseVersion] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0, "too_large": 0,
+                       "uncacheable": 0}
+
+    @staticmethod
+    def _db_key(db_path: Optional[str]) -> str:
+        return os.path.abspath(str(db_path or DB_PATH))
+
+    def _version(self, db_key: str) -> _DatabaseVersion:
+        version = self._versions.get(db_key)
+        if version is None:
+            version = _DatabaseVersion(db_key)
+            self._versions[db_key] = version
+        return version
+
+    @staticmethod
+    def make_key(db_key: str, query: str, params: Sequence[Any]) -> Tuple:
+        normalized = _WHITESPACE.sub(" ", query).strip().rstrip(";")
+        return (db_key, normalized, json.dumps(params, default=str, sort_keys=True))
+
+    @staticmethod
+    def is_cacheable(query: str) -> bool:
+        """False for statements that can return different rows without a write"""
+        return _NON_DETERMINISTIC.search(query) is None
+
+    def note_uncacheable(self):
+        with self._lock:
+            self._stats["uncacheable"] += 1
+
+    @staticmethod
+    def referenced_tables(query: str, known_tables: Sequence[str]) -> Tuple[str, ...]:
+        """Tables a query reads, matched against the schema's table names"""
+        known = {t.lower(): t for t in known_tables}
+        found = {known[word.lower()] for word in _IDENTIFIER.findall(query) if word.lower() in known}
+        return tuple(sorted(found))
+
+    def lookup(self, db_path: Optional[str], query: str, params: Sequence[Any],
+               tables: Tuple[str, ...]) -> Tuple[Optional[Tuple], Tuple, Tuple]:
+        """
+        Look up a query.
+
+        Returns:
+            (cached (columns, rows) or None, cache key, version token to
+            store with a fresh result)
+        """
+        db_key = self._db_key(db_path)
+        key = self.make_key(db_key, query, params)
+        with self._lock:
+            version = self._version(db_key)
+            version.check_external()
+            token = version.token(tables)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry["token"] == token and time.monotonic() - entry["stored_at"] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry["result"], key, token
+                self._remove(key)
+                self._stats["invalidations"] += 1
+            self._stats["misses"] += 1
+            return None, key, token
+
+    def store(self, key: Tuple, token: Tuple, columns: List[str], rows: List[tuple]):
+        """Store a result computed under ``token`` (taken before the query ran)"""
+        size = len(json.dumps(rows, default=str)) + sum(len(c) for c in columns) + 64
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self._stats["too_large"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"token": token, "result": (columns, rows), "size": size,
+                                  "stored_at": time.monotonic()}
+            self._bytes += size
+            self._stats["stores"] += 1
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+
+    def on_write(self, db_path: str, tables: Optional[set]):
+        """Write listener registered with the writer lane"""
+        with self._lock:
+            self._version(self._db_key(db_path)).note_write(tables)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "enabled": RESULT_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                **self._stats,
+            }
+
+
+result_cache = ResultCache()
+add_write_listener(result_cache.on_write)
+
+
+def get_result_cache_stats() -> Dict:
+    return result_cache.stats()
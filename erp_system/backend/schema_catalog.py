@@ -0,0 +1,157 @@
+"""
+Schema Catalog
+
+Caches table, column, foreign-key and index introspection for a database.
+The catalog is loaded once on a single read connection and reused until
+SQLite's ``PRAGMA schema_version`` changes (any CREATE/ALTER/DROP bumps it),
+so building an NL-to-SQL prompt costs one PRAGMA instead of one round-trip
+per table.
+
+Usage:
+    snapshot = get_schema_catalog().snapshot()
+    schema_info = snapshot.describe(snapshot.tables)
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from db import get_read_db
+
+_TRIGGER_WRITE_TARGET = re.compile(
+    r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class TableInfo:
+    """Introspected structure of one table"""
+    name: str
+    columns: List[Dict] = field(default_factory=list)
+    foreign_keys: List[Dict] = field(default_factory=list)
+    indexes: List[Dict] = field(default_factory=list)
+    kind: str = "table"  # table, virtual or shadow
+
+    def describe(self) -> str:
+        """Prompt-friendly description (same format the agents always used)"""
+        return f"Table: {self.name}\n" + "\n".join(
+            [f"  - {col['name']} ({col['type']})" for col in self.columns]
+        )
+
+
+@dataclass(frozen=True)
+class SchemaSnapshot:
+    """Immutable view of the schema at one schema_version"""
+    schema_version: int
+    table_map: Dict[str, TableInfo]
+    trigger_writes: Dict[str, Set[str]] = field(default_factory=dict)  # table -> tables its triggers write
+
+    @property
+    def tables(self) -> List[str]:
+        """User tables, excluding SQLite internals and virtual/shadow tables"""
+        return [name for name, info in self.table_map.items() if info.kind == "table"]
+
+    def all_tables(self) -> List[str]:
+        return list(self.table_map)
+
+    def get(self, table: str) -> Optional[TableInfo]:
+        return self.table_map.get(table)
+
+    def with_trigger_targets(self, tables: Iterable[str]) -> Set[str]:
+        """``tables`` plus every table their triggers write to (transitively)"""
+        result = set(tables)
+        pending = list(result)
+        while pending:
+            for target in self.trigger_writes.get(pending.pop(), ()):
+                if target not in result:
+                    result.add(target)
+                    pending.append(target)
+        return result
+
+    def describe(self, tables: Optional[List[str]] = None) -> str:
+        names = tables if tables is not None else self.tables
+        return "\n".join(self.table_map[t].describe() for t in names if t in self.table_map)
+
+
+class SchemaCatalog:
+    """Schema introspection cache, rebuilt only when schema_version changes"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def snapshot(self) -> SchemaSnapshot:
+        """Current schema, reloading it if the database schema changed"""
+        with get_read_db(self.db_path) as conn:
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            current = self._snapshot
+            if current is not None and current.schema_version == version:
+                return current
+            with self._lock:
+                if self._snapshot is None or self._snapshot.schema_version != version:
+                    self._snapshot = self._load(conn, version)
+                    self.rebuilds += 1
+                return self._snapshot
+
+    @staticmethod
+    def _load(conn, version: int) -> SchemaSnapshot:
+        kinds = {}
+        try:
+            for row in conn.execute("PRAGMA table_list").fetchall():
+                if row[0] == "main":
+                    kinds[row[1]] = row[2]
+        except Exception:
+            pass  # SQLite < 3.37: fall back to sqlite_master only
+
+        table_map: Dict[str, TableInfo] = {}
+        rows = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        ).fetchall()
+        for name, sql in rows:
+            kind = kinds.get(name, "table")
+            if sql and sql.upper().startswith("CREATE VIRTUAL TABLE"):
+                kind = "virtual"
+            quoted = '"' + name.replace('"', '""') + '"'
+            columns = [
+                {"name": c[1], "type": c[2], "notnull": bool(c[3]), "default": c[4], "pk": c[5]}
+                for c in conn.execute(f"PRAGMA table_info({quoted})").fetchall()
+            ]
+            foreign_keys = [
+                {"column": fk[3], "ref_table": fk[2], "ref_column": fk[4]}
+                for fk in conn.execute(f"PRAGMA foreign_key_list({quoted})").fetchall()
+            ]
+            indexes = []
+            for idx in conn.execute(f"PRAGMA index_list({quoted})").fetchall():
+                idx_name = '"' + idx[1].replace('"', '""') + '"'
+                indexes.append({
+                    "name": idx[1],
+                    "unique": bool(idx[2]),
+                    "columns": [c[2] for c in conn.execute(f"PRAGMA index_info({idx_name})").fetchall()],
+                })
+            table_map[name] = TableInfo(name, columns, foreign_keys, indexes, kind)
+
+        trigger_writes: Dict[str, Set[str]] = {}
+        for table, sql in conn.execute("SELECT tbl_name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall():
+            body = re.split(r"\bBEGIN\b", sql or "", maxsplit=1, flags=re.IGNORECASE)[-1]
+            targets = {t for t in _TRIGGER_WRITE_TARGET.findall(body) if t in table_map}  # drops "DO UPDATE SET"
+            if targets:
+                trigger_writes.setdefault(table, set()).update(targets)
+        return SchemaSnapshot(version, table_map, trigger_writes)
+
+
+_catalogs: Dict[Optional[str], SchemaCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_schema_catalog(db_path: Optional[str] = None) -> SchemaCatalog:
+    """Shared catalog per database file"""
+    with _catalogs_lock:
+        catalog = _catalogs.get(db_path)
+        if catalog is None:
+            catalog = SchemaCatalog(db_path)
+            _catalogs[db_path] = catalog
+        return catalog
@@ -0,0 +1,434 @@
+"""
+Schema Linking for NL-to-SQL Prompts
+
+Picks the tables a question is about instead of pasting the whole schema
+into every prompt. Per schema_version an index is built from the schema
+catalog:
+
+- lexical: table and column name tokens, weighted by how few tables share
+  them (``id`` and ``created_at`` count for little, ``invoice`` for a lot)
+- concepts: business words mapped to tables ("revenue" -> orders,
+  "overdue" -> invoices, "vendor" -> suppliers)
+- glossary: terms from the ``glossary`` table expand the question with
+  their definitions ("AR" -> "accounts receivable balance")
+- foreign-key graph: selected tables are connected along shortest FK paths,
+  so bridge tables (order_items between products and orders) are included
+  and the join conditions are spelled out
+
+Categorical text columns (status, method, reason, ...) of the chosen tables
+get their distinct values, so the LLM filters on 'paid' rather than a
+guessed 'PAID'. Values are sampled from the first SCHEMA_LINK_SAMPLE_ROWS
+rows, so a schema_version change never costs a full table scan. When nothing in the question links, the full schema is used.
+
+Usage:
+    linked = link_schema("top customers by revenue this year")
+    prompt = f"... {linked.text} ..."
+    record_prompt("text_to_sql", prompt, linked)
+
+    python schema_linker.py "which suppliers have late purchase orders"
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+from db import DB_PATH, get_read_db
+from schema_catalog import SchemaSnapshot, get_schema_catalog
+
+SCHEMA_LINK_ENABLED = os.getenv("SCHEMA_LINK_ENABLED", "1") != "0"
+SCHEMA_LINK_MAX_TABLES = int(os.getenv("SCHEMA_LINK_MAX_TABLES", "6"))
+SCHEMA_LINK_MAX_COLUMNS = int(os.getenv("SCHEMA_LINK_MAX_COLUMNS", "16"))
+SCHEMA_LINK_SAMPLE_VALUES = int(os.getenv("SCHEMA_LINK_SAMPLE_VALUES", "8"))
+SCHEMA_LINK_SAMPLE_ROWS = int(os.getenv("SCHEMA_LINK_SAMPLE_ROWS", "10000"))
+MAX_JOIN_HOPS = 3
+RELATIVE_CUTOFF = 0.5  # tables scoring below this share of the best table are dropped
+CHARS_PER_TOKEN = 4
+
+# Never offered to the LLM
+EXCLUDED_TABLES = {"nl_sql_cache", "fuzzy_name_versions", "sqlite_sequence"}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CATEGORICAL = re.compile(
+    r"(^|_)(status|type|stage|category|source|channel|priority|method|module|role|reason|account|"
+    r"currency|country|region|segment|industry|sender|kind|state|agent)$"
+)
+
+# Stemmed question word -> tables it points at
+CONCEPT_TABLES: Dict[str, Tuple[str, ...]] = {
+    "revenue": ("orders",), "sale": ("orders",), "sold": ("orders", "order_items"), "sell": ("orders",),
+    "income": ("orders",), "turnover": ("orders",), "spend": ("orders",), "spent": ("orders",),
+    "earning": ("orders",), "selling": ("orders", "order_items"), "bought": ("orders", "order_items"),
+    "top": ("orders",), "biggest": ("orders",), "largest": ("orders",), "best": ("orders",),
+    "client": ("customers",), "buyer": ("customers",),
+    "bill": ("invoices",), "billing": ("invoices",), "receivable": ("invoices", "payment_allocations"),
+    "ar": ("invoices", "payment_allocations"), "overdue": ("invoices",), "unpaid": ("invoices",),
+    "outstanding": ("invoices", "payment_allocations"), "due": ("invoices",),
+    "paid": ("payments",), "cash": ("payments",), "collection": ("payments",),
+    "item": ("products", "order_items"), "sku": ("products",), "catalog": ("products",),
+    "inventory": ("stock", "products"), "warehouse": ("stock",), "reorder": ("stock",),
+    "vendor": ("suppliers",), "procurement": ("purchase_orders",), "purchasing": ("purchase_orders",),
+    "po": ("purchase_orders",), "receipt": ("po_receipts",), "received": ("po_receipts",),
+    "prospect": ("leads",), "pipeline": ("leads",), "conversion": ("leads",),
+    "support": ("tickets",), "complaint": ("tickets",), "issue": ("tickets",),
+    "journal": ("ledger_entries", "ledger_lines"), "debit": ("ledger_lines",), "credit": ("ledger_lines",),
+    "employee": ("users",), "staff": ("users",),
+}
+# Question words that never identify a table or column
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "by", "with", "from", "and", "or", "is", "are",
+    "was", "were", "be", "do", "doe", "did", "what", "which", "who", "how", "many", "much", "me", "us",
+    "our", "we", "my", "i", "you", "show", "list", "give", "get", "find", "tell", "have", "ha", "had",
+    "there", "that", "this", "it", "per", "each", "all", "please", "can",
+}
+CONCEPT_WEIGHT = 3.0
+NAME_WEIGHT = 3.0
+COLUMN_WEIGHT = 1.0
+
+
+def _stem(word: str) -> str:
+    if len(word) <= 3 or word[0].isdigit():
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokens(text: str) -> List[str]:
+    return [_stem(word) for word in _WORD.findall((text or "").lower())]
+
+
+def question_tokens(text: str) -> List[str]:
+    return [token for token in tokens(text) if token not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token for English and SQL identifiers)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class LinkedSchema:
+    """Schema subset chosen for one question"""
+    tables: List[str]
+    joins: List[str]
+    text: str
+    schema_fingerprint: str      # hash of the whole scope's schema; use it for cache keys
+    tokens: int
+    full_tokens: int             # what the whole scope would have cost
+    scores: Dict[str, float] = field(default_factory=dict)
+    fallback: bool = False       # nothing linked; the whole scope was used
+
+
+class SchemaLinkIndex:
+    """Lexical, concept and FK-graph index over one schema_version"""
+
+    def __init__(self, snapshot: SchemaSnapshot, db_path: Optional[str], glossary: Dict[str, List[str]]):
+        self.snapshot = snapshot
+        self.db_path = db_path
+        self.glossary = glossary
+        self.tables = [t for t in snapshot.tables if t not in EXCLUDED_TABLES]
+        self.name_sequences: Dict[str, List[str]] = {t: tokens(t.replace("_", " ")) for t in self.tables}
+        self.name_tokens: Dict[str, Set[str]] = {t: set(seq) for t, seq in self.name_sequences.items()}
+        self.column_tokens: Dict[str, Dict[str, Set[str]]] = {
+            t: {c["name"]: set(tokens(c["name"].replace("_", " "))) for c in snapshot.get(t).columns}
+            for t in self.tables
+        }
+        document_frequency: Dict[str, int] = {}
+        for t in self.tables:
+            vocabulary = self.name_tokens[t].union(*self.column_tokens[t].values())
+            for token in vocabulary:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        n = max(1, len(self.tables))
+        self.idf = {token: math.log(1 + n / df) for token, df in document_frequency.items()}
+
+        self.edges: Dict[str, List[Tuple[str, str]]] = {t: [] for t in self.tables}  # table -> [(other, join)]
+        for t in self.tables:
+            for fk in snapshot.get(t).foreign_keys:
+                ref = fk["ref_table"]
+                if ref in self.edges and ref != t:
+                    join = f"{t}.{fk['column']} = {ref}.{fk['ref_column'] or 'id'}"
+                    self.edges[t].append((ref, join))
+                    self.edges[ref].append((t, join))
+
+        self._samples: Dict[Tuple[str, str], Optional[List[str]]] = {}
+        self._samples_lock = threading.Lock()
+        self._fingerprints: Dict[Tuple[str, ...], Tuple[str, int]] = {}
+
+    # ----------------------------------------------------------- scoring
+    def expand(self, question: str) -> List[str]:
+        """Question tokens plus the definitions of glossary terms it mentions"""
+        words = question_tokens(question)
+        expanded = list(words)
+        text = " " + " ".join(words) + " "
+        for term, definition in self.glossary.items():
+            if f" {term} " in text:
+                expanded.extend(token for token in definition if token not in STOPWORDS)
+        return expanded
+
+    def _phrases(self, words: List[str], scope: List[str]) -> Dict[str, Set[int]]:
+        """Multi-word table names spelled out in the question ("purchase orders") -> token positions"""
+        phrases = {}
+        for t in scope:
+            sequence = self.name_sequences[t]
+            if len(sequence) < 2:
+                continue
+            for start in range(len(words) - len(sequence) + 1):
+                if words[start:start + len(sequence)] == sequence:
+                    phrases.setdefault(t, set()).update(range(start, start + len(sequence)))
+        return phrases
+
+    def score_tables(self, words: List[str], scope: List[str]) -> Tuple[Dict[str, float], Set[str]]:
+        """
+        Name matches weigh by the share of the table name they cover (so
+        "customer" prefers customers over customer_kv); tokens that belong
+        to a spelled-out multi-word name count only for that table.
+
+        Returns:
+            (score per matching table, tables the question names in full)
+        """
+        phrases = self._phrases(words, scope)
+        consumed = set().union(*phrases.values()) if phrases else set()
+        scores, named = {}, set()
+        for t in scope:
+            own = phrases.get(t, set())
+            usable = {token for i, token in enumerate(words) if i not in consumed or i in own}
+            score = 0.0
+            name_hits = usable & self.name_tokens[t]
+            if name_hits == self.name_tokens[t]:
+                named.add(t)
+            for token in name_hits:
+                score += NAME_WEIGHT * self.idf.get(token, 0.0) * len(name_hits) / len(self.name_tokens[t])
+            for token in usable - name_hits:
+                if any(token in column for column in self.column_tokens[t].values()):
+                    score += COLUMN_WEIGHT * self.idf.get(token, 0.0)
+            for token in usable:
+                if t in CONCEPT_TABLES.get(token, ()):
+                    score += CONCEPT_WEIGHT
+            if score:
+                scores[t] = round(score, 3)
+        return scores, named
+
+    def score_columns(self, table: str, question_tokens: List[str]) -> Dict[str, float]:
+        wanted = set(question_tokens)
+        return {column: sum(self.idf.get(token, 0.0) for token in column_tokens & wanted)
+                for column, column_tokens in self.column_tokens[table].items()}
+
+    # -------------------------------------------------------------- joins
+    def _path(self, start: str, goal: str, allowed: Set[str]) -> Optional[List[Tuple[str, str]]]:
+        """Shortest FK path as [(table, join)] from start to goal, within MAX_JOIN_HOPS"""
+        queue = deque([(start, [])])
+        seen = {start}
+        while queue:
+            table, path = queue.popleft()
+            if table == goal:
+                return path
+            if len(path) >= MAX_JOIN_HOPS:
+                continue
+            for other, join in self.edges.get(table, ()):
+                if other in allowed and other not in seen:
+                    seen.add(other)
+                    queue.append((other, path + [(other, join)]))
+        return None
+
+    def connect(self, selected: List[str], scope: List[str]) -> Tuple[List[str], List[str]]:
+        """Selected tables plus FK bridge tables, and the join conditions between them"""
+        tables = list(selected)
+        allowed = set(scope)
+        for table in selected[1:]:
+            path = self._path(selected[0], table, allowed)
+            for bridge, _ in path or ():
+                if bridge not in tables:
+                    tables.append(bridge)
+        chosen = set(tables)
+        joins = sorted({join for t in tables for other, join in self.edges.get(t, ()) if other in chosen})
+        return tables, joins
+
+    # ----------------------------------------------------- sample values
+    def sample_values(self, table: str, column: str) -> Optional[List[str]]:
+        """
+        Distinct values of a low-cardinality text column (cached per schema
+        version). DISTINCT ... LIMIT only stops early when the column has
+        more values than the limit, so it reads a bounded prefix instead.
+        """
+        key = (table, column)
+        if key in self._samples:
+            return self._samples[key]
+        values = None
+        try:
+            with get_read_db(self.db_path) as conn:
+                rows = conn.execute(
+                    f'SELECT DISTINCT "{column}" FROM '
+                    f'(SELECT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL LIMIT ?) LIMIT ?',
+                    (SCHEMA_LINK_SAMPLE_ROWS, SCHEMA_LINK_SAMPLE_VALUES + 1),
+                ).fetchall()
+            if 0 < len(rows) <= SCHEMA_LINK_SAMPLE_VALUES:
+                values = sorted(str(row[0]) for row in rows)
+        except sqlite3.Error:
+            pass
+        with self._samples_lock:
+            self._samples[key] = values
+        return values
+
+    # ------------------------------------------------------------- render
+    def describe(self, table: str, question_tokens: Optional[List[str]] = None) -> str:
+        info = self.snapshot.get(table)
+        columns = info.columns
+        if question_tokens is not None and len(columns) > SCHEMA_LINK_MAX_COLUMNS:
+            # Wide table: keys and the columns the question mentions first
+            fk_columns = {fk["column"] for fk in info.foreign_keys}
+            scores = self.score_columns(table, question_tokens)
+            ranked = sorted(columns, key=lambda c: (not c["pk"] and c["name"] not in fk_columns,
+                                                    -scores.get(c["name"], 0.0)))
+            keep = {c["name"] for c in ranked[:SCHEMA_LINK_MAX_COLUMNS]}
+            columns = [c for c in columns if c["name"] in keep]
+        lines = [f"Table: {table}"]
+        for column in columns:
+            line = f"  - {column['name']} ({column['type']})"
+            if question_tokens is not None and "TEXT" in (column["type"] or "").upper() \
+                    and _CATEGORICAL.search(column["name"].lower()):
+                values = self.sample_values(table, column["name"])
+                if values:
+                    line += " values: " + ", ".join(f"'{v}'" for v in values)
+            lines.append(line)
+        return "\n".join(lines)
+
+    def fingerprint(self, scope: List[str]) -> Tuple[str, int]:
+        """(hash, estimated tokens) of the full description of ``scope``"""
+        key = tuple(scope)
+        if key not in self._fingerprints:
+            text = "\n".join(self.snapshot.get(t).describe() for t in scope)
+            self._fingerprints[key] = (hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], estimate_tokens(text))
+        return self._fingerprints[key]
+
+    def link(self, question: str, context: Optional[str] = None, scope: Optional[Iterable[str]] = None,
+             max_tables: int = SCHEMA_LINK_MAX_TABLES) -> LinkedSchema:
+        scope = [t for t in (scope if scope is not None else self.tables) if t in self.name_tokens]
+        fingerprint, full_tokens = self.fingerprint(scope)
+        words = self.expand(f"{question} {context or ''}")
+        scores, named = self.score_tables(words, scope) if SCHEMA_LINK_ENABLED else ({}, set())
+        if not scores:
+            text = "\n".join(self.snapshot.get(t).describe() for t in scope)
+            return LinkedSchema(scope, [], text, fingerprint, estimate_tokens(text), full_tokens, fallback=True)
+
+        best = max(scores.values())
+        ranked = sorted(scores, key=lambda t: (-scores[t], t))
+        selected = [t for t in ranked if t in named or scores[t] >= best * RELATIVE_CUTOFF][:max_tables]
+        tables, joins = self.connect(selected, scope)
+        text = "\n".join(self.describe(t, words) for t in tables)
+        if joins:
+            text += "\nJoins:\n" + "\n".join(f"  - {join}" for join in joins)
+        return LinkedSchema(tables, joins, text, fingerprint, estimate_tokens(text), full_tokens,
+                            {t: scores.get(t, 0.0) for t in tables})
+
+
+def _load_glossary(db_path: Optional[str], snapshot: SchemaSnapshot) -> Dict[str, List[str]]:
+    """Glossary term (as tokens joined by spaces) -> definition tokens"""
+    if snapshot.get("glossary") is None:
+        return {}
+    try:
+        with get_read_db(db_path) as conn:
+            rows = conn.execute("SELECT term, definition FROM glossary").fetchall()
+    except sqlite3.Error:
+        return {}
+    return {" ".join(tokens(term)): tokens(definition) for term, definition in rows if term and definition}
+
+
+class SchemaLinker:
+    """SchemaLinkIndex per database, rebuilt when the schema_version changes"""
+
+    def __init__(self):
+        self._indexes: Dict[str, SchemaLinkIndex] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def index(self, db_path: Optional[str] = None) -> SchemaLinkIndex:
+        snapshot = get_schema_catalog(db_path).snapshot()
+        key = os.path.abspath(str(db_path or DB_PATH))
+        index = self._indexes.get(key)
+        if index is None or index.snapshot.schema_version != snapshot.schema_version:
+            index = SchemaLinkIndex(snapshot, db_path, _load_glossary(db_path, snapshot))
+            with self._lock:
+                self._indexes[key] = index
+        return index
+
+    def record_prompt(self, tool: str, prompt: str, linked: LinkedSchema):
+        prompt_tokens = estimate_tokens(prompt)
+        with self._lock:
+            stats = self._stats.setdefault(tool, {"prompts": 0, "fallbacks": 0, "prompt_tokens": 0,
+                                                  "schema_tokens": 0, "full_schema_tokens": 0, "tables": 0})
+            stats["prompts"] += 1
+            stats["fallbacks"] += linked.fallback
+            stats["prompt_tokens"] += prompt_tokens
+            stats["schema_tokens"] += linked.tokens
+            stats["full_schema_tokens"] += linked.full_tokens
+            stats["tables"] += len(linked.tables)
+            stats["last_prompt_tokens"] = prompt_tokens
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for tool, stats in self._stats.items():
+                prompts = stats["prompts"] or 1
+                result[tool] = {
+                    "prompts": stats["prompts"],
+                    "fallbacks": stats["fallbacks"],
+                    "last_prompt_tokens": stats.get("last_prompt_tokens"),
+                    "avg_prompt_tokens": round(stats["prompt_tokens"] / prompts, 1),
+                    "avg_schema_tokens": round(stats["schema_tokens"] / prompts, 1),
+                    "avg_full_schema_tokens": round(stats["full_schema_tokens"] / prompts, 1),
+                    "avg_tables": round(stats["tables"] / prompts, 2),
+                    "schema_token_savings": round(1 - stats["schema_tokens"] / stats["full_schema_tokens"], 4)
+                    if stats["full_schema_tokens"] else 0.0,
+                }
+            return {"enabled": SCHEMA_LINK_ENABLED, "tools": result}
+
+
+schema_linker = SchemaLinker()
+
+
+def link_schema(question: str, context: Optional[str] = None, scope: Optional[Iterable[str]] = None,
+                db_path: Optional[str] = None) -> LinkedSchema:
+    """Relevant schema subset (with joins and sample values) for a question"""
+    return schema_linker.index(db_path).link(question, context, scope)
+
+
+def record_prompt(tool: str, prompt: str, linked: LinkedSchema):
+    """Count prompt and schema tokens for /metrics"""
+    schema_linker.record_prompt(tool, prompt, linked)
+
+
+def get_schema_linker_stats() -> Dict[str, Dict]:
+    return schema_linker.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the schema subset linked to a question")
+    parser.add_argument("question")
+    parser.add_argument("--context", default=None)
+    args = parser.parse_args()
+
+    linked = link_schema(args.question, args.context)
+    print(linked.text)
+    print(f"\n🔗 {len(linked.tables)} tables, ~{linked.tokens} tokens (full schema ~{linked.full_tokens})"
+          f"{' [fallback]' if linked.fallback else ''}")
+    if linked.scores:
+        print("   scores: " + ", ".join(f"{t}={s}" for t, s in linked.scores.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+CRM Full-Text Search
+
+FTS5 external-content indexes over customers (name, email, phone), leads
+(name, email, message) and tickets (subject, body). The indexes store only
+tokens; rows are read from the base tables through ``content_rowid``, and
+AFTER INSERT/UPDATE/DELETE triggers keep them in sync, so a search is an
+index lookup instead of a ``LIKE '%term%'`` scan.
+
+Search terms are tokenized and every token is matched as a prefix
+(``"acm"*``), all tokens must match, and results are ordered by bm25 with
+per-column weights (names outrank message bodies). When nothing matches
+(typically a misspelled name), customer and lead names are looked up in
+the trigram index from ``fuzzy_index`` instead.
+
+Usage:
+    results = search("sara fathy", entities=("customers",), limit=5)
+
+    python search_index.py rebuild   # repopulate every index from its table
+    python search_index.py check     # FTS5 integrity-check against the tables
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+from db import DB_PATH, get_db, get_read_db
+from query_executor import execute_sql
+from fuzzy_index import FUZZY_SOURCES, get_fuzzy_index
+
+SEARCH_MAX_TOKENS = 8
+SEARCH_DEFAULT_LIMIT = 10
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_SEARCH_COMMAND = re.compile(
+    r"^\s*(?:please\s+)?(?:find|search|look\s*up|lookup)(?:\s+for)?(?:\s+(?:a|the))?(?:\s+(?:customers?|leads?|tickets?))?\b[\s:]*",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class SearchEntity:
+    """One indexed table"""
+    name: str                    # entity name used by callers ("customers")
+    result_type: str             # "customer", "lead", "ticket"
+    table: str
+    columns: Tuple[str, ...]     # indexed columns, in FTS column order
+    weights: Tuple[float, ...]   # bm25 weight per indexed column
+    fields: Tuple[str, ...]      # base-table columns returned with each hit
+    snippet_column: int          # FTS column used for the snippet
+
+    @property
+    def fts_table(self) -> str:
+        return f"{self.table}_fts"
+
+
+SEARCH_ENTITIES: Dict[str, SearchEntity] = {
+    "customers": SearchEntity(
+        "customers", "customer", "customers",
+        columns=("name", "email", "phone"), weights=(10.0, 5.0, 2.0),
+        fields=("id", "name", "email", "phone", "created_at"), snippet_column=0,
+    ),
+    "leads": SearchEntity(
+        "leads", "lead", "leads",
+        columns=("customer_name", "contact_email", "message"), weights=(10.0, 5.0, 1.0),
+        fields=("id", "customer_name", "contact_email", "message", "status", "score", "created_at"), snippet_column=2,
+    ),
+    "tickets": SearchEntity(
+        "tickets", "ticket", "tickets",
+        columns=("subject", "body"), weights=(5.0, 1.0),
+        fields=("id", "customer_id", "subject", "status", "created_at"), snippet_column=1,
+    ),
+}
+
+_installed: Dict[str, bool] = {}
+_install_lock = threading.Lock()
+
+
+def _ddl(entity: SearchEntity) -> str:
+    fts, table = entity.fts_table, entity.table
+    cols = ", ".join(entity.columns)
+    new_vals = ", ".join(f"new.{c}" for c in entity.columns)
+    old_vals = ", ".join(f"old.{c}" for c in entity.columns)
+    return f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+        {cols}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals});
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_update AFTER UPDATE OF {cols} ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals});
+    END;
+    """
+
+
+def insert_catchup_sql(entity: SearchEntity) -> str:
+    """Set-based equivalent of the insert trigger for rows with id > ? (bulk ingest)"""
+    cols = ", ".join(entity.columns)
+    return f"INSERT INTO {entity.fts_table}(rowid, {cols}) SELECT id, {cols} FROM {entity.table} WHERE id > ?"
+
+
+def _existing_tables(conn) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+
+
+def ensure_search_index(db_path: Optional[str] = None) -> bool:
+    """
+    Create missing FTS indexes and their sync triggers, populating new
+    indexes from the base tables. Cheap after the first call per database.
+
+    Returns:
+        False when SQLite was built without FTS5 (search then falls back to LIKE)
+    """
+    path = os.path.abspath(str(db_path or DB_PATH))
+    if path in _installed:
+        return _installed[path]
+    with _install_lock:
+        if path in _installed:
+            return _installed[path]
+        available = True
+        try:
+            with get_db(db_path, tables=None) as conn:
+                existing = _existing_tables(conn)
+                for entity in SEARCH_ENTITIES.values():
+                    if entity.table not in existing:
+                        continue
+                    created = entity.fts_table not in existing
+                    conn.executescript(_ddl(entity))
+                    if created:
+                        conn.execute(f"INSERT INTO {entity.fts_table}({entity.fts_table}) VALUES ('rebuild')")
+                        conn.commit()
+                        print(f"🔎 Built full-text index {entity.fts_table}")
+        except sqlite3.OperationalError as e:
+            available = False
+            print(f"⚠️ Full-text search unavailable, using LIKE fallback: {e}")
+        _installed[path] = available
+        return available
+
+
+def strip_search_command(text: str) -> str:
+    """'find customer acme corp' -> 'acme corp'"""
+    return _SEARCH_COMMAND.sub("", text or "", count=1).strip()
+
+
+def match_expression(term: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for free text: every token as a quoted prefix,
+    all required. None when the term has no searchable tokens.
+    """
+    tokens = _TOKEN.findall(term or "")[:SEARCH_MAX_TOKENS]
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _search_entity(entity: SearchEntity, expression: str, limit: int, db_path: Optional[str]) -> List[Dict]:
+    fts = entity.fts_table
+    fields = ", ".join(f"t.{f}" for f in entity.fields)
+    weights = ", ".join(str(w) for w in entity.weights)
+    rows = execute_sql(f"""
+        SELECT {fields},
+               bm25({fts}, {weights}) AS rank,
+               snippet({fts}, {entity.snippet_column}, '[', ']', '…', 12) AS snippet
+        FROM {fts}
+        JOIN {entity.table} t ON t.id = {fts}.rowid
+        WHERE {fts} MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (expression, limit), db_path=db_path, cache=True)
+    return [{"type": entity.result_type, **row} for row in rows]
+
+
+def _like_entity(entity: SearchEntity, term: str, limit: int, db_path: Optional[str]) -> List[Dict]:
+    """Unranked fallback for SQLite builds without FTS5"""
+    fields = ", ".join(entity.fields)
+    where = " OR ".join(f"{c} LIKE ?" for c in entity.columns)
+    rows = execute_sql(
+        f"SELECT {fields} FROM {entity.table} WHERE {where} LIMIT ?",
+        tuple(f"%{term}%" for _ in entity.columns) + (limit,),
+        db_path=db_path,
+    )
+    return [{"type": entity.result_type, **row, "rank": 0.0, "snippet": None} for row in rows]
+
+
+def _fuzzy_entities(term: str, entities: Sequence[str], limit: int, db_path: Optional[str]) -> List[Dict]:
+    """Trigram name matches, returned in the same shape as FTS hits"""
+    fuzzy = [e for e in entities if e in FUZZY_SOURCES]
+    if not fuzzy:
+        return []
+    matches = get_fuzzy_index(db_path).lookup(term, fuzzy, k=limit)
+    results = []
+    for name in fuzzy:
+        entity = SEARCH_ENTITIES[name]
+        similarity = {m["id"]: m["similarity"] for m in matches if m["entity"] == name}
+        if not similarity:
+            continue
+        placeholders = ", ".join("?" for _ in similarity)
+        rows = execute_sql(
+            f"SELECT {', '.join(entity.fields)} FROM {entity.table} WHERE id IN ({placeholders})",
+            list(similarity), db_path=db_path,
+        )
+        results.extend(
+            {"type": entity.result_type, **row, "rank": -similarity[row["id"]],
+             "similarity": similarity[row["id"]], "snippet": None, "match": "fuzzy"}
+            for row in rows
+        )
+    return results
+
+
+def search(term: str, entities: Sequence[str] = ("customers", "leads", "tickets"),
+           limit: int = SEARCH_DEFAULT_LIMIT, db_path: Optional[str] = None, fuzzy: bool = True) -> List[Dict]:
+    """
+    Ranked full-text search across CRM entities.
+
+    Args:
+        term: free text; each word is matched as a prefix
+        entities: any of "customers", "leads", "tickets"
+        limit: maximum number of hits overall
+        fuzzy: when nothing matches, fall back to trigram name similarity
+            for customers and leads
+
+    Returns:
+        Hits ordered by bm25 (lower is better), each with ``type``, ``rank``,
+        ``snippet`` and the entity's fields; fuzzy hits also carry
+        ``similarity`` and ``match: "fuzzy"``
+
+    Raises:
+        ValueError: for an unknown entity name
+    """
+    unknown = [e for e in entities if e not in SEARCH_ENTITIES]
+    if unknown:
+        raise ValueError(f"Unknown search entities {unknown}, expected any of {list(SEARCH_ENTITIES)}")
+    expression = match_expression(term)
+    if expression is None:
+        return []
+
+    use_fts = ensure_search_index(db_path)
+    results: List[Dict] = []
+    for name in entities:
+        entity = SEARCH_ENTITIES[name]
+        if use_fts:
+            results.extend(_search_entity(entity, expression, limit, db_path))
+        else:
+            results.extend(_like_entity(entity, term.strip(), limit, db_path))
+    if not results and fuzzy:
+        results = _fuzzy_entities(term, entities, limit, db_path)
+    results.sort(key=lambda hit: hit["rank"])
+    return results[:limit]
+
+
+def rebuild(db_path: Optional[str] = None):
+    """Repopulate every FTS index from its base table"""
+    if not ensure_search_index(db_path):
+        raise RuntimeError("SQLite was built without FTS5")
+    with get_db(db_path, tables={e.fts_table for e in SEARCH_ENTITIES.values()}) as conn:
+        existing = _existing_tables(conn)
+        for entity in SEARCH_ENTITIES.values():
+            if entity.fts_table in existing:
+                conn.execute(f"INSERT INTO {entity.fts_table}({entity.fts_table}) VALUES ('rebuild')")
+                print(f"✅ Rebuilt {entity.fts_table}")
+        conn.commit()
+
+
+def check(db_path: Optional[str] = None) -> Dict[str, str]:
+    """FTS5 integrity-check of each index against its content table ("ok" or the error)"""
+    results = {}
+    with get_read_db(db_path) as conn:
+        existing = _existing_tables(conn)
+    # integrity-check is issued as an INSERT, so it needs the writer lane (nothing is written)
+    with get_db(db_path, tables=set()) as conn:
+        for entity in SEARCH_ENTITIES.values():
+            if entity.fts_table not in existing:
+                results[entity.fts_table] = "missing"
+                continue
+            try:
+                conn.execute(
+                    f"INSERT INTO {entity.fts_table}({entity.fts_table}, rank) VALUES ('integrity-check', 1)"
+                )
+                results[entity.fts_table] = "ok"
+            except sqlite3.DatabaseError as e:
+                results[entity.fts_table] = str(e)
+        conn.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the CRM full-text search indexes")
+    parser.add_argument("command", choices=["install", "rebuild", "check"])
+    parser.add_argument("--db", default=None, help="database file (defaults to DB_PATH)")
+    args = parser.parse_args()
+
+    if args.command == "install":
+        sys.exit(0 if ensure_search_index(args.db) else 1)
+    if args.command == "rebuild":
+        rebuild(args.db)
+        return
+
+    results = check(args.db)
+    for table, status in results.items():
+        print(f"{'✅' if status == 'ok' else '❌'} {table}: {status}")
+    sys.exit(0 if all(status == "ok" for status in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Semantic Matching for the NL-to-SQL Cache
+
+Lets ``nl_sql_cache`` answer paraphrases ("top 5 customers by revenue" /
+"who are our five biggest customers by sales") that miss the exact-match key.
+
+Questions are embedded offline with a signed hashing vectorizer over
+normalized content tokens (number words to digits, light stemming, domain
+synonyms such as biggest/largest -> top) plus unordered token pairs.
+Candidates for a question come from a cosine search over the cached
+questions of the same tool, schema and context: one matrix-vector product
+with NumPy, a sparse dot product per entry without it.
+
+A candidate above SEMANTIC_CACHE_THRESHOLD is reused only when:
+- its content tokens equal the question's, apart from SOFT_TERMS that
+  people leave implicit ("total", "all"), so numbers, measures, columns,
+  time ranges and names can never differ, and
+- ``EXPLAIN`` of its SQL compiles against the current schema.
+
+Indexes are built from the cache table on first use and rebuilt when the
+cache's version counter moves (a store, purge or expiry in this process).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db import get_read_db
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") != "0"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.7"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "1024"))
+SEMANTIC_CACHE_CANDIDATES = 5
+PAIR_WEIGHT = 0.5
+
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+    "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12", "fifteen": "15",
+    "twenty": "20", "fifty": "50", "hundred": "100", "dozen": "12", "single": "1",
+}
+
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "by", "with", "from", "and", "or", "is", "are",
+    "was", "were", "be", "been", "do", "does", "did", "what", "which", "who", "whom", "whose", "how",
+    "show", "list", "display", "give", "get", "find", "tell", "me", "us", "our", "we", "my", "i", "you",
+    "your", "please", "can", "could", "would", "will", "there", "that", "these", "those", "it",
+    "its", "their", "them", "they", "have", "has", "had", "some", "any", "about", "as", "into", "so",
+    "just", "now", "then", "see", "want", "need", "know", "let", "up", "ha",
+    "per", "each", "every",
+}
+
+# Stemmed word -> canonical term; synonyms map onto one hashed feature
+SYNONYMS = {
+    "biggest": "top", "largest": "top", "best": "top", "highest": "top", "leading": "top", "major": "top",
+    "most": "top", "greatest": "top", "maximum": "top", "max": "top",
+    "smallest": "bottom", "lowest": "bottom", "worst": "bottom", "least": "bottom", "fewest": "bottom",
+    "minimum": "bottom", "min": "bottom",
+    "client": "customer", "buyer": "customer", "account": "customer",
+    "sale": "revenue", "income": "revenue", "turnover": "revenue", "earning": "revenue",
+    "spend": "revenue", "spent": "revenue", "spending": "revenue",
+    "purchase": "order", "purchased": "order", "bought": "order", "ordered": "order", "placed": "order",
+    "number": "count", "many": "count",
+    "average": "avg", "mean": "avg",
+    "monthly": "month", "yearly": "year", "annual": "year", "weekly": "week", "daily": "day",
+    "sum": "total", "overall": "total",
+    "item": "product",
+    "prospect": "lead",
+    "money": "revenue",
+}
+
+# Terms a paraphrase may add or drop without changing the query. Measures
+# (revenue and its synonyms) are not soft: "revenue this year" and "this
+# year" ask for different things
+SOFT_TERMS = {"total", "all", "amount", "value", "data", "information", "info", "detail"}
+
+
+def _stem(word: str) -> str:
+    if len(word) <= 3 or word[0].isdigit():
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def content_tokens(question: str) -> List[str]:
+    """'Who are our five biggest customers?' -> ['5', 'top', 'customer']"""
+    tokens = []
+    for word in _WORD.findall((question or "").lower()):
+        word = NUMBER_WORDS.get(word, word)
+        if word in STOPWORDS:
+            continue
+        word = SYNONYMS.get(_stem(word), _stem(word))
+        tokens.append(word)
+    return tokens
+
+
+def _feature_index(feature: str, dim: int) -> Tuple[int, float]:
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % dim, 1.0 if (digest >> 31) & 1 else -1.0
+
+
+def embed(tokens: List[str], dim: int = SEMANTIC_CACHE_DIM) -> Dict[int, float]:
+    """Signed feature hashing of tokens and unordered adjacent pairs, L2-normalized (sparse)"""
+    vector: Dict[int, float] = {}
+    features = [(token, 1.0) for token in tokens]
+    features += [(" ".join(sorted(pair)), PAIR_WEIGHT) for pair in zip(tokens, tokens[1:])]
+    for feature, weight in features:
+        index, sign = _feature_index(feature, dim)
+        vector[index] = vector.get(index, 0.0) + sign * weight
+    norm = sum(v * v for v in vector.values()) ** 0.5
+    return {i: v / norm for i, v in vector.items()} if norm else {}
+
+
+def compatible(question_tokens: List[str], cached_tokens: List[str]) -> bool:
+    """Token sets equal apart from soft terms"""
+    return (set(question_tokens) ^ set(cached_tokens)) <= SOFT_TERMS
+
+
+class _PartitionIndex:
+    """Vectors of the cached questions for one (tool, schema, context)"""
+
+    def __init__(self, version: int, rows: List[Tuple[str, str, str]], dim: int):
+        self.version = version
+        self.keys = [row[0] for row in rows]
+        self.tokens = [content_tokens(row[1]) for row in rows]
+        self.sql = [row[2] for row in rows]
+        self.vectors = [embed(tokens, dim) for tokens in self.tokens]
+        self.matrix = None
+        if NUMPY_AVAILABLE and rows:
+            self.matrix = np.zeros((len(rows), dim), dtype=np.float32)
+            for row, vector in enumerate(self.vectors):
+                for index, value in vector.items():
+                    self.matrix[row, index] = value
+
+    def top(self, query: Dict[int, float], dim: int, k: int) -> List[Tuple[float, int]]:
+        """(cosine, row) of the k most similar entries, best first"""
+        if not self.keys or not query:
+            return []
+        if self.matrix is not None:
+            dense = np.zeros(dim, dtype=np.float32)
+            for index, value in query.items():
+                dense[index] = value
+            scores = self.matrix @ dense
+            k = min(k, len(scores))
+            best = np.argpartition(-scores, k - 1)[:k]
+            return sorted(((float(scores[i]), int(i)) for i in best), reverse=True)
+        scores = [(sum(value * vector.get(index, 0.0) for index, value in query.items()), row)
+                  for row, vector in enumerate(self.vectors)]
+        return sorted(scores, reverse=True)[:k]
+
+
+class SemanticIndex:
+    """Nearest-neighbour lookup over cached question/SQL pairs"""
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, dim: int = SEMANTIC_CACHE_DIM,
+                 enabled: bool = SEMANTIC_CACHE_ENABLED):
+        self.threshold = threshold
+        self.dim = dim
+        self.enabled = enabled
+        self._partitions: Dict[Tuple, _PartitionIndex] = {}
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "below_threshold": 0, "rejected_tokens": 0,
+                       "rejected_explain": 0, "rebuilds": 0}
+        self._similarity_sum = 0.0
+
+    def _partition(self, partition: Tuple, version: int,
+                   load_rows: Callable[[], List[Tuple[str, str, str]]]) -> _PartitionIndex:
+        index = self._partitions.get(partition)
+        if index is None or index.version != version:
+            index = _PartitionIndex(version, load_rows(), self.dim)
+            with self._lock:
+                self._partitions[partition] = index
+                self._stats["rebuilds"] += 1
+        return index
+
+    @staticmethod
+    def explains(sql: str, db_path: Optional[str] = None) -> bool:
+        """True when the statement compiles against the current schema"""
+        try:
+            with get_read_db(db_path) as conn:
+                conn.execute(f"EXPLAIN {sql}").fetchall()
+            return True
+        except (sqlite3.Error, sqlite3.Warning):
+            return False
+
+    def search(self, partition: Tuple, version: int, load_rows: Callable[[], List[Tuple[str, str, str]]],
+               question: str, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Best verified match for ``question``.
+
+        Args:
+            partition: entries are only compared within one partition
+            version: cache version; the partition index is rebuilt when it changes
+            load_rows: () -> [(cache_key, question, sql)] for the partition
+
+        Returns:
+            {"cache_key", "sql", "similarity", "question"} or None
+        """
+        if not self.enabled:
+            return None
+        index = self._partition(partition, version, load_rows)
+        tokens = content_tokens(question)
+        outcome = "below_threshold"
+        match = None
+        for similarity, row in index.top(embed(tokens, self.dim), self.dim, SEMANTIC_CACHE_CANDIDATES):
+            if similarity < self.threshold:
+                break
+            if not compatible(tokens, index.tokens[row]):
+                outcome = "rejected_tokens"
+                continue
+            if not self.explains(index.sql[row], db_path):
+                outcome = "rejected_explain"
+                continue
+            match = {"cache_key": index.keys[row], "sql": index.sql[row], "similarity": round(similarity, 4),
+                     "question": " ".join(index.tokens[row])}
+            break
+        with self._lock:
+            self._stats["lookups"] += 1
+            if match:
+                self._stats["hits"] += 1
+                self._similarity_sum += match["similarity"]
+            else:
+                self._stats[outcome] += 1
+        return match
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "dim": self.dim,
+                "numpy": NUMPY_AVAILABLE,
+                "partitions": len(self._partitions),
+                "indexed": sum(len(p.keys) for p in self._partitions.values()),
+                "hit_rate": round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0,
+                "avg_hit_similarity": round(self._similarity_sum / stats["hits"], 4) if stats["hits"] else None,
+                **stats,
+            }
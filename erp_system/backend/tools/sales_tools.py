@@ -35,7 +35,12 @@ from datetime import datetime
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from db import get_db
+from db import get_read_db
+from customer_stats import ensure_customer_stats
+from fuzzy_index import ensure_fuzzy_index
+from pagination import DEFAULT_PAGE_SIZE, ensure_pagination_indexes, keyset_page
+from search_index import SEARCH_ENTITIES, ensure_search_index, search, strip_search_command
+from query_executor import execute_sql, execute_write, QueryBudgetExceeded
 from mcp.mcp_adapter import mcp_registry
 
 class SalesTools:
@@ -57,13 +62,17 @@ class SalesTools:
         self.conversation_buffer = []  # Simple conversation memory for context
         self.entity_memory = {}  # Customer-specific memory and insights
         self.max_buffer_size = 5  # Limit buffer size for memory efficiency
+        ensure_customer_stats()  # Listings read order totals from the rollup
+        ensure_pagination_indexes()  # (created_at, id) indexes for keyset pages
+        ensure_search_index()  # FTS5 indexes behind customer/lead/ticket search
+        ensure_fuzzy_index()  # name-change triggers behind incremental trigram refreshes
         self._register_tools()  # Register all tools with MCP
         
     def _register_tools(self):
         """Register all sales tools with MCP"""
         mcp_registry.register_tool(
             'sales_sql_read',
-            self.sales_sql_read,
+            lambda query: self.sales_sql_read(query, budget="sales_agent"),  # SQL from the LLM: budgeted
             'Execute read-only SQL queries for sales data',
             {'query': 'SQL query string'}
         )
@@ -82,6 +91,13 @@ class SalesTools:
             {'query': 'Search query string'}
         )
         
+        mcp_registry.register_tool(
+            'crm_search',
+            self.search_crm,
+            'Ranked full-text search over customers, leads and support tickets',
+            {'term': 'Search text', 'entities': 'Optional list: customers, leads, tickets', 'limit': 'Max results'}
+        )
+        
         mcp_registry.register_tool(
             'score_leads',
             self.score_leads,
@@ -153,18 +169,15 @@ class SalesTools:
         return self.score_leads()
     
     # SQL Tools
-    def sales_sql_read(self, query: str) -> List[Dict]:
-        """Execute read-only SQL query on the sales database"""
+    def sales_sql_read(self, query: str, budget: Optional[str] = None) -> List[Dict]:
+        """Execute read-only SQL query on the sales database (pass a budget for LLM/ad hoc SQL)"""
         if not query.strip().upper().startswith("SELECT"):
             return [{"error": "Only SELECT queries are allowed for read operations"}]
         
         try:
-            with get_db() as conn:
-                conn.row_factory = sqlite3.Row  # returns dict-like rows
-                cursor = conn.cursor()
-                cursor.execute(query)
-                results = [dict(row) for row in cursor.fetchall()]
-                return results
+            return execute_sql(query, read_only=True, budget=budget, cache=True)
+        except QueryBudgetExceeded as e:
+            return [e.to_dict()]
         except Exception as e:
             return [{"error": str(e)}]
     
@@ -174,46 +187,66 @@ class SalesTools:
             return {"error": "Use sales_sql_read for SELECT queries"}
         
         try:
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query)
-                conn.commit()
-                return {"success": True, "rows_affected": cursor.rowcount}
+            result = execute_write(query)
+            return {"success": True, "rows_affected": result["rows_affected"]}
         except Exception as e:
             return {"error": str(e)}
     
+    # Full-text search (FTS5 + bm25, see search_index.py)
+    def search_crm(self, term: str, entities: Optional[List[str]] = None, limit: int = 10) -> List[Dict]:
+        """Ranked prefix search over customers, leads and tickets (fuzzy name fallback)"""
+        return search(term, entities or list(SEARCH_ENTITIES), limit=limit)
+    
+    # Paginated listings (keyset on created_at, id; see pagination.py)
+    def list_customers_page(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """One page of customers, newest first, with order totals from the rollup"""
+        return keyset_page("""
+            SELECT c.id, c.name, c.email, c.phone, c.created_at,
+                   COALESCE(s.order_count, 0) as order_count,
+                   COALESCE(s.total_spent, 0) as total_spent
+            FROM customers c
+            LEFT JOIN customer_stats s ON s.customer_id = c.id
+        """, "c", limit, cursor)
+    
+    def list_leads_page(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """One page of leads, newest first"""
+        return keyset_page("""
+            SELECT l.id, l.customer_name, l.contact_email, l.message, l.score, l.status, l.created_at
+            FROM leads l
+        """, "l", limit, cursor)
+    
+    def list_orders_page(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """One page of orders, newest first, with the customer's name and email"""
+        return keyset_page("""
+            SELECT o.id, o.customer_id, o.total, o.status, o.created_at,
+                   c.name as customer_name, c.email as customer_email
+            FROM orders o
+            LEFT JOIN customers c ON o.customer_id = c.id
+        """, "o", limit, cursor)
+    
     # Customer Management
     def _customer_summary(self) -> str:
         """Get summary statistics about customers"""
         try:
-            with get_db() as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                # Get total customer count
-                cursor.execute("SELECT COUNT(*) as count FROM customers")
-                result = cursor.fetchone()
-                total_count = result['count'] if result else 0
-                
-                # Get new customers this month
-                cursor.execute("""
-                    SELECT COUNT(*) as count FROM customers
-                    WHERE created_at >= date('now', 'start of month')
-                """)
-                result = cursor.fetchone()
-                new_count = result['count'] if result else 0
-                
-                # Get top customers by revenue
-                cursor.execute("""
-                    SELECT c.name, COUNT(o.id) as order_count, 
-                           COALESCE(SUM(o.total), 0) as total_spent
-                    FROM customers c
-                    JOIN orders o ON c.id = o.customer_id
-                    GROUP BY c.id, c.name
-                    ORDER BY total_spent DESC
-                    LIMIT 3
-                """)
-                top_customers = [dict(row) for row in cursor.fetchall()]
+            # Dashboard queries: served from the result cache until customers/orders change
+            result = execute_sql("SELECT COUNT(*) as count FROM customers", cache=True)
+            total_count = result[0]['count'] if result else 0
+            
+            # Get new customers this month
+            result = execute_sql("""
+                SELECT COUNT(*) as count FROM customers
+                WHERE created_at >= date('now', 'start of month')
+            """, cache=True)
+            new_count = result[0]['count'] if result else 0
+            
+            # Get top customers by revenue
+            top_customers = execute_sql("""
+                SELECT c.name, s.order_count, s.total_spent
+                FROM customer_stats s
+                JOIN customers c ON c.id = s.customer_id
+                ORDER BY s.total_spent DESC
+                LIMIT 3
+            """, cache=True)
             
             result = "📊 **Customer Summary:**\n\n"
             result += f"Total Customers: {total_count}\n"
@@ -232,16 +265,15 @@ class SalesTools:
     def _list_customers(self) -> str:
         """List recent customers with basic info"""
         try:
-            with get_db() as conn:
+            with get_read_db() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT c.name, c.email, c.phone, c.created_at,
-                           COUNT(o.id) as order_count,
-                           COALESCE(SUM(o.total), 0) as total_spent
+                           COALESCE(s.order_count, 0) as order_count,
+                           COALESCE(s.total_spent, 0) as total_spent
                     FROM customers c
-                    LEFT JOIN orders o ON c.id = o.customer_id
-                    GROUP BY c.id
+                    LEFT JOIN customer_stats s ON s.customer_id = c.id
                     ORDER BY c.created_at DESC
                     LIMIT 10
                 """)
@@ -265,38 +297,39 @@ class SalesTools:
     def _search_customers(self, query: str) -> str:
         """Search for customers by name or email"""
         # Extract search term if format is "find customer X"
-        search_term = query.lower()
-        if "find customer" in search_term:
-            search_term = search_term.replace("find customer", "").strip()
-        elif "search customer" in search_term:
-            search_term = search_term.replace("search customer", "").strip()
+        search_term = strip_search_command(query)
         
         if len(search_term) < 2:
             return "Please provide a search term of at least 2 characters"
             
         try:
-            with get_db() as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT c.name, c.email, c.phone, c.created_at,
-                           COUNT(o.id) as order_count,
-                           COALESCE(SUM(o.total), 0) as total_spent
-                    FROM customers c
-                    LEFT JOIN orders o ON c.id = o.customer_id
-                    WHERE c.name LIKE ? OR c.email LIKE ?
-                    GROUP BY c.id
-                    ORDER BY c.name
-                    LIMIT 5
-                """, (f"%{search_term}%", f"%{search_term}%"))
-                customers = [dict(row) for row in cursor.fetchall()]
+            customers = self.search_crm(search_term, ["customers"], limit=5)
+            if customers:
+                placeholders = ", ".join("?" for _ in customers)
+                stats = {
+                    row["customer_id"]: row
+                    for row in execute_sql(
+                        f"SELECT customer_id, order_count, total_spent FROM customer_stats WHERE customer_id IN ({placeholders})",
+                        [c["id"] for c in customers],
+                    )
+                }
+                for customer in customers:
+                    row = stats.get(customer["id"], {})
+                    customer["order_count"] = row.get("order_count", 0)
+                    customer["total_spent"] = row.get("total_spent", 0)
             
             if not customers:
                 return f"No customers found matching '{search_term}'."
             
-            result = f"🔍 **Search Results for '{search_term}':**\n\n"
+            if customers[0].get("match") == "fuzzy":
+                result = f"🔍 **No exact match for '{search_term}'. Closest customers:**\n\n"
+            else:
+                result = f"🔍 **Search Results for '{search_term}':**\n\n"
             for customer in customers:
-                result += f"• **{customer['name']}** ({customer['email']})\n"
+                result += f"• **{customer['name']}** ({customer['email']})"
+                if customer.get("similarity") is not None:
+                    result += f" – {customer['similarity']:.0%} match"
+                result += "\n"
                 result += f"  📞 {customer.get('phone', 'N/A')}\n"
                 result += f"  📦 {customer['order_count']} orders | 💰 ${customer['total_spent']:.2f}\n"
                 result += f"  📅 Since: {customer.get('created_at', 'N/A')}\n\n"
@@ -320,7 +353,7 @@ class SalesTools:
     def _list_leads(self) -> str:
         """List recent leads with status"""
         try:
-            with get_db() as conn:
+            with get_read_db() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 cursor.execute("""
@@ -361,7 +394,7 @@ class SalesTools:
         """Score leads based on various factors"""
         try:
             # Get unscored leads
-            with get_db() as conn:
+            with get_read_db() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 cursor.execute("""
@@ -403,22 +436,19 @@ class SalesTools:
                 # Cap score between 1-10
                 score = max(1.0, min(10.0, score))
                 
-                # Update score in database
-                with get_db() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE leads
-                        SET score = ?
-                        WHERE id = ?
-                    """, (score, lead['id']))
-                    conn.commit()
-                
                 scored_leads.append({
                     'id': lead['id'],
                     'name': lead['customer_name'],
                     'score': score
                 })
             
+            # Update all scores in one write transaction on the writer lane
+            execute_write("""
+                UPDATE leads
+                SET score = ?
+                WHERE id = ?
+            """, [(lead['score'], lead['id']) for lead in scored_leads], many=True)
+            
             # Format response
             scored_leads.sort(key=lambda x: x['score'], reverse=True)
             
@@ -436,7 +466,7 @@ class SalesTools:
     def _list_recent_orders(self) -> str:
         """List recent orders with details"""
         try:
-            with get_db() as conn:
+            with get_read_db() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 cursor.execute("""
@@ -468,7 +498,7 @@ class SalesTools:
     def _list_tickets(self) -> str:
         """List support tickets"""
         try:
-            with get_db() as conn:
+            with get_read_db() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 cursor.execute("""
@@ -0,0 +1,238 @@
+"""
+End-to-end API benchmark
+
+Starts backend/api.py in-process (uvicorn on a background thread) against
+a generated database, with a deterministic LLM so numbers measure our code
+rather than a provider:
+
+- LLM_PROVIDER=mock      MockLLM (default)
+- LLM_PROVIDER=recorded  replay responses captured with LLM_PROVIDER=record
+                         (see config/llm.py; file from --recordings)
+
+Each scenario is driven by ``--concurrency`` client threads over keep-alive
+connections for ``--requests`` requests after ``--warmup`` sequential
+ones. The report has p50/p95/p99 latency, throughput, error counts and RSS
+(sampled per scenario plus the process peak) as JSON, by default in
+benchmarks/results/e2e_<commit>.json.
+
+Usage:
+  python benchmarks/e2e_api.py                               # 100k rows, all scenarios
+  python benchmarks/e2e_api.py --scale 1M --concurrency 16 --requests 500
+  python benchmarks/e2e_api.py --db databases/erp_load.db --scenarios customers,query
+  python benchmarks/e2e_api.py --compare benchmarks/results/e2e_abc1234.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+from harness import (BACKEND_DIR, DEFAULT_REGRESSION_THRESHOLD, RSSSampler, benchmark_database, compare,
+                     load_results, peak_rss_mb, print_comparison, run_metadata, summarize_ms, write_results)
+
+REQUEST_TIMEOUT = 120
+SERVER_START_TIMEOUT = 120
+
+# name -> (method, path, JSON body)
+SCENARIOS: Dict[str, Tuple[str, str, Optional[Dict]]] = {
+    "chat_router": ("POST", "/chat", {"message": "Show me our customers", "agent": "router"}),
+    "chat_sales": ("POST", "/chat", {"message": "Give me a customer summary", "agent": "sales"}),
+    "chat_analytics": ("POST", "/chat", {"message": "What is revenue by order status?", "agent": "analytics"}),
+    "query": ("POST", "/query", {
+        "query": "SELECT c.id, c.name, COUNT(o.id) AS orders, SUM(o.total) AS revenue "
+                 "FROM customers c JOIN orders o ON o.customer_id = c.id "
+                 "GROUP BY c.id ORDER BY revenue DESC LIMIT 20",
+    }),
+    "customers": ("GET", "/customers?limit=20", None),
+    "leads_score": ("POST", "/leads/score", None),
+    "database_stats": ("GET", "/database/stats", None),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int):
+    """Import the app (after DB_PATH/LLM_PROVIDER are set) and serve it on a daemon thread"""
+    import uvicorn
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    import api
+
+    config = uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("API server did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def send(conn: http.client.HTTPConnection, method: str, path: str, body: Optional[Dict]) -> int:
+    payload = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"} if payload is not None else {}
+    conn.request(method, path, body=payload, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def run_scenario(port: int, name: str, requests: int, concurrency: int, warmup: int) -> Dict:
+    method, path, body = SCENARIOS[name]
+
+    warm = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT)
+    for _ in range(warmup):
+        send(warm, method, path, body)
+    warm.close()
+
+    tickets = count()
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT)
+        samples = []
+        while next(tickets) < requests:
+            start = time.perf_counter()
+            try:
+                status = send(conn, method, path, body)
+            except (OSError, http.client.HTTPException) as e:
+                status = type(e).__name__
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT)
+            samples.append((time.perf_counter() - start, status))
+        conn.close()
+        return samples
+
+    with RSSSampler() as rss:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"bench-{name}") as pool:
+            futures = [pool.submit(worker) for _ in range(concurrency)]
+            samples = [sample for future in futures for sample in future.result()]
+        wall = time.perf_counter() - start
+
+    statuses = Counter(str(status) for _, status in samples)
+    ok = [elapsed for elapsed, status in samples if isinstance(status, int) and status < 400]
+    return {
+        "method": method,
+        "path": path,
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "status_codes": dict(statuses),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else None,
+        "latency_ms": summarize_ms(ok),
+        "peak_rss_mb": rss.peak_mb,
+    }
+
+
+def flatten(scenarios: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Scenario results as flat metric dicts for harness.compare"""
+    return {
+        name: {"p50_ms": r["latency_ms"]["p50"], "p95_ms": r["latency_ms"]["p95"],
+               "p99_ms": r["latency_ms"]["p99"], "throughput_rps": r["throughput_rps"],
+               "peak_rss_mb": r["peak_rss_mb"]}
+        for name, r in scenarios.items()
+    }
+
+
+COMPARED_METRICS = {"p50_ms": "lower", "p95_ms": "lower", "p99_ms": "lower", "throughput_rps": "higher",
+                    "peak_rss_mb": "lower"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency/throughput benchmark of the ERP API")
+    parser.add_argument("--scale", default="100k", help="generated database size in rows, e.g. 10k, 100k, 1M (default 100k)")
+    parser.add_argument("--seed", type=int, default=42, help="generator seed (default 42)")
+    parser.add_argument("--db", type=Path, default=None, help="benchmark a copy of this database instead of a generated one")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads per scenario (default 8)")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario (default 200)")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario (default 5)")
+    parser.add_argument("--llm", choices=["mock", "recorded"], default="mock", help="deterministic LLM provider (default mock)")
+    parser.add_argument("--recordings", default=None, help="recordings file for --llm recorded")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated LLM latency per call (default 0)")
+    parser.add_argument("--out", default=None, help="results file ('-' for stdout; default benchmarks/results/e2e_<commit>.json)")
+    parser.add_argument("--keep-db", action="store_true", help="keep the per-run database copy")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="relative change counted as a regression (default 0.15)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from generate_erp_data import parse_scale
+    scale = parse_scale(args.scale)
+    db_path = benchmark_database(scale, args.seed, source=args.db)
+
+    # Read by db.py and config/llm.py at import time, so set before the app is imported
+    os.environ["DB_PATH"] = str(db_path)
+    os.environ["LLM_PROVIDER"] = args.llm
+    os.environ["LLM_MOCK_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ.pop("GOOGLE_API_KEY", None)
+    if args.recordings:
+        os.environ["LLM_RECORDINGS"] = str(Path(args.recordings).resolve())
+
+    port = free_port()
+    print(f"🚀 Starting API on 127.0.0.1:{port} against {db_path} (LLM_PROVIDER={args.llm})")
+    server, thread = start_server(port)
+
+    results = {
+        "meta": run_metadata(db_path, scale=scale, seed=args.seed, concurrency=args.concurrency,
+                             requests=args.requests, warmup=args.warmup, llm_provider=args.llm,
+                             llm_latency_ms=args.llm_latency_ms),
+        "scenarios": {},
+    }
+    try:
+        for name in scenarios:
+            result = run_scenario(port, name, args.requests, args.concurrency, args.warmup)
+            results["scenarios"][name] = result
+            latency = result["latency_ms"]
+            print(f"✅ {name:<16} p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+                  f"{result['throughput_rps']} req/s  errors {result['errors']}  rss {result['peak_rss_mb']} MB")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        if not args.keep_db:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    regressions = []
+    if args.compare:
+        baseline = load_results(args.compare)
+        rows = compare(flatten(results["scenarios"]), flatten(baseline.get("scenarios", {})),
+                       COMPARED_METRICS, args.threshold)
+        results["comparison"] = {"baseline": args.compare, "baseline_commit": baseline.get("meta", {}).get("commit"),
+                                 "threshold": args.threshold, "rows": rows}
+        print_comparison(rows)
+        regressions = [row for row in rows if row["regression"]]
+
+    write_results(results, args.out, "e2e")
+    if regressions:
+        print(f"❌ {len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
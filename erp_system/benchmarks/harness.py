@@ -0,0 +1,213 @@
+"""
+Shared helpers for the benchmark scripts: latency summaries, RSS
+sampling, run metadata, benchmark databases and result comparison.
+
+Results are plain JSON so runs from different commits can be diffed with
+``--compare`` or any external tool.
+"""
+
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+BENCH_DIR = Path(__file__).parent
+ROOT = BENCH_DIR.parent
+BACKEND_DIR = ROOT / "backend"
+DATA_DIR = BENCH_DIR / ".data"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# Relative change in a lower-is-better / higher-is-better metric that counts as a regression
+DEFAULT_REGRESSION_THRESHOLD = 0.15
+
+COUNTED_TABLES = ("customers", "orders", "order_items", "invoices", "payments", "ledger_lines", "leads", "tickets")
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> Optional[float]:
+    """Linear-interpolated percentile (0..100) of an ascending sequence"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize_ms(seconds: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/mean/min/max in milliseconds"""
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "min": None, "max": None}
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(sum(values) / len(values), 3),
+        "min": round(values[0], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process (falls back to the peak where /proc is missing)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process since start"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RSSSampler:
+    """Context manager recording the highest RSS seen while it is active"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = round(max(self.peak_mb, current_rss_mb()), 1)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_metadata(db_path: Optional[Path] = None, **settings) -> Dict:
+    """Commit, interpreter, SQLite and database facts that make results comparable"""
+    meta = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+    }
+    if db_path is not None:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            meta["database"] = {
+                "path": str(db_path),
+                "size_mb": round(db_path.stat().st_size / 1e6, 1),
+                "rows": {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                         for table in COUNTED_TABLES},
+            }
+        finally:
+            conn.close()
+    return meta
+
+
+def benchmark_database(scale: int, seed: int = 42, source: Optional[Path] = None, workdir: Optional[Path] = None) -> Path:
+    """
+    Fresh copy of a benchmark database, so writes from one run never leak
+    into the next.
+
+    Generated databases are cached in benchmarks/.data per (scale, seed);
+    ``source`` uses an existing database instead.
+    """
+    if source is None:
+        source = DATA_DIR / f"erp_{scale}_{seed}.db"
+        if not source.exists():
+            sys.path.insert(0, str(ROOT))
+            from generate_erp_data import generate
+            generate(source, scale, seed=seed)
+    workdir = workdir or DATA_DIR / "runs"
+    workdir.mkdir(parents=True, exist_ok=True)
+    target = workdir / f"{source.stem}_{os.getpid()}.db"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{target}{suffix}").unlink(missing_ok=True)
+    shutil.copy2(source, target)
+    return target
+
+
+def write_results(results: Dict, out: Optional[str], prefix: str) -> Optional[Path]:
+    """Write results JSON; ``out`` of '-' prints to stdout, None picks results/<prefix>_<commit>.json"""
+    text = json.dumps(results, indent=2)
+    if out == "-":
+        print(text)
+        return None
+    path = Path(out) if out else RESULTS_DIR / f"{prefix}_{results['meta'].get('commit') or 'nogit'}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text + "\n")
+    print(f"💾 Results written to {path}")
+    return path
+
+
+def compare(current: Dict[str, Dict], baseline: Dict[str, Dict], metrics: Dict[str, str],
+            threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> List[Dict]:
+    """
+    Compare per-case metrics with a baseline run.
+
+    Args:
+        current, baseline: case name -> flat dict of metric values
+        metrics: metric name -> "lower" or "higher" (which direction is better)
+
+    Returns:
+        One dict per (case, metric) present in both runs, with ``change``
+        (relative) and ``regression`` set when it moved the wrong way by
+        more than ``threshold``
+    """
+    rows = []
+    for case in sorted(set(current) & set(baseline)):
+        for metric, better in metrics.items():
+            new, old = current[case].get(metric), baseline[case].get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if better == "lower" else change < -threshold
+            rows.append({"case": case, "metric": metric, "baseline": old, "current": new,
+                         "change": round(change, 4), "regression": worse})
+    return rows
+
+
+def print_comparison(rows: List[Dict]):
+    if not rows:
+        print("⚠️ Nothing in common with the baseline to compare")
+        return
+    print(f"{'case':<28} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>9}")
+    for row in rows:
+        flag = "  ❌" if row["regression"] else ""
+        print(f"{row['case']:<28} {row['metric']:<16} {row['baseline']:>12,.3f} {row['current']:>12,.3f} "
+              f"{row['change']:>+8.1%}{flag}")
+
+
+def load_results(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
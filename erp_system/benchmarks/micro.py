@@ -0,0 +1,348 @@
+"""
+Micro benchmarks for Sales and memory hot paths across database sizes
+
+Times individual functions against generated databases from 1k to 1M rows
+and fits how each one scales: the slope of log(time) over log(rows) is ~0
+for constant-time work, ~1 for linear work, and anything above
+1 + --tolerance is flagged as super-linear. The slope between the two
+largest sizes is checked too, since growth often only shows at the top end.
+
+Each database size runs in its own subprocess, so module-level state
+(pools, caches, DB_PATH read at import) never leaks between sizes. The
+result cache is disabled unless --cache is given, so repeated calls
+measure the query and not a cache hit.
+
+Cases:
+- SalesTools.score_leads / _customer_summary / _list_customers / _search_customers
+- RouterGlobalState.add_message (the request-path cost; the write-behind
+  flush runs after timing) / get_conversation_history
+- SalesEntityMemory.set_customer_info
+
+Usage:
+  python benchmarks/micro.py                                  # 1k, 10k, 100k, 1M
+  python benchmarks/micro.py --sizes 10k,100k --cases SalesTools._list_customers
+  python benchmarks/micro.py --plot benchmarks/results/micro.png --fail-on-superlinear
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+from harness import (BACKEND_DIR, COUNTED_TABLES, DEFAULT_REGRESSION_THRESHOLD, ROOT, benchmark_database, compare,
+                     load_results, print_comparison, run_metadata, summarize_ms, write_results)
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+DEFAULT_SIZES = "1k,10k,100k,1M"
+SUPERLINEAR_TOLERANCE = 0.15
+SEARCH_TERMS = ["nile trading", "ahmed", "globx", "sara fathy", "delta group"]
+HISTORY_SEED_MESSAGES = 50
+
+
+# ---------------------------------------------------------------- cases
+class Case(NamedTuple):
+    setup: Callable            # () -> context, once per database size
+    call: Callable             # (context, i) -> None, the timed call
+    teardown: Optional[Callable] = None
+
+
+def _sales_tools():
+    from tools.sales_tools import SalesTools
+    return SalesTools()
+
+
+def _router_state():
+    from memory.base_memory import RouterGlobalState
+    state = RouterGlobalState(os.environ["DB_PATH"])
+    conversation_id = state.get_or_create_conversation(session_id="micro-benchmark")
+    for i in range(HISTORY_SEED_MESSAGES):
+        state.add_message(conversation_id, "human" if i % 2 == 0 else "ai", f"seed message {i}")
+    state.flush()
+    return state, conversation_id
+
+
+def _add_message(ctx, i):
+    state, conversation_id = ctx
+    state.add_message(conversation_id, "human", f"benchmark message {i}")
+
+
+def _flush_router_state(ctx):
+    ctx[0].flush()  # leave no write-behind work for interpreter exit
+
+
+def _history(ctx, i):
+    state, conversation_id = ctx
+    state.get_conversation_history(conversation_id, limit=10)
+
+
+def _entity_memory():
+    from memory.base_memory import SalesEntityMemory
+    from query_executor import execute_sql
+    customers = execute_sql("SELECT COUNT(*) FROM customers", row_format="tuple")[0][0]
+    return SalesEntityMemory(os.environ["DB_PATH"]), max(1, customers)
+
+
+def _set_customer_info(ctx, i):
+    memory, customers = ctx
+    memory.set_customer_info(1 + (i * 7919) % customers, "last_interaction", f"benchmark {i}")
+
+
+CASES: Dict[str, Case] = {
+    "SalesTools.score_leads": Case(_sales_tools, lambda tools, i: tools.score_leads()),
+    "SalesTools._customer_summary": Case(_sales_tools, lambda tools, i: tools._customer_summary()),
+    "SalesTools._list_customers": Case(_sales_tools, lambda tools, i: tools._list_customers()),
+    "SalesTools._search_customers": Case(
+        _sales_tools, lambda tools, i: tools._search_customers(SEARCH_TERMS[i % len(SEARCH_TERMS)])),
+    "RouterGlobalState.add_message": Case(_router_state, _add_message, _flush_router_state),
+    "RouterGlobalState.get_conversation_history": Case(_router_state, _history, _flush_router_state),
+    "SalesEntityMemory.set_customer_info": Case(_entity_memory, _set_customer_info),
+}
+
+
+def measure(case: Case, repeat: int, max_seconds: float, warmup: int) -> Dict:
+    """Per-call timings after ``warmup`` calls; stops early once ``max_seconds`` is spent"""
+    ctx = case.setup()
+    for i in range(warmup):
+        case.call(ctx, i)
+    timings = []
+    deadline = time.perf_counter() + max_seconds
+    for i in range(warmup, warmup + repeat):
+        start = time.perf_counter()
+        case.call(ctx, i)
+        timings.append(time.perf_counter() - start)
+        if len(timings) >= 3 and time.perf_counter() > deadline:
+            break
+    if case.teardown:
+        case.teardown(ctx)
+    return {"calls": len(timings), **{f"{k}_ms": v for k, v in summarize_ms(timings).items()}}
+
+
+def run_worker(args):
+    """Child process: time the requested cases against DB_PATH and write JSON to --worker-out"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    results = {}
+    for name in args.cases.split(","):
+        try:
+            results[name] = measure(CASES[name], args.repeat, args.max_seconds, args.warmup)
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e}"}
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+    Path(args.worker_out).write_text(json.dumps(results))
+
+
+def run_size(db_path: Path, cases: List[str], args) -> Dict:
+    env = dict(os.environ, DB_PATH=str(db_path), RESULT_CACHE_ENABLED="1" if args.cache else "0")
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        out = Path(f.name)
+    try:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", "--worker-out", str(out), "--cases", ",".join(cases),
+             "--repeat", str(args.repeat), "--max-seconds", str(args.max_seconds), "--warmup", str(args.warmup)],
+            env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"benchmark worker failed:\n{proc.stdout[-2000:]}\n{proc.stderr[-2000:]}")
+        return json.loads(out.read_text())
+    finally:
+        out.unlink(missing_ok=True)
+
+
+# ------------------------------------------------------------- analysis
+def loglog_slope(points: List[Tuple[float, float]]) -> Optional[float]:
+    """Least-squares slope of log(seconds) against log(rows)"""
+    points = [(x, y) for x, y in points if x and y]
+    if len(points) < 2:
+        return None
+    xs = [math.log(x) for x, _ in points]
+    ys = [math.log(y) for _, y in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    if not var:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var
+
+
+def classify(slope: Optional[float], tolerance: float) -> str:
+    if slope is None:
+        return "n/a"
+    if slope < 0.25:
+        return "flat"
+    if slope < 0.85:
+        return "sub-linear"
+    if slope <= 1 + tolerance:
+        return "linear"
+    return "super-linear"
+
+
+def analyze(sizes: List[Dict], cases: List[str], tolerance: float) -> Dict[str, Dict]:
+    """Per case: median per size, overall and top-end slopes, super-linear flag"""
+    analysis = {}
+    for name in cases:
+        points = [(size["rows"], (size["cases"].get(name) or {}).get("p50_ms")) for size in sizes]
+        measured = [(rows, ms) for rows, ms in points if ms]
+        slope = loglog_slope(measured)
+        top_slope = loglog_slope(measured[-2:]) if len(measured) >= 2 else None
+        skipped = next((size["cases"][name].get("skipped") or size["cases"][name].get("error")
+                        for size in sizes if name in size["cases"] and not size["cases"][name].get("p50_ms")), None)
+        scaling = classify(slope, tolerance)
+        if scaling != "super-linear" and classify(top_slope, tolerance) == "super-linear":
+            scaling = "super-linear at top end"
+        analysis[name] = {
+            "median_ms_by_rows": {str(rows): ms for rows, ms in points},
+            "slope": round(slope, 3) if slope is not None else None,
+            "top_slope": round(top_slope, 3) if top_slope is not None else None,
+            "scaling": scaling,
+            "super_linear": scaling.startswith("super-linear"),
+            **({"note": skipped} if skipped else {}),
+        }
+    return analysis
+
+
+def print_report(sizes: List[Dict], analysis: Dict[str, Dict]):
+    header = "".join(f"{size['label']:>12}" for size in sizes)
+    print(f"\n{'case':<45}{header}  {'slope':>6}  {'top':>6}  scaling")
+    for name, result in analysis.items():
+        cells = "".join(f"{ms:>12.3f}" if ms is not None else f"{'-':>12}"
+                        for ms in result["median_ms_by_rows"].values())
+        slope = f"{result['slope']:>6.2f}" if result["slope"] is not None else f"{'-':>6}"
+        top = f"{result['top_slope']:>6.2f}" if result["top_slope"] is not None else f"{'-':>6}"
+        flag = "  ⚠️" if result["super_linear"] else ""
+        print(f"{name:<45}{cells}  {slope}  {top}  {result['scaling']}{flag}")
+        if result.get("note"):
+            print(f"{'':<45}{result['note']}")
+    print("(median ms per call; slope = d log(time) / d log(rows), 1.0 = linear)")
+
+
+def plot(sizes: List[Dict], analysis: Dict[str, Dict], path: str):
+    """Log-log plot of median time per case against database rows"""
+    if not MATPLOTLIB_AVAILABLE:
+        print("⚠️ matplotlib not installed, skipping plot (pip install matplotlib)")
+        return
+    fig, ax = plt.subplots(figsize=(10, 6))
+    all_rows = [size["rows"] for size in sizes]
+    for name, result in analysis.items():
+        points = [(int(rows), ms) for rows, ms in result["median_ms_by_rows"].items() if ms]
+        if len(points) < 2:
+            continue
+        style = "-o" if not result["super_linear"] else "-x"
+        ax.plot([p[0] for p in points], [p[1] for p in points], style,
+                label=f"{name} (slope {result['slope']:.2f})")
+    # Linear reference anchored at 1 ms for the smallest database
+    if len(all_rows) >= 2:
+        ax.plot([all_rows[0], all_rows[-1]], [1, all_rows[-1] / all_rows[0]], "k--", alpha=0.3, label="linear")
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("database rows")
+    ax.set_ylabel("median ms per call")
+    ax.set_title("Hot path scaling")
+    ax.legend(fontsize=7)
+    ax.grid(True, which="both", alpha=0.2)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, dpi=120, bbox_inches="tight")
+    print(f"📈 Plot written to {path}")
+
+
+def flatten(analysis: Dict[str, Dict]) -> Dict[str, Dict]:
+    """case@rows -> {"p50_ms": ...} for harness.compare"""
+    return {
+        f"{name}@{rows}": {"p50_ms": ms}
+        for name, result in analysis.items()
+        for rows, ms in result["median_ms_by_rows"].items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-function benchmarks across database sizes")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"generated database sizes (default {DEFAULT_SIZES})")
+    parser.add_argument("--seed", type=int, default=42, help="generator seed (default 42)")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=50, help="max timed calls per case and size (default 50)")
+    parser.add_argument("--max-seconds", type=float, default=10, help="time budget per case and size (default 10)")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed calls first (default 2)")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--tolerance", type=float, default=SUPERLINEAR_TOLERANCE,
+                        help="slope above 1 + tolerance is super-linear (default 0.15)")
+    parser.add_argument("--plot", default=None, help="write a log-log PNG (needs matplotlib)")
+    parser.add_argument("--out", default=None, help="results file ('-' for stdout; default benchmarks/results/micro_<commit>.json)")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="relative change counted as a regression (default 0.15)")
+    parser.add_argument("--fail-on-superlinear", action="store_true", help="exit 1 when any case is super-linear")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    cases = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    sys.path.insert(0, str(ROOT))
+    from generate_erp_data import parse_scale
+
+    sizes = []
+    for label in args.sizes.split(","):
+        scale = parse_scale(label)
+        db_path = benchmark_database(scale, args.seed)
+        try:
+            conn = sqlite3.connect(str(db_path))
+            rows = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in COUNTED_TABLES)
+            conn.close()
+            print(f"⏱️ {label}: {rows:,} rows in core tables")
+            sizes.append({"label": label.strip(), "scale": scale, "rows": rows,
+                          "cases": run_size(db_path, cases, args)})
+        finally:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    analysis = analyze(sizes, cases, args.tolerance)
+    print_report(sizes, analysis)
+
+    results = {
+        "meta": run_metadata(sizes=args.sizes, seed=args.seed, repeat=args.repeat, max_seconds=args.max_seconds,
+                             cache=args.cache, tolerance=args.tolerance),
+        "sizes": sizes,
+        "analysis": analysis,
+    }
+    if args.plot:
+        plot(sizes, analysis, args.plot)
+
+    regressions = []
+    if args.compare:
+        baseline = load_results(args.compare)
+        rows = compare(flatten(analysis), flatten(baseline.get("analysis", {})), {"p50_ms": "lower"}, args.threshold)
+        results["comparison"] = {"baseline": args.compare, "baseline_commit": baseline.get("meta", {}).get("commit"),
+                                 "threshold": args.threshold, "rows": rows}
+        print_comparison(rows)
+        regressions = [row for row in rows if row["regression"]]
+
+    write_results(results, args.out, "micro")
+    super_linear = [name for name, result in analysis.items() if result["super_linear"]]
+    if super_linear:
+        print(f"⚠️ Super-linear: {', '.join(super_linear)}")
+    if regressions or (args.fail_on_superlinear and super_linear):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
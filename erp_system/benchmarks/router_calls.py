@@ -0,0 +1,149 @@
+"""
+Router orchestration benchmark: LLM calls per request, nested vs flat
+
+Runs the same requests through ``create_simple_router_agent`` in both
+ROUTER_MODEs with a deterministic LLM and counts provider calls from the
+shared LLM client registry (config/llm.py):
+
+- nested: router ReAct step -> execute_with_*_agent -> sub-agent ReAct loop
+          (tool selection, tool, Final Answer) -> router Final Answer
+- flat:   router ReAct step -> tool function (return_direct), done
+
+Calls made inside tools (the NL-to-SQL prompt of sales_sql_query /
+text_to_sql) count in both modes. The NL-to-SQL cache, the intent fast
+path and the fan-out are off, so every request pays for its orchestration.
+
+Usage:
+  python benchmarks/router_calls.py
+  python benchmarks/router_calls.py --llm-latency-ms 400 --repeat 5
+  python benchmarks/router_calls.py --compare benchmarks/results/router_calls_abc1234.json
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent))
+from harness import (BACKEND_DIR, DEFAULT_REGRESSION_THRESHOLD, ROOT, benchmark_database, compare, load_results,
+                     print_comparison, run_metadata, summarize_ms, write_results)
+
+MODES = ("nested", "flat")
+MESSAGES = [
+    "How many orders has each customer placed?",
+    "Which leads came from referrals?",
+    "Show pending orders with their customer names",
+    "What is the total revenue by order status?",
+    "Average order value trend by month",
+    "Check system health",
+]
+COMPARED_METRICS = {"llm_calls_per_request": "lower", "p50_ms": "lower", "p95_ms": "lower"}
+
+
+def llm_calls() -> int:
+    """Provider calls so far, over every shared client"""
+    from config.llm import get_llm_client_stats
+    return sum(client["calls"] + client.get("errors", 0) for client in get_llm_client_stats())
+
+
+def run_mode(mode: str, messages: List[str], repeat: int) -> Dict:
+    from agents.simple_router_agent import create_simple_router_agent
+
+    executor = create_simple_router_agent(mode=mode, fast_path=False, fan_out=False)
+    per_message, timings, total_calls = {}, [], 0
+    for message in messages:
+        calls = []
+        for _ in range(repeat):
+            before = llm_calls()
+            start = time.perf_counter()
+            executor.invoke({"input": message})
+            timings.append(time.perf_counter() - start)
+            calls.append(llm_calls() - before)
+        per_message[message] = round(sum(calls) / len(calls), 2)
+        total_calls += sum(calls)
+    requests = len(messages) * repeat
+    return {
+        "requests": requests,
+        "llm_calls": total_calls,
+        "llm_calls_per_request": round(total_calls / requests, 3),
+        "latency_ms": summarize_ms(timings),
+        "llm_calls_by_message": per_message,
+    }
+
+
+def flatten(modes: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Mode results as flat metric dicts for harness.compare"""
+    return {
+        mode: {"llm_calls_per_request": r["llm_calls_per_request"], "p50_ms": r["latency_ms"]["p50"],
+               "p95_ms": r["latency_ms"]["p95"]}
+        for mode, r in modes.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count LLM calls per router request in nested and flat mode")
+    parser.add_argument("--scale", default="10k", help="generated database size in rows (default 10k)")
+    parser.add_argument("--seed", type=int, default=42, help="generator seed (default 42)")
+    parser.add_argument("--db", type=Path, default=None, help="benchmark a copy of this database instead of a generated one")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each message per mode (default 3)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated LLM latency per call (default 0)")
+    parser.add_argument("--out", default=None, help="results file ('-' for stdout; default benchmarks/results/router_calls_<commit>.json)")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="relative change counted as a regression (default 0.15)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    from generate_erp_data import parse_scale
+    scale = parse_scale(args.scale)
+    db_path = benchmark_database(scale, args.seed, source=args.db)
+
+    # Read at import time by db.py, config/llm.py, nl_sql_cache.py and intent_router.py
+    os.environ["DB_PATH"] = str(db_path)
+    os.environ["LLM_PROVIDER"] = "mock"
+    os.environ["LLM_MOCK_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["NL_SQL_CACHE_ENABLED"] = "0"
+    os.environ.pop("GOOGLE_API_KEY", None)
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    results = {
+        "meta": run_metadata(db_path, scale=scale, seed=args.seed, repeat=args.repeat,
+                             llm_latency_ms=args.llm_latency_ms, messages=MESSAGES),
+        "modes": {},
+    }
+    try:
+        for mode in MODES:
+            result = run_mode(mode, MESSAGES, args.repeat)
+            results["modes"][mode] = result
+            print(f"✅ {mode:<7} {result['llm_calls_per_request']:.2f} LLM calls/request  "
+                  f"p50 {result['latency_ms']['p50']} ms  p95 {result['latency_ms']['p95']} ms")
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    nested, flat = results["modes"]["nested"], results["modes"]["flat"]
+    if nested["llm_calls"]:
+        reduction = 1 - flat["llm_calls"] / nested["llm_calls"]
+        results["llm_call_reduction"] = round(reduction, 4)
+        print(f"📉 Flat mode makes {reduction:.0%} fewer LLM calls "
+              f"({nested['llm_calls_per_request']:.2f} -> {flat['llm_calls_per_request']:.2f} per request)")
+
+    regressions = []
+    if args.compare:
+        baseline = load_results(args.compare)
+        rows = compare(flatten(results["modes"]), flatten(baseline.get("modes", {})), COMPARED_METRICS, args.threshold)
+        results["comparison"] = {"baseline": args.compare, "baseline_commit": baseline.get("meta", {}).get("commit"),
+                                 "threshold": args.threshold, "rows": rows}
+        print_comparison(rows)
+        regressions = [row for row in rows if row["regression"]]
+
+    write_results(results, args.out, "router_calls")
+    if regressions:
+        print(f"❌ {len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,909 @@
+"""
+Generate a large, realistic ERP database for load and benchmark testing.
+
+Fills the full v2 schema described in databases/db.md (customers, orders,
+order_items, invoices, payments, ledger, purchasing, stock movements,
+leads, tickets, conversations, ...) at a selectable scale. The output is
+deterministic: the same --seed, --scale and --end produce the same rows.
+
+Data shape:
+- Activity grows over time (GROWTH_PER_YEAR) with Q4 peaks, quiet weekends
+  and business-hour timestamps; ids increase with created_at like a real
+  system.
+- Customers and products follow a power law: the oldest accounts and the
+  head of the catalog receive most orders (the top 20% of customers place
+  roughly 70% of the orders at the default --skew).
+- Documents follow the order lifecycle: invoices for confirmed orders,
+  payments that arrive after the invoice (some late, some never), double
+  entry ledger postings for both, stock movements for shipped items and
+  purchase receipts.
+
+Loading uses bulk pragmas (no journal, no fsync, exclusive lock, large page
+cache), chunked executemany and builds secondary indexes after the data.
+The result is switched back to WAL and gets the customer_stats rollup,
+pagination indexes and full-text search indexes the backend expects.
+
+Usage:
+  python generate_erp_data.py --scale 1M
+  python generate_erp_data.py --scale 10M --seed 7 --out databases/erp_10m.db
+
+Point the backend at the result with DB_PATH=databases/erp_load.db.
+"""
+
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import time
+from bisect import bisect_right
+from datetime import date, timedelta
+from itertools import islice
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+DEFAULT_OUT = ROOT / "databases" / "erp_load.db"
+
+SCALE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+# Generated rows per order across all tables; --scale is divided by this
+ROWS_PER_ORDER = 16
+
+# Volumes relative to the number of orders
+CUSTOMERS_PER_ORDER = 1 / 8
+LEADS_PER_ORDER = 1 / 5
+TICKETS_PER_ORDER = 1 / 10
+POS_PER_ORDER = 1 / 25
+CONVERSATIONS_PER_ORDER = 1 / 100
+
+GROWTH_PER_YEAR = 0.6
+# Relative activity by month (Jan..Dec) and weekday (Mon..Sun)
+MONTH_WEIGHTS = [0.85, 0.8, 0.95, 0.95, 1.0, 0.95, 0.9, 0.9, 1.0, 1.1, 1.3, 1.45]
+WEEKDAY_WEIGHTS = [1.1, 1.15, 1.15, 1.1, 1.0, 0.45, 0.35]
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 14, 18, 20, 20, 16, 18, 20, 19, 16, 12, 9, 7, 5, 3, 2, 1]
+
+BATCH_ORDERS = 20_000
+BATCH_ROWS = 50_000
+
+FIRST_NAMES = [
+    "Ahmed", "Mohamed", "Mahmoud", "Omar", "Youssef", "Ali", "Hassan", "Khaled", "Tarek", "Karim",
+    "Mostafa", "Amr", "Hany", "Sherif", "Walid", "Nader", "Sameh", "Ibrahim", "Hossam", "Adel",
+    "Sara", "Laila", "Fatma", "Mona", "Nour", "Huda", "Dina", "Rania", "Heba", "Yasmin",
+    "Salma", "Mariam", "Aya", "Nada", "Reem", "Amira", "Noha", "Ghada", "Eman", "Samar",
+]
+LAST_NAMES = [
+    "Nabil", "Fathy", "Samir", "Mahmoud", "Ibrahim", "Mostafa", "Hussein", "Ali", "Hassan", "Saleh",
+    "Gamal", "Farouk", "Kamel", "Said", "Zaki", "Ramadan", "Shawky", "Fouad", "Lotfy", "Anwar",
+    "Soliman", "Abdelaziz", "Hamdy", "Naguib", "Rashad", "Younis", "Badawi", "Sabry", "Helmy", "Mansour",
+]
+COMPANY_WORDS = [
+    "Nile", "Delta", "Pyramid", "Sphinx", "Lotus", "Oasis", "Horizon", "Falcon", "Crescent", "Sahara",
+    "Alexandria", "Luxor", "Aswan", "Sinai", "Red Sea", "Cairo", "Giza", "Memphis", "Karnak", "Phoenix",
+]
+COMPANY_SUFFIXES = ["Ltd", "Group", "Solutions", "Trading", "Co", "Industries", "Systems", "Holdings"]
+
+PRODUCT_CATEGORIES = [
+    "Module", "Tool", "Package", "Service", "Widget", "Sensor", "Cable", "Panel",
+    "Kit", "Adapter", "Controller", "License", "Bracket", "Valve", "Pump", "Filter",
+]
+PRODUCT_DESCRIPTIONS = ["Local product", "Imported product", "Refurbished", "Premium line", "Bulk pack"]
+
+LEAD_MESSAGES = [
+    "Hi, we are planning a bulk purchase next quarter. Could you share your best pricing?",
+    "Do you provide onsite training for our staff?",
+    "We need an ERP demo that focuses on inventory and sales integration.",
+    "Our company processes 1k invoices monthly. Can you automate reconciliation?",
+    "Looking to replace current supplier. Need quote for 400 units of SKU-0010.",
+    "Interested in long-term partnership for MENA region distribution.",
+    "We have a short lead time. Can you deliver within 2 weeks?",
+]
+TICKET_SUBJECTS = [
+    "Order delay", "Wrong invoice", "Refund request", "Bug report", "Need specs", "Login issue", "Integration help",
+]
+TICKET_SUBJECT_WEIGHTS = [30, 18, 14, 12, 12, 8, 6]
+TICKET_BODIES = [" - please assist.", " - follow-up needed.", " - urgent.", " - see previous email."]
+
+PAYMENT_METHODS = ["bank_transfer", "card", "cash"]
+PAYMENT_METHOD_WEIGHTS = [55, 35, 10]
+AGENT_TYPES = ["router", "sales", "finance", "inventory", "analytics"]
+CHAT_QUESTIONS = [
+    "Show me the top customers this month",
+    "How many orders are pending?",
+    "Which invoices are overdue?",
+    "Which products are below their reorder point?",
+    "What was revenue last quarter?",
+    "Create a lead for Nile Trading",
+]
+
+SCHEMA = """
+CREATE TABLE approvals (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  module TEXT,
+  payload_json TEXT,
+  status TEXT DEFAULT 'pending',
+  requested_by TEXT,
+  decided_by TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  decided_at DATETIME
+);
+CREATE TABLE tool_calls (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  agent TEXT,
+  tool_name TEXT,
+  input_json TEXT,
+  output_json TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  email TEXT UNIQUE,
+  role TEXT DEFAULT 'user',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE conversations (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER,
+  started_at DATETIME DEFAULT CURRENT_TIMESTAMP, session_id TEXT, agent_type TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(user_id) REFERENCES users(id)
+);
+CREATE TABLE messages (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  conversation_id INTEGER,
+  sender TEXT,
+  content TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP, role TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(conversation_id) REFERENCES conversations(id)
+);
+CREATE TABLE customers (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  email TEXT,
+  phone TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE customer_kv (
+  customer_id INTEGER,
+  key TEXT,
+  value TEXT,
+  PRIMARY KEY (customer_id, key),
+  FOREIGN KEY(customer_id) REFERENCES customers(id)
+);
+CREATE TABLE leads (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_name TEXT,
+  contact_email TEXT,
+  message TEXT,
+  score REAL,
+  status TEXT DEFAULT 'new',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE products (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  sku TEXT UNIQUE NOT NULL,
+  name TEXT NOT NULL,
+  price REAL NOT NULL,
+  description TEXT
+);
+CREATE TABLE orders (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id INTEGER NOT NULL,
+  total REAL NOT NULL,
+  status TEXT DEFAULT 'pending',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(customer_id) REFERENCES customers(id)
+);
+CREATE TABLE order_items (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  order_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  quantity INTEGER NOT NULL,
+  price REAL NOT NULL,
+  FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE,
+  FOREIGN KEY(product_id) REFERENCES products(id)
+);
+CREATE TABLE tickets (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id INTEGER,
+  subject TEXT,
+  body TEXT,
+  status TEXT DEFAULT 'open',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(customer_id) REFERENCES customers(id)
+);
+CREATE TABLE invoices (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id INTEGER,
+  invoice_number TEXT,
+  issue_date DATE,
+  due_date DATE,
+  total_amount REAL,
+  status TEXT DEFAULT 'unpaid',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(customer_id) REFERENCES customers(id)
+);
+CREATE TABLE invoice_lines (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  invoice_id INTEGER NOT NULL,
+  description TEXT,
+  quantity INTEGER,
+  unit_price REAL,
+  FOREIGN KEY(invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
+);
+CREATE TABLE invoice_orders (
+  invoice_id INTEGER,
+  order_id INTEGER,
+  PRIMARY KEY (invoice_id, order_id),
+  FOREIGN KEY(invoice_id) REFERENCES invoices(id),
+  FOREIGN KEY(order_id) REFERENCES orders(id)
+);
+CREATE TABLE payments (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id INTEGER,
+  amount REAL,
+  method TEXT,
+  received_at DATETIME,
+  FOREIGN KEY(customer_id) REFERENCES customers(id)
+);
+CREATE TABLE payment_allocations (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  payment_id INTEGER,
+  invoice_id INTEGER,
+  amount REAL,
+  FOREIGN KEY(payment_id) REFERENCES payments(id),
+  FOREIGN KEY(invoice_id) REFERENCES invoices(id)
+);
+CREATE TABLE chart_of_accounts (
+  account TEXT PRIMARY KEY,
+  description TEXT
+);
+CREATE TABLE ledger_entries (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  entry_date DATE NOT NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE ledger_lines (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  entry_id INTEGER NOT NULL,
+  account TEXT NOT NULL,
+  debit REAL DEFAULT 0,
+  credit REAL DEFAULT 0,
+  FOREIGN KEY(entry_id) REFERENCES ledger_entries(id) ON DELETE CASCADE,
+  FOREIGN KEY(account) REFERENCES chart_of_accounts(account)
+);
+CREATE TABLE suppliers (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  email TEXT,
+  phone TEXT
+);
+CREATE TABLE supplier_products (
+  supplier_id INTEGER,
+  product_id INTEGER,
+  lead_time_days INTEGER,
+  default_cost REAL,
+  PRIMARY KEY (supplier_id, product_id),
+  FOREIGN KEY(supplier_id) REFERENCES suppliers(id),
+  FOREIGN KEY(product_id) REFERENCES products(id)
+);
+CREATE TABLE purchase_orders (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  supplier_id INTEGER NOT NULL,
+  status TEXT DEFAULT 'draft',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(supplier_id) REFERENCES suppliers(id)
+);
+CREATE TABLE po_items (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  po_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  quantity INTEGER NOT NULL,
+  unit_cost REAL NOT NULL,
+  FOREIGN KEY(po_id) REFERENCES purchase_orders(id) ON DELETE CASCADE,
+  FOREIGN KEY(product_id) REFERENCES products(id)
+);
+CREATE TABLE po_receipts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  po_id INTEGER,
+  product_id INTEGER,
+  received_qty INTEGER,
+  received_at DATETIME,
+  FOREIGN KEY(po_id) REFERENCES purchase_orders(id),
+  FOREIGN KEY(product_id) REFERENCES products(id)
+);
+CREATE TABLE stock (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  product_id INTEGER NOT NULL,
+  qty_on_hand INTEGER NOT NULL DEFAULT 0,
+  reorder_point INTEGER NOT NULL DEFAULT 0,
+  FOREIGN KEY(product_id) REFERENCES products(id)
+);
+CREATE TABLE stock_movements (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  product_id INTEGER NOT NULL,
+  change_qty INTEGER NOT NULL,
+  reason TEXT,
+  ref_id INTEGER,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(product_id) REFERENCES products(id)
+);
+CREATE TABLE documents (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  module TEXT,
+  path TEXT,
+  tags TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE glossary (
+  term TEXT PRIMARY KEY,
+  definition TEXT,
+  module TEXT
+);
+CREATE TABLE model_registry (
+  name TEXT,
+  version TEXT,
+  path TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (name, version)
+);
+CREATE TABLE ml_features_cache (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  entity_type TEXT,
+  entity_id INTEGER,
+  feature_json TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE saved_reports (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  title TEXT NOT NULL,
+  sql TEXT NOT NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Same secondary indexes as databases/erp.db; created after the bulk load
+INDEXES = """
+CREATE INDEX idx_invoice_customer ON invoices(customer_id);
+CREATE INDEX idx_messages_conv ON messages(conversation_id);
+CREATE INDEX idx_movements_product ON stock_movements(product_id);
+CREATE INDEX idx_orders_customer ON orders(customer_id);
+CREATE INDEX idx_po_supplier ON purchase_orders(supplier_id);
+CREATE INDEX idx_stock_product ON stock(product_id);
+CREATE INDEX idx_tool_calls_agent ON tool_calls(agent);
+"""
+
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",  # 256 MB
+    "PRAGMA foreign_keys = OFF",
+]
+
+REFERENCE_ROWS = {
+    "users": [
+        (1, "Youssef Ibrahim", "user405@example.com", "user", "2023-02-15 15:52:00"),
+        (2, "Mohamed Fathy", "user97@example.com", "admin", "2023-03-06 23:20:43"),
+        (3, "Fatma Ali", "user932@example.com", "user", "2023-03-16 21:42:33"),
+        (4, "Ahmed Mahmoud", "user445@example.com", "admin", "2023-06-10 21:55:04"),
+        (5, "Mohamed Hussein", "user93@example.com", "admin", "2023-08-26 13:31:14"),
+    ],
+    "chart_of_accounts": [
+        ("Cash", "Cash account"),
+        ("Revenue", "Sales revenue"),
+        ("Accounts Receivable", "Customer balances"),
+        ("COGS", "Cost of Goods Sold"),
+    ],
+    "glossary": [
+        ("Revenue", "Income from sales", "finance"),
+        ("EOQ", "Economic order quantity formula", "inventory"),
+        ("Lead Score", "Probability a lead converts", "sales"),
+        ("AR", "Accounts Receivable balance", "finance"),
+    ],
+    "saved_reports": [
+        (1, "Monthly Revenue",
+         "SELECT strftime('%Y-%m', created_at) m, SUM(total) revenue FROM orders WHERE status!='cancelled' GROUP BY m ORDER BY m;",
+         "2023-07-25 17:02:57"),
+        (2, "Products Below ROP",
+         "SELECT p.sku,p.name,s.qty_on_hand,s.reorder_point FROM stock s JOIN products p ON p.id=s.product_id WHERE s.qty_on_hand < s.reorder_point;",
+         "2023-08-14 23:37:20"),
+        (3, "Trial Balance",
+         "SELECT account, SUM(debit) AS total_debit, SUM(credit) AS total_credit FROM ledger_lines GROUP BY account;",
+         "2023-11-24 07:21:37"),
+    ],
+}
+
+
+def parse_scale(value: str) -> int:
+    """'250k' -> 250000, '10M' -> 10000000, '5000' -> 5000"""
+    text = value.strip().lower().replace("_", "")
+    multiplier = SCALE_SUFFIXES.get(text[-1:], 1)
+    number = text[:-1] if multiplier != 1 else text
+    try:
+        rows = int(float(number) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid scale {value!r}, expected e.g. 10k, 250k, 1M or 10M")
+    if rows < 1_000:
+        raise argparse.ArgumentTypeError("scale must be at least 1k rows")
+    return rows
+
+
+class Clock:
+    """
+    Seconds since the first day of the window, formatted as SQLite
+    timestamps. Day strings are precomputed so formatting stays cheap
+    at millions of rows.
+    """
+
+    def __init__(self, start: date, days: int, overflow_days: int = 400):
+        self.start = start
+        self.days = days
+        self.end = days * 86400
+        self._day_strings = [(start + timedelta(d)).isoformat() for d in range(days + overflow_days)]
+
+    def day(self, seconds: int) -> str:
+        return self._day_strings[seconds // 86400]
+
+    def timestamp(self, seconds: int) -> str:
+        rest = seconds % 86400
+        return f"{self._day_strings[seconds // 86400]} {rest // 3600:02d}:{rest // 60 % 60:02d}:{rest % 60:02d}"
+
+    def day_weights(self, growth: float):
+        """Relative activity per day: exponential growth x seasonality x weekday"""
+        weights = []
+        for d in range(self.days):
+            day = self.start + timedelta(d)
+            weights.append(
+                math.exp(growth * d / 365.0) * MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()]
+            )
+        return weights
+
+    def timeline(self, rng: random.Random, count: int, growth: float = GROWTH_PER_YEAR):
+        """
+        Yield ``count`` ascending timestamps (seconds) spread over the window
+        by day_weights, within each day by HOUR_WEIGHTS.
+        """
+        weights = self.day_weights(growth)
+        total = sum(weights)
+        hours = range(24)
+        cumulative = 0.0
+        emitted = 0
+        for d, weight in enumerate(weights):
+            cumulative += weight
+            # Cumulative rounding hands out exactly ``count`` events
+            target = round(cumulative * count / total)
+            n = target - emitted
+            emitted = target
+            if n <= 0:
+                continue
+            base = d * 86400
+            offsets = sorted(h * 3600 + rng.randrange(3600) for h in rng.choices(hours, HOUR_WEIGHTS, k=n))
+            for offset in offsets:
+                yield base + offset
+
+
+def power_law_index(rng: random.Random, n: int, skew: float) -> int:
+    """
+    Index in [0, n) where low indexes are much more likely:
+    P(index < x * n) = x ** (1 / skew).
+    """
+    return min(int(n * rng.random() ** skew), n - 1)
+
+
+def company_name(rng: random.Random) -> str:
+    if rng.random() < 0.7:
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(COMPANY_SUFFIXES)}"
+    return f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+
+
+def phone(rng: random.Random) -> str:
+    return f"+201{rng.choice('0125')}{rng.randrange(10_000_000, 100_000_000)}"
+
+
+class ERPDataGenerator:
+    """Generates and bulk-loads every table for one target scale"""
+
+    def __init__(self, conn: sqlite3.Connection, scale: int, seed: int, end: date, years: float, skew: float):
+        self.conn = conn
+        self.rng = random.Random(seed)
+        self.skew = skew
+        days = max(30, int(years * 365))
+        self.clock = Clock(end - timedelta(days - 1), days)
+
+        self.n_orders = max(50, scale // ROWS_PER_ORDER)
+        self.n_customers = max(20, int(self.n_orders * CUSTOMERS_PER_ORDER))
+        self.n_products = min(50_000, max(50, self.n_orders // 200))
+        self.n_suppliers = max(5, self.n_products // 10)
+        self.n_leads = max(20, int(self.n_orders * LEADS_PER_ORDER))
+        self.n_tickets = max(20, int(self.n_orders * TICKETS_PER_ORDER))
+        self.n_pos = max(10, int(self.n_orders * POS_PER_ORDER))
+        self.n_conversations = max(5, int(self.n_orders * CONVERSATIONS_PER_ORDER))
+
+        self.counts = {}
+        self.customer_signup = []       # seconds, ascending by customer id
+        self.product_price = []         # index = product_id - 1
+        self.product_name = []
+        self.supplier_products = {}     # supplier_id -> [(product_id, cost, lead_time)]
+
+    # ------------------------------------------------------------------ io
+    def _insert(self, table: str, rows, columns: int):
+        """executemany in BATCH_ROWS chunks from any iterable of tuples"""
+        sql = f"INSERT INTO {table} VALUES ({', '.join('?' * columns)})"
+        rows = iter(rows)
+        while batch := list(islice(rows, BATCH_ROWS)):
+            self.conn.executemany(sql, batch)
+            self.counts[table] = self.counts.get(table, 0) + len(batch)
+
+    def _flush(self, buffers):
+        for (table, columns), rows in buffers.items():
+            if rows:
+                self._insert(table, rows, columns)
+                rows.clear()
+        self.conn.commit()
+
+    # ---------------------------------------------------------- master data
+    def reference_data(self):
+        for table, rows in REFERENCE_ROWS.items():
+            self._insert(table, rows, len(rows[0]))
+
+    def customers(self):
+        rng, clock = self.rng, self.clock
+
+        def rows():
+            for customer_id, at in enumerate(clock.timeline(rng, self.n_customers, growth=GROWTH_PER_YEAR * 0.7), 1):
+                # The first account exists from day one so every order has a customer to pick
+                at = 0 if customer_id == 1 else at
+                self.customer_signup.append(at)
+                first = rng.choice(FIRST_NAMES).lower()
+                yield (customer_id, company_name(rng), f"{first}{customer_id}@example.com", phone(rng),
+                       clock.timestamp(at))
+
+        self._insert("customers", rows(), 5)
+
+    def products(self):
+        rng = self.rng
+
+        def rows():
+            for product_id in range(1, self.n_products + 1):
+                name = f"{rng.choice(PRODUCT_CATEGORIES)} {chr(65 + rng.randrange(26))}{rng.randrange(1, 1000)}"
+                price = round(min(rng.lognormvariate(4.5, 0.9), 25_000), 2)
+                self.product_name.append(name)
+                self.product_price.append(price)
+                yield (product_id, f"SKU-{product_id:06d}", name, price, rng.choice(PRODUCT_DESCRIPTIONS))
+
+        self._insert("products", rows(), 5)
+
+    def suppliers(self):
+        rng = self.rng
+        self._insert("suppliers", (
+            (supplier_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} Supplies",
+             f"{rng.choice(FIRST_NAMES).lower()}{supplier_id}@example.com", phone(rng))
+            for supplier_id in range(1, self.n_suppliers + 1)
+        ), 4)
+
+        def links():
+            for product_id in range(1, self.n_products + 1):
+                suppliers = sorted({power_law_index(rng, self.n_suppliers, 1.5) + 1 for _ in range(rng.randint(1, 3))})
+                for supplier_id in suppliers:
+                    cost = round(self.product_price[product_id - 1] * rng.uniform(0.45, 0.75), 2)
+                    lead_time = rng.randint(3, 30)
+                    self.supplier_products.setdefault(supplier_id, []).append((product_id, cost, lead_time))
+                    yield (supplier_id, product_id, lead_time, cost)
+
+        self._insert("supplier_products", links(), 4)
+
+    def stock(self):
+        rng = self.rng
+        self._insert("stock", (
+            (product_id, product_id, rng.randint(0, 1000), rng.randint(10, 150))
+            for product_id in range(1, self.n_products + 1)
+        ), 4)
+
+    # ----------------------------------------------------------- sales flow
+    def orders(self):
+        """
+        Orders in created_at order with their items, invoice, payment,
+        ledger postings and stock movements, flushed every BATCH_ORDERS
+        """
+        rng, clock, skew = self.rng, self.clock, self.skew
+        end = clock.end
+        signup = self.customer_signup
+        prices, names = self.product_price, self.product_name
+        n_products = self.n_products
+
+        buffers = {
+            ("orders", 5): [], ("order_items", 5): [], ("invoices", 8): [], ("invoice_orders", 2): [],
+            ("invoice_lines", 5): [], ("payments", 5): [], ("payment_allocations", 4): [],
+            ("ledger_entries", 3): [], ("ledger_lines", 5): [], ("stock_movements", 6): [],
+        }
+        orders, items, invoices, invoice_orders, invoice_lines, payments, allocations, entries, lines, movements = (
+            buffers.values()
+        )
+        item_id = invoice_id = line_id = payment_id = entry_id = ledger_line_id = movement_id = 0
+
+        for order_id, at in enumerate(clock.timeline(rng, self.n_orders), 1):
+            # Only customers who signed up by now can order; the oldest order most
+            customer_id = power_law_index(rng, max(1, bisect_right(signup, at)), skew) + 1
+            age_days = (end - at) / 86400
+
+            roll = rng.random()
+            if roll < 0.06:
+                status = "cancelled"
+            elif age_days < 2 or (age_days < 7 and roll < 0.5):
+                status = "pending"
+            elif age_days < 7 or roll < 0.15:
+                status = "paid"
+            else:
+                status = "shipped"
+
+            total = 0.0
+            order_items = []
+            for _ in range(min(12, 1 + int(rng.expovariate(0.65)))):
+                product_id = power_law_index(rng, n_products, skew) + 1
+                quantity = 1 + int(rng.expovariate(0.35))
+                price = round(prices[product_id - 1] * rng.choice((1, 1, 1, 0.95, 0.9)), 2)
+                total += quantity * price
+                item_id += 1
+                items.append((item_id, order_id, product_id, quantity, price))
+                order_items.append((product_id, quantity, price))
+            total = round(total, 2)
+            orders.append((order_id, customer_id, total, status, clock.timestamp(at)))
+
+            if status == "shipped":
+                shipped_at = min(at + rng.randint(86400, 4 * 86400), end - 1)
+                for product_id, quantity, _ in order_items:
+                    movement_id += 1
+                    movements.append((movement_id, product_id, -quantity, "sale", order_id, clock.timestamp(shipped_at)))
+
+            if status in ("paid", "shipped"):
+                issued = at + rng.randint(0, 2 * 86400)
+                terms = rng.choice((15, 30, 30, 45))
+                invoice_id += 1
+                # Most customers pay around the due date; some pay late and a few never do
+                paid_at = None
+                if rng.random() > 0.06:
+                    paid_at = issued + int(rng.expovariate(1 / (terms * 0.8)) * 86400)
+                    if paid_at >= end:
+                        paid_at = None
+                invoice_status = "paid" if paid_at is not None else ("cancelled" if rng.random() < 0.01 else "unpaid")
+                invoices.append((invoice_id, customer_id, f"INV-{invoice_id:07d}", clock.day(issued),
+                                 clock.day(issued + terms * 86400), total, invoice_status, clock.timestamp(issued)))
+                invoice_orders.append((invoice_id, order_id))
+                for product_id, quantity, price in order_items:
+                    line_id += 1
+                    invoice_lines.append((line_id, invoice_id, names[product_id - 1], quantity, price))
+
+                if invoice_status != "cancelled":
+                    entry_id += 1
+                    entries.append((entry_id, clock.day(issued), clock.timestamp(issued)))
+                    lines.append((ledger_line_id + 1, entry_id, "Accounts Receivable", total, 0.0))
+                    lines.append((ledger_line_id + 2, entry_id, "Revenue", 0.0, total))
+                    ledger_line_id += 2
+
+                if paid_at is not None:
+                    payment_id += 1
+                    method = rng.choices(PAYMENT_METHODS, PAYMENT_METHOD_WEIGHTS)[0]
+                    payments.append((payment_id, customer_id, total, method, clock.timestamp(paid_at)))
+                    allocations.append((payment_id, payment_id, invoice_id, total))
+                    entry_id += 1
+                    entries.append((entry_id, clock.day(paid_at), clock.timestamp(paid_at)))
+                    lines.append((ledger_line_id + 1, entry_id, "Cash", total, 0.0))
+                    lines.append((ledger_line_id + 2, entry_id, "Accounts Receivable", 0.0, total))
+                    ledger_line_id += 2
+
+            if order_id % BATCH_ORDERS == 0:
+                self._flush(buffers)
+                print(f"   ... {order_id:,}/{self.n_orders:,} orders", end="\r", flush=True)
+        self._flush(buffers)
+        print()
+
+    def purchasing(self):
+        """Purchase orders, their items, receipts and the matching stock movements"""
+        rng, clock = self.rng, self.clock
+        end = clock.end
+        buffers = {("purchase_orders", 4): [], ("po_items", 5): [], ("po_receipts", 5): [], ("stock_movements", 6): []}
+        pos, po_items, receipts, movements = buffers.values()
+        supplier_ids = sorted(self.supplier_products)
+        movement_id = self.counts.get("stock_movements", 0)
+        item_id = receipt_id = 0
+
+        for po_id, at in enumerate(clock.timeline(rng, self.n_pos), 1):
+            supplier_id = supplier_ids[power_law_index(rng, len(supplier_ids), 1.5)]
+            catalog = self.supplier_products[supplier_id]
+            age_days = (end - at) / 86400
+            roll = rng.random()
+            if roll < 0.04:
+                status = "cancelled"
+            elif age_days < 3:
+                status = "draft"
+            elif age_days < 30 and roll < 0.6:
+                status = "sent"
+            else:
+                status = "received"
+            pos.append((po_id, supplier_id, status, clock.timestamp(at)))
+
+            picks = sorted({rng.randrange(len(catalog)) for _ in range(rng.randint(1, 5))})
+            for pick in picks:
+                product_id, cost, lead_time = catalog[pick]
+                quantity = rng.choice((10, 20, 25, 50, 100, 200, 500))
+                item_id += 1
+                po_items.append((item_id, po_id, product_id, quantity, cost))
+                if status == "received":
+                    received_at = min(at + lead_time * 86400 + rng.randrange(86400), end - 1)
+                    received = quantity if rng.random() > 0.1 else int(quantity * rng.uniform(0.5, 0.95))
+                    receipt_id += 1
+                    movement_id += 1
+                    receipts.append((receipt_id, po_id, product_id, received, clock.timestamp(received_at)))
+                    movements.append((movement_id, product_id, received, "purchase", po_id, clock.timestamp(received_at)))
+
+            if po_id % BATCH_ORDERS == 0:
+                self._flush(buffers)
+        self._flush(buffers)
+
+    # ------------------------------------------------------------------ CRM
+    def leads(self):
+        rng, clock = self.rng, self.clock
+        end = clock.end
+
+        def rows():
+            for lead_id, at in enumerate(clock.timeline(rng, self.n_leads), 1):
+                score = round(rng.betavariate(2, 3), 2)
+                age_days = (end - at) / 86400
+                if age_days < 14:
+                    status = "new"
+                else:
+                    status = "qualified" if rng.random() < score else "lost"
+                first = rng.choice(FIRST_NAMES).lower()
+                yield (lead_id, company_name(rng), f"{first}{lead_id}@example.com", rng.choice(LEAD_MESSAGES),
+                       score, status, clock.timestamp(at))
+
+        self._insert("leads", rows(), 7)
+
+    def tickets(self):
+        rng, clock, skew = self.rng, self.clock, self.skew
+        end, signup = clock.end, self.customer_signup
+
+        def rows():
+            for ticket_id, at in enumerate(clock.timeline(rng, self.n_tickets), 1):
+                customer_id = power_law_index(rng, max(1, bisect_right(signup, at)), skew) + 1
+                subject = rng.choices(TICKET_SUBJECTS, TICKET_SUBJECT_WEIGHTS)[0]
+                closed = (end - at) / 86400 > 14 and rng.random() < 0.92
+                yield (ticket_id, customer_id, subject, subject + rng.choice(TICKET_BODIES),
+                       "closed" if closed else "open", clock.timestamp(at))
+
+        self._insert("tickets", rows(), 6)
+
+    def conversations(self):
+        rng, clock = self.rng, self.clock
+        buffers = {("conversations", 6): [], ("messages", 7): []}
+        conversations, messages = buffers.values()
+        message_id = 0
+        for conversation_id, at in enumerate(clock.timeline(rng, self.n_conversations), 1):
+            agent_type = rng.choice(AGENT_TYPES)
+            started = clock.timestamp(at)
+            session = f"{agent_type}_{started[:10].replace('-', '')}_{conversation_id:06d}"
+            conversations.append((conversation_id, rng.randint(1, 5), started, session, agent_type, started))
+            sent = at
+            for turn in range(rng.randint(1, 4)):
+                for role, content in (("human", rng.choice(CHAT_QUESTIONS)), ("ai", f"Here is what I found ({agent_type}).")):
+                    message_id += 1
+                    sent += rng.randint(2, 40)
+                    stamp = clock.timestamp(sent)
+                    messages.append((message_id, conversation_id, None, content, stamp, role, stamp))
+        self._flush(buffers)
+
+    def derived(self):
+        """Rows that are pure functions of what was loaded"""
+        self.conn.execute("""
+            INSERT INTO customer_kv (customer_id, key, value)
+            SELECT customer_id, 'last_order_date', date(MAX(created_at)) FROM orders GROUP BY customer_id
+        """)
+        self.counts["customer_kv"] = self.conn.execute("SELECT changes()").fetchone()[0]
+        self.conn.commit()
+
+    def run(self):
+        steps = [
+            ("reference data", self.reference_data),
+            (f"{self.n_customers:,} customers", self.customers),
+            (f"{self.n_products:,} products", self.products),
+            (f"{self.n_suppliers:,} suppliers", self.suppliers),
+            ("stock levels", self.stock),
+            (f"{self.n_orders:,} orders with items, invoices, payments and ledger", self.orders),
+            (f"{self.n_pos:,} purchase orders", self.purchasing),
+            (f"{self.n_leads:,} leads", self.leads),
+            (f"{self.n_tickets:,} tickets", self.tickets),
+            (f"{self.n_conversations:,} conversations", self.conversations),
+            ("customer_kv", self.derived),
+        ]
+        for label, step in steps:
+            start = time.perf_counter()
+            step()
+            print(f"✅ {label} ({time.perf_counter() - start:.1f}s)")
+        return self.counts
+
+
+def finalize(path: Path):
+    """Indexes, WAL, planner statistics and the backend's derived structures"""
+    conn = sqlite3.connect(str(path))
+    start = time.perf_counter()
+    conn.executescript(INDEXES)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"✅ Indexes and ANALYZE ({time.perf_counter() - start:.1f}s)")
+
+    sys.path.insert(0, str(ROOT / "backend"))
+    from customer_stats import ensure_customer_stats
+    from db import close_pools
+    from pagination import ensure_pagination_indexes
+    from search_index import ensure_search_index
+
+    start = time.perf_counter()
+    ensure_customer_stats(str(path))
+    ensure_pagination_indexes(str(path))
+    ensure_search_index(str(path))
+    # Checkpoint the WAL so the file is complete on its own (benchmarks copy it)
+    close_pools()
+    print(f"✅ Rollup, pagination and search indexes ({time.perf_counter() - start:.1f}s)")
+
+
+def generate(out: Path, scale: int, seed: int = 42, end: date = date(2025, 7, 31), years: float = 3,
+             skew: float = 2.5, force: bool = False):
+    """
+    Build a fresh database at ``out`` with roughly ``scale`` rows.
+
+    Returns:
+        Dict of table -> generated row count
+    """
+    if out.exists():
+        if not force:
+            raise FileExistsError(f"{out} already exists (use --force to overwrite)")
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{out}{suffix}").unlink(missing_ok=True)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(str(out))
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    conn.executescript(SCHEMA)
+
+    generator = ERPDataGenerator(conn, scale, seed, end, years, skew)
+    print(f"🏭 Generating ~{scale:,} rows into {out} (seed={seed}, {generator.clock.start} .. {end})")
+    counts = generator.run()
+    conn.close()
+    finalize(out)
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    size_mb = out.stat().st_size / 1e6
+    print(f"🎉 {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s), {size_mb:,.0f} MB")
+    for table, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"   {table:<20} {count:>12,}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large synthetic ERP database for load testing")
+    parser.add_argument("--scale", type=parse_scale, default=parse_scale("100k"),
+                        help="approximate total rows, e.g. 10k, 100k, 1M, 10M (default 100k)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default 42)")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help=f"output database (default {DEFAULT_OUT})")
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2025, 7, 31),
+                        help="last day of generated activity (default 2025-07-31)")
+    parser.add_argument("--years", type=float, default=3, help="length of the activity window (default 3)")
+    parser.add_argument("--skew", type=float, default=2.5,
+                        help="power-law exponent for customer/product popularity; 1 = uniform (default 2.5)")
+    parser.add_argument("--force", action="store_true", help="overwrite --out if it exists")
+    args = parser.parse_args()
+
+    try:
+        generate(args.out, args.scale, args.seed, args.end, args.years, args.skew, args.force)
+    except FileExistsError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
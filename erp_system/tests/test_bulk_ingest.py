@@ -0,0 +1,98 @@
+"""Validators and chunk isolation in backend/bulk_ingest.py"""
+
+import io
+import json
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bulk_ingest import RowRejected, _integer, _real, _timestamp, ingest  # noqa: E402
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("12.5", 12.5),
+    (" 3 ", 3.0),
+    (7, 7.0),
+    (None, None),
+    ("", None),
+])
+def test_real_accepts_finite_numbers(value, expected):
+    assert _real(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    float("nan"), "nan", "NaN", float("inf"), "inf", "-Infinity", "1e400", True, False, "abc",
+])
+def test_real_rejects_non_finite_and_non_numbers(value):
+    with pytest.raises(RowRejected):
+        _real(value)
+
+
+@pytest.mark.parametrize("value, expected", [("42", 42), (42, 42), ("42.0", 42), (None, None)])
+def test_integer_accepts_whole_numbers(value, expected):
+    assert _integer(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    True, False, "inf", "1e400", float("nan"), "4.5", 2 ** 63, "1e19", "-1e19",
+])
+def test_integer_rejects_bools_non_finite_and_out_of_range(value):
+    with pytest.raises(RowRejected):
+        _integer(value)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "erp.db"
+    shutil.copy(BACKEND_DIR.parent / "databases" / "erp.db", path)
+    return str(path)
+
+
+def _ndjson(*rows):
+    return io.BytesIO("".join(json.dumps(row) + "\n" for row in rows).encode())
+
+
+def test_bad_numbers_are_rejected_per_row(db_path):
+    report = ingest("orders", io.BytesIO(
+        b'{"customer_id": 1, "total": NaN}\n'
+        b'{"customer_id": true, "total": 10}\n'
+        b'{"customer_id": 1e400, "total": 10}\n'
+        b'{"customer_id": 1, "total": 25.5}\n'
+    ), "ndjson", db_path=db_path)
+    assert report["rows_inserted"] == 1
+    assert [reject["line"] for reject in report["rejects"]] == [1, 2, 3]
+
+
+def test_failed_chunk_does_not_abort_the_ingest(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TRIGGER trg_test_reject BEFORE INSERT ON customers
+        WHEN NEW.name = 'boom' BEGIN SELECT RAISE(ABORT, 'boom rejected'); END
+    """)
+    conn.commit()
+    conn.close()
+
+    report = ingest("customers", _ndjson(
+        {"name": "Before Boom"}, {"name": "boom"}, {"name": "After Boom"},
+    ), "ndjson", db_path=db_path, batch_size=1)
+    assert report["rows_inserted"] == 2
+    assert report["chunks_failed"] == 1
+    assert report["rejects"][0]["line"] == 2
+    assert "boom rejected" in report["rejects"][0]["error"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-01-01 10:00:00", "2024-01-01 10:00:00"),
+    ("2024-01-01T10:00:00", "2024-01-01 10:00:00"),
+    ("2024-01-01T10:00:00+05:00", "2024-01-01 05:00:00"),
+    ("2024-01-01T23:30:00-02:00", "2024-01-02 01:30:00"),
+    ("2024-01-01T10:00:00Z", "2024-01-01 10:00:00"),
+])
+def test_timestamp_normalizes_to_utc(value, expected):
+    assert _timestamp(value) == expected
@@ -0,0 +1,48 @@
+"""Fast-path decisions of backend/intent_router.py"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from intent_router import IntentClassifier  # noqa: E402
+
+classifier = IntentClassifier(enabled=True)
+
+
+@pytest.mark.parametrize("message, argument", [
+    ("find customer acme corp", "acme corp"),
+    ("search for customer named Sara Fathy", "sara fathy"),
+    ("look up client globex", "globex"),
+])
+def test_customer_search_dispatches_with_the_name(message, argument):
+    decision = classifier.classify(message)
+    assert (decision.intent, decision.dispatch, decision.argument) == ("customer_search", True, argument)
+
+
+@pytest.mark.parametrize("message", [
+    "find customer orders",
+    "find customer leads",
+    "find customer acme's orders",
+    "find customer acme support tickets",
+    "find customers in cairo",
+    "find clients from egypt",
+    "find top 5 customers",
+])
+def test_search_argument_with_other_intents_or_filters_falls_through(message):
+    decision = classifier.classify(message)
+    assert not decision.dispatch
+    assert decision.intent != "customer_search" or decision.argument is None
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("show customers", "customer_list"),
+    ("list all leads", "leads"),
+    ("score leads", "lead_scoring"),
+    ("customer summary", "customer_summary"),
+])
+def test_plain_listing_requests_dispatch(message, intent):
+    decision = classifier.classify(message)
+    assert (decision.intent, decision.dispatch) == (intent, True)